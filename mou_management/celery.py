@@ -1,5 +1,7 @@
 import os
+import logging
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -35,6 +37,31 @@ app.conf.beat_schedule = {
 
 app.conf.timezone = 'UTC'
 
+
+@worker_init.connect
+def preload_ai_models(**kwargs):
+    """Load AI models in the parent process before the prefork pool forks, so children share them"""
+    if not getattr(settings, 'AI_PRELOAD_BEFORE_FORK', True):
+        return
+    try:
+        from mous.ai_services import preload_models_for_fork
+        preload_models_for_fork()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"AI model preload skipped: {str(e)}")
+
+
+@worker_process_init.connect
+def warm_up_ai_models(**kwargs):
+    """Finish warming AI models in each worker process so the first task doesn't pay for it"""
+    if not getattr(settings, 'AI_WARM_UP_ON_WORKER_START', True):
+        return
+    try:
+        from mous.ai_services import warm_up_analyzer
+        warm_up_analyzer()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"AI model warm-up skipped: {str(e)}")
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
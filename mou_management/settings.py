@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+import json
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -166,6 +167,53 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# AI Analysis Configuration
+AI_WARM_UP_ON_WORKER_START = config('AI_WARM_UP_ON_WORKER_START', default=True, cast=bool)
+AI_PRELOAD_BEFORE_FORK = config('AI_PRELOAD_BEFORE_FORK', default=True, cast=bool)  # Share model weights across prefork children
+AI_INFERENCE_BATCH_SIZE = config('AI_INFERENCE_BATCH_SIZE', default=16, cast=int)
+AI_INFERENCE_PRECISION = config('AI_INFERENCE_PRECISION', default='fp32')  # fp32, int8 or bf16
+AI_ANALYSIS_TIER = config('AI_ANALYSIS_TIER', default='deep')  # rules, standard or deep; each loads only its models, on first use
+AI_WINDOW_STRIDE = config('AI_WINDOW_STRIDE', default=128, cast=int)  # Token overlap between windows of long clauses
+AI_INFERENCE_SERVER_SOCKET = config('AI_INFERENCE_SERVER_SOCKET', default='')  # Unix socket of run_inference_server; empty = models load in each worker
+AI_INFERENCE_SERVER_MAX_BATCH = config('AI_INFERENCE_SERVER_MAX_BATCH', default=64, cast=int)  # Clauses per micro-batch
+AI_INFERENCE_SERVER_MAX_WAIT_MS = config('AI_INFERENCE_SERVER_MAX_WAIT_MS', default=10, cast=float)  # Max wait for a batch to fill
+AI_INFERENCE_SERVER_TIMEOUT = config('AI_INFERENCE_SERVER_TIMEOUT', default=120, cast=float)  # Client socket timeout (seconds)
+AI_INCREMENTAL_REANALYSIS = config('AI_INCREMENTAL_REANALYSIS', default=True, cast=bool)  # Only analyze changed clauses of a new PDF version
+AI_RESCORE_CHUNK_SIZE = config('AI_RESCORE_CHUNK_SIZE', default=5000, cast=int)  # Clauses per batch when re-scoring stored analyses
+AI_RISK_WEIGHTS = config('AI_RISK_WEIGHTS', default='{}', cast=json.loads)  # JSON overrides of ai_rules.RISK_WEIGHTS
+AI_COMPLIANCE_THRESHOLDS = config('AI_COMPLIANCE_THRESHOLDS', default='{}', cast=json.loads)  # JSON overrides of ai_rules.COMPLIANCE_THRESHOLDS
+AI_STREAMING_ANALYSIS = config('AI_STREAMING_ANALYSIS', default=True, cast=bool)  # Persist clause results in chunks
+AI_STREAM_CHUNK_SIZE = config('AI_STREAM_CHUNK_SIZE', default=32, cast=int)  # Clauses per persisted chunk
+AI_STREAM_STALE_SECONDS = config('AI_STREAM_STALE_SECONDS', default=600, cast=int)  # In-progress runs idle longer may be restarted
+AI_ANALYSIS_MAX_DELIVERIES = config('AI_ANALYSIS_MAX_DELIVERIES', default=3, cast=int)  # Fail an analysis whose task was lost with its worker this often
+AI_SHARDED_ANALYSIS = config('AI_SHARDED_ANALYSIS', default=True, cast=bool)  # Analyze very long MOUs as parallel shard tasks
+AI_SHARD_MIN_CHARS = config('AI_SHARD_MIN_CHARS', default=250000, cast=int)  # Documents at least this long are sharded (~80 pages)
+AI_SHARD_CHARS = config('AI_SHARD_CHARS', default=50000, cast=int)  # Target shard size, cut at clause boundaries
+AI_PIPELINE_EXTRACT_WORKERS = config('AI_PIPELINE_EXTRACT_WORKERS', default=2, cast=int)  # PDF extraction processes of the analysis pipeline
+AI_PIPELINE_QUEUE_SIZE = config('AI_PIPELINE_QUEUE_SIZE', default=8, cast=int)  # Documents buffered between pipeline stages
+AI_PIPELINE_WRITE_BATCH = config('AI_PIPELINE_WRITE_BATCH', default=8, cast=int)  # Analyses saved per transaction by the pipeline writer
+AI_CLAUSE_CACHE_ENABLED = config('AI_CLAUSE_CACHE_ENABLED', default=True, cast=bool)
+AI_CLAUSE_CACHE_SIZE = config('AI_CLAUSE_CACHE_SIZE', default=10000, cast=int)  # In-process LRU entries
+AI_CLAUSE_CACHE_SHARED = config('AI_CLAUSE_CACHE_SHARED', default=True, cast=bool)  # Database tier
+AI_CLAUSE_CACHE_SHARED_MAX_ENTRIES = config('AI_CLAUSE_CACHE_SHARED_MAX_ENTRIES', default=200000, cast=int)
+AI_CLAUSE_LIBRARY_ENABLED = config('AI_CLAUSE_LIBRARY_ENABLED', default=True, cast=bool)  # Label near-duplicates of library clauses without inference
+AI_CLAUSE_LIBRARY_MIN_SIMILARITY = config('AI_CLAUSE_LIBRARY_MIN_SIMILARITY', default=0.8, cast=float)  # Jaccard similarity of word 3-grams
+AI_CLAUSE_LIBRARY_REFRESH_SECONDS = config('AI_CLAUSE_LIBRARY_REFRESH_SECONDS', default=300, cast=int)  # How often workers check for library changes
+AI_CASCADE_ENABLED = config('AI_CASCADE_ENABLED', default=False, cast=bool)  # Rules first, transformer only for unclear clauses
+AI_CASCADE_MIN_CONFIDENCE = config('AI_CASCADE_MIN_CONFIDENCE', default=0.8, cast=float)  # Rule confidence needed to skip the model
+AI_CASCADE_ESCALATE_RISK = config('AI_CASCADE_ESCALATE_RISK', default=True, cast=bool)  # Send clauses with risk factors to the model
+AI_CASCADE_LINEAR = config('AI_CASCADE_LINEAR', default=True, cast=bool)  # Type unclear clauses with the trained TF-IDF classifier before the model
+AI_LINEAR_MIN_CONFIDENCE = config('AI_LINEAR_MIN_CONFIDENCE', default=0.9, cast=float)  # Linear classifier probability needed to skip the model
+AI_CLAUSE_TYPING = config('AI_CLAUSE_TYPING', default='model')  # model (classifier) or prototype (nearest label prototype of the sentence encoder)
+AI_EMBEDDING_MEMO_SIZE = config('AI_EMBEDDING_MEMO_SIZE', default=4096, cast=int)  # Recent clause embeddings kept per analyzer for reuse
+AI_SIMILAR_CLAUSES_ENABLED = config('AI_SIMILAR_CLAUSES_ENABLED', default=True, cast=bool)
+AI_SIMILAR_CLAUSES_TOP_K = config('AI_SIMILAR_CLAUSES_TOP_K', default=5, cast=int)
+AI_SIMILAR_CLAUSES_MIN_SCORE = config('AI_SIMILAR_CLAUSES_MIN_SCORE', default=0.75, cast=float)
+AI_INDEX_DIR = config('AI_INDEX_DIR', default=str(BASE_DIR / 'ai_index'))
+AI_INDEX_NPROBE = config('AI_INDEX_NPROBE', default=16, cast=int)  # IVF lists scanned per query
+AI_EMBEDDING_DTYPE = config('AI_EMBEDDING_DTYPE', default='float16')  # Applies to newly created embedding stores
+AI_SPACY_DISABLED_COMPONENTS = config('AI_SPACY_DISABLED_COMPONENTS', default='lemmatizer', cast=lambda v: [c.strip() for c in v.split(',') if c.strip()])
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = config('MAX_UPLOAD_SIZE', default=10485760, cast=int)  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = config('MAX_UPLOAD_SIZE', default=10485760, cast=int)  # 10MB
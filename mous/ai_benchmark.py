@@ -0,0 +1,246 @@
+"""
+Deterministic synthetic MOU corpus and ClauseAnalyzer benchmark
+The corpus mixes boilerplate clauses, repeated verbatim across documents as in
+real MOUs, with generated clauses of configurable length, so analyzer changes
+can be compared run to run (see the ``benchmark_analyzer`` command).
+"""
+
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# Standard clauses that recur verbatim across MOUs
+BOILERPLATE_CLAUSES = [
+    "Confidentiality. Each party shall keep confidential all proprietary and confidential information "
+    "disclosed by the other party under this Memorandum and shall not disclose it to any third party "
+    "without the prior written consent of the disclosing party.",
+    "Governing Law. This Memorandum shall be governed by and construed in accordance with the laws of "
+    "the jurisdiction in which the first party is established, and the applicable law shall apply to "
+    "all matters arising from it.",
+    "Force Majeure. Neither party shall be liable for any failure or delay in performance caused by "
+    "force majeure, including acts of God, war, epidemic or other unforeseeable events beyond its "
+    "reasonable control.",
+    "Dispute Resolution. Any dispute arising out of this Memorandum shall first be referred to mediation "
+    "and, failing settlement within sixty days, to arbitration under the rules agreed by the parties.",
+    "Termination. Either party may terminate this Memorandum by giving ninety days written notice to "
+    "the other party, and obligations accrued before termination shall survive.",
+    "Entire Agreement. This Memorandum constitutes the entire understanding between the parties and "
+    "supersedes all prior discussions, and it may only be amended in writing signed by both parties.",
+    "Intellectual Property. Intellectual property, including copyright, patent and trademark rights, "
+    "created jointly under this Memorandum shall be owned jointly unless otherwise agreed in writing.",
+    "Notices. All notices under this Memorandum shall be in writing and delivered to the addresses of "
+    "the parties set out above or to such other address as a party may notify.",
+]
+
+# Fragments that generated clauses are assembled from, by clause type
+CLAUSE_FRAGMENTS = {
+    'payment': [
+        "the partner shall pay the agreed fees within thirty days of invoice",
+        "all costs and expenses incurred shall be reimbursed on presentation of receipts",
+        "billing shall be quarterly in arrears against the approved budget",
+        "late payment shall attract a penalty of two percent per month",
+    ],
+    'liability': [
+        "each party shall be liable for damages caused by its own negligence",
+        "the partner shall indemnify and hold harmless the university against all claims",
+        "liability under this clause shall not exceed the total fees paid",
+        "neither party shall be responsible for indirect or consequential damages",
+    ],
+    'termination': [
+        "the university may terminate at any time without cause",
+        "this memorandum shall expire at the end of the initial term unless renewed",
+        "either party may cancel the programme on written notice",
+        "termination shall not affect students already enrolled in the programme",
+    ],
+    'general': [
+        "the parties shall establish a joint steering committee that meets twice a year",
+        "student and staff exchanges shall be arranged subject to available places",
+        "each party shall designate a coordinator responsible for implementation",
+        "joint research proposals shall be developed in areas of mutual interest",
+        "the parties shall share curricula and teaching materials where appropriate",
+        "progress reports shall be submitted to both institutions every semester",
+    ],
+}
+
+PARTY_NAMES = [
+    'University of Nairobi', 'Makerere University', 'Global Health Foundation', 'Tech Innovations Ltd',
+    'Institute of Applied Sciences', 'Regional Development Agency', 'City Teaching Hospital',
+]
+
+
+def generate_corpus(documents: int = 50, clauses_per_document: Tuple[int, int] = (15, 40),
+                    clause_words: Tuple[int, int] = (30, 120), boilerplate_ratio: float = 0.3,
+                    seed: int = 42) -> List[Dict]:
+    """
+    Generate a deterministic synthetic MOU corpus
+
+    Args:
+        documents: Number of documents
+        clauses_per_document: (min, max) clauses per document
+        clause_words: (min, max) words per generated clause
+        boilerplate_ratio: Fraction of clauses taken verbatim from BOILERPLATE_CLAUSES
+        seed: Random seed; the same arguments always give the same corpus
+
+    Returns:
+        List of {'title', 'text', 'clauses'} dictionaries
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for number in range(documents):
+        first, second = rng.sample(PARTY_NAMES, 2)
+        title = f"MOU {number + 1}: {first} and {second}"
+        clauses = []
+        for _ in range(rng.randint(*clauses_per_document)):
+            if rng.random() < boilerplate_ratio:
+                clauses.append(rng.choice(BOILERPLATE_CLAUSES))
+            else:
+                clauses.append(_generate_clause(rng, rng.randint(*clause_words), first, second))
+
+        lines = [title.upper(), '', f"This Memorandum of Understanding is made between {first} and {second}.", '']
+        lines.extend(f"{index}. {clause}" for index, clause in enumerate(clauses, start=1))
+        corpus.append({'title': title, 'text': '\n'.join(lines) + '\n', 'clauses': clauses})
+    return corpus
+
+
+def _generate_clause(rng: random.Random, words: int, first: str, second: str) -> str:
+    """Assemble a clause of about ``words`` words from the fragment tables"""
+    clause_type = rng.choice(list(CLAUSE_FRAGMENTS))
+    sentences = []
+    count = 0
+    while count < words:
+        fragment = rng.choice(CLAUSE_FRAGMENTS[clause_type] + CLAUSE_FRAGMENTS['general'])
+        party = rng.choice([first, second])
+        sentence = f"{party} agrees that {fragment} (reference {rng.randint(100, 999)})."
+        sentences.append(sentence)
+        count += len(sentence.split())
+    return ' '.join(sentences)
+
+
+def corpus_stats(corpus: List[Dict]) -> Dict:
+    """Size and composition of a corpus"""
+    clauses = [clause for document in corpus for clause in document['clauses']]
+    boilerplate = set(BOILERPLATE_CLAUSES)
+    return {
+        'documents': len(corpus),
+        'clauses': len(clauses),
+        'avg_clauses_per_document': round(len(clauses) / max(len(corpus), 1), 1),
+        'avg_clause_words': round(sum(len(c.split()) for c in clauses) / max(len(clauses), 1), 1),
+        'boilerplate_clauses': sum(1 for c in clauses if c in boilerplate),
+    }
+
+
+def _rss_mb(field: str = 'VmRSS') -> float:
+    """Current (VmRSS) or peak (VmHWM) resident memory of this process in MB"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return 0.0
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (VmHWM) so each run reports its own peak"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def benchmark_analyzer(analyzer, corpus: List[Dict], warmup: int = 1) -> Dict:
+    """
+    Run ``analyzer.analyze_document`` over a corpus and measure it
+
+    Returns:
+        Throughput, per-document latency percentiles and memory
+    """
+    for document in corpus[:warmup]:
+        analyzer.analyze_document(document['text'], document['title'])
+
+    peak_reset = _reset_peak_rss()
+    rss_before = _rss_mb()
+    latencies = []
+    clauses = 0
+    started = time.perf_counter()
+    for document in corpus:
+        document_started = time.perf_counter()
+        result = analyzer.analyze_document(document['text'], document['title'])
+        latencies.append(time.perf_counter() - document_started)
+        clauses += len(result.get('clauses', []))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'analyzer_version': analyzer.version_key,
+        'documents': len(corpus),
+        'clauses': clauses,
+        'seconds': round(elapsed, 3),
+        'docs_per_second': round(len(corpus) / elapsed, 2) if elapsed else None,
+        'clauses_per_second': round(clauses / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50) * 1000, 2),
+            'p95': round(_percentile(latencies, 95) * 1000, 2),
+            'p99': round(_percentile(latencies, 99) * 1000, 2),
+            'mean': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        },
+        'rss_before_mb': round(rss_before, 1),
+        'peak_rss_mb': round(_rss_mb('VmHWM'), 1),
+        'peak_is_per_run': peak_reset,
+    }
+
+
+def run_environment() -> Dict:
+    """Commit and interpreter details recorded with each result file"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_results(baseline: Dict, current: Dict) -> Dict[str, Dict]:
+    """Relative change of the headline metrics per mode (positive = current is higher)"""
+    changes = {}
+    for mode, result in current.get('modes', {}).items():
+        previous = baseline.get('modes', {}).get(mode)
+        if not previous or 'skipped' in result or 'skipped' in previous:
+            continue
+        metrics = {
+            'docs_per_second': (previous['docs_per_second'], result['docs_per_second']),
+            'clauses_per_second': (previous['clauses_per_second'], result['clauses_per_second']),
+            'p50_ms': (previous['latency_ms']['p50'], result['latency_ms']['p50']),
+            'p95_ms': (previous['latency_ms']['p95'], result['latency_ms']['p95']),
+            'peak_rss_mb': (previous['peak_rss_mb'], result['peak_rss_mb']),
+        }
+        changes[mode] = {
+            name: {'before': before, 'after': after,
+                   'change': round((after - before) / before, 4) if before else None}
+            for name, (before, after) in metrics.items()
+        }
+    return changes
@@ -0,0 +1,210 @@
+"""
+Content-addressed cache of clause analysis results
+Boilerplate clauses (confidentiality, governing law, force majeure, ...) recur
+almost verbatim across MOUs, so results are cached by a hash of the normalized
+clause text plus the analyzer version. An in-process LRU sits in front of a
+shared database tier (ClauseResultCache).
+"""
+
+import copy
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_clause_text(clause_text: str) -> str:
+    """Normalize clause text for hashing (unicode form and whitespace)"""
+    return _WHITESPACE_RE.sub(' ', unicodedata.normalize('NFKC', clause_text)).strip()
+
+
+def clause_cache_key(clause_text: str, version: str) -> str:
+    """Return the cache key for a clause under an analyzer version"""
+    payload = f"{version}\x00{normalize_clause_text(clause_text)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ClauseResultCache:
+    """
+    Two-tier clause result cache
+
+    Results are stored without their ``text`` field and re-attached on lookup.
+    Because the analyzer version is part of every key, entries written by an
+    older model or rule set are never returned and age out through LRU eviction.
+    """
+
+    def __init__(self, max_memory_entries: int = 10000, max_shared_entries: int = 200000,
+                 use_shared: bool = True):
+        self.max_memory_entries = max_memory_entries
+        self.max_shared_entries = max_shared_entries
+        self.use_shared = use_shared
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes_since_eviction = 0
+        self.stats_counters = {
+            'memory_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'shared_evictions': 0,
+        }
+
+    def get_many(self, clauses: List[str], version: str) -> Dict[int, Dict]:
+        """
+        Look up cached results for many clauses
+
+        Returns:
+            Mapping of clause index to cached clause result
+        """
+        found = {}
+        pending = {}
+
+        with self._lock:
+            for index, clause_text in enumerate(clauses):
+                key = clause_cache_key(clause_text, version)
+                result = self._memory.get(key)
+                if result is not None:
+                    self._memory.move_to_end(key)
+                    found[index] = dict(copy.deepcopy(result), text=clause_text)
+                    self.stats_counters['memory_hits'] += 1
+                else:
+                    pending.setdefault(key, []).append(index)
+
+        if pending and self.use_shared:
+            for key, result in self._shared_get(pending.keys()).items():
+                self._remember(key, result)
+                for index in pending.pop(key):
+                    found[index] = dict(copy.deepcopy(result), text=clauses[index])
+                    self.stats_counters['shared_hits'] += 1
+
+        self.stats_counters['misses'] += sum(len(indices) for indices in pending.values())
+        return found
+
+    def get(self, clause_text: str, version: str) -> Optional[Dict]:
+        """Look up a single clause"""
+        return self.get_many([clause_text], version).get(0)
+
+    def set_many(self, results: Iterable[Dict], version: str):
+        """Store clause results (each must carry its ``text``)"""
+        entries = {}
+        for result in results:
+            key = clause_cache_key(result['text'], version)
+            entries[key] = {k: v for k, v in result.items() if k != 'text'}
+
+        for key, result in entries.items():
+            self._remember(key, result)
+
+        if entries and self.use_shared:
+            self._shared_set(entries, version)
+
+    def set(self, clause_result: Dict, version: str):
+        """Store a single clause result"""
+        self.set_many([clause_result], version)
+
+    def clear(self):
+        """Drop the in-process tier"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict:
+        """Report cache effectiveness"""
+        counters = dict(self.stats_counters)
+        hits = counters['memory_hits'] + counters['shared_hits']
+        lookups = hits + counters['misses']
+        counters['lookups'] = lookups
+        counters['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        counters['memory_entries'] = len(self._memory)
+        return counters
+
+    def _remember(self, key: str, result: Dict):
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+                self.stats_counters['memory_evictions'] += 1
+
+    def _shared_get(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        try:
+            from django.db.models import F
+            from django.utils import timezone
+            from .ai_models import ClauseResultCache as CacheEntry
+
+            keys = list(keys)
+            found = dict(CacheEntry.objects.filter(cache_key__in=keys).values_list('cache_key', 'result'))
+            if found:
+                CacheEntry.objects.filter(cache_key__in=list(found)).update(
+                    hit_count=F('hit_count') + 1,
+                    last_used=timezone.now()
+                )
+            return found
+        except Exception as e:
+            logger.warning(f"Shared clause cache lookup failed: {str(e)}")
+            return {}
+
+    def _shared_set(self, entries: Dict[str, Dict], version: str):
+        try:
+            from django.utils import timezone
+            from .ai_models import ClauseResultCache as CacheEntry
+
+            now = timezone.now()
+            CacheEntry.objects.bulk_create(
+                [
+                    CacheEntry(cache_key=key, model_version=version, result=result, last_used=now)
+                    for key, result in entries.items()
+                ],
+                ignore_conflicts=True
+            )
+
+            self._writes_since_eviction += len(entries)
+            if self._writes_since_eviction >= max(self.max_shared_entries // 100, 100):
+                self._writes_since_eviction = 0
+                self.evict_shared()
+        except Exception as e:
+            logger.warning(f"Shared clause cache write failed: {str(e)}")
+
+    def evict_shared(self) -> int:
+        """
+        Bound the shared tier by deleting the least recently used entries above
+        ``max_shared_entries``. Entries of superseded analyzer versions are never
+        hit again, so they are the first to go. (Rule-only and AI workers use
+        different versions concurrently, so other versions are not purged outright.)
+
+        Returns:
+            Number of entries deleted
+        """
+        from .ai_models import ClauseResultCache as CacheEntry
+
+        deleted = 0
+        overflow = CacheEntry.objects.count() - self.max_shared_entries
+        if overflow > 0:
+            stale_ids = list(
+                CacheEntry.objects.order_by('last_used').values_list('id', flat=True)[:overflow]
+            )
+            deleted += CacheEntry.objects.filter(id__in=stale_ids).delete()[0]
+
+        self.stats_counters['shared_evictions'] += deleted
+        return deleted
+
+
+_CLAUSE_CACHE = None
+
+
+def get_clause_cache() -> ClauseResultCache:
+    """Return the process-wide clause result cache"""
+    global _CLAUSE_CACHE
+    if _CLAUSE_CACHE is None:
+        from .ai_services import _get_setting
+        _CLAUSE_CACHE = ClauseResultCache(
+            max_memory_entries=_get_setting('AI_CLAUSE_CACHE_SIZE', 10000),
+            max_shared_entries=_get_setting('AI_CLAUSE_CACHE_SHARED_MAX_ENTRIES', 200000),
+            use_shared=_get_setting('AI_CLAUSE_CACHE_SHARED', True),
+        )
+    return _CLAUSE_CACHE
@@ -0,0 +1,118 @@
+"""
+Clause-level diff between two versions of an MOU
+A revised PDF usually changes a few paragraphs, so clauses of the new version
+are matched against the clauses already analyzed: exact matches by normalized
+text hash (wherever they moved), then the remaining clauses are aligned in
+document order to find edited ones. Only added and modified clauses need
+inference.
+"""
+
+import bisect
+import difflib
+import hashlib
+from typing import Dict, List
+
+from .ai_cache import normalize_clause_text
+
+# Minimum text similarity (difflib ratio) for an aligned clause pair to count
+# as an edit of the old clause rather than a removal plus an addition
+MODIFIED_MIN_SIMILARITY = 0.5
+
+# Unaligned leftovers are compared pairwise only up to this many comparisons
+MAX_UNALIGNED_COMPARISONS = 2500
+
+
+def clause_hash(clause_text: str) -> str:
+    """Hash of the normalized clause text"""
+    return hashlib.sha256(normalize_clause_text(clause_text).encode('utf-8')).hexdigest()
+
+
+def diff_clause_versions(old_clauses: List[str], new_clauses: List[str],
+                         min_similarity: float = MODIFIED_MIN_SIMILARITY) -> Dict:
+    """
+    Match the clauses of a new document version against the previous version
+
+    Args:
+        old_clauses: Clause texts of the analyzed version, in document order
+        new_clauses: Clause texts of the new version, in document order
+        min_similarity: Similarity above which an aligned pair is a modification
+
+    Returns:
+        Dictionary with ``matches``, one entry per new clause of the form
+        ``{'status': 'unchanged'|'modified'|'added', 'previous': old index or None}``,
+        and ``removed``, the old indexes with no counterpart in the new version
+    """
+    old_hashes = [clause_hash(c) for c in old_clauses]
+    new_hashes = [clause_hash(c) for c in new_clauses]
+    matches = [{'status': 'added', 'previous': None} for _ in new_clauses]
+    used_old = set()
+
+    # Identical clauses in the same relative order
+    matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    anchors = []
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            matches[block.b + offset] = {'status': 'unchanged', 'previous': block.a + offset}
+            used_old.add(block.a + offset)
+            anchors.append((block.a + offset, block.b + offset))
+
+    # Identical clauses that moved
+    unused_by_hash: Dict[str, List[int]] = {}
+    for index, digest in enumerate(old_hashes):
+        if index not in used_old:
+            unused_by_hash.setdefault(digest, []).append(index)
+    for index, digest in enumerate(new_hashes):
+        if matches[index]['status'] == 'added' and unused_by_hash.get(digest):
+            previous = unused_by_hash[digest].pop(0)
+            matches[index] = {'status': 'unchanged', 'previous': previous}
+            used_old.add(previous)
+
+    # Edited clauses: pair leftovers between the same matched neighbours
+    old_left = [i for i in range(len(old_clauses)) if i not in used_old]
+    new_left = [i for i, match in enumerate(matches) if match['status'] == 'added']
+    for old_index, new_index in _pair_in_gaps(old_left, new_left, anchors):
+        if _similarity(old_clauses[old_index], new_clauses[new_index]) >= min_similarity:
+            matches[new_index] = {'status': 'modified', 'previous': old_index}
+            used_old.add(old_index)
+
+    # Edited clauses that also moved: best remaining match, for small leftovers only
+    old_left = [i for i in old_left if i not in used_old]
+    new_left = [i for i in new_left if matches[i]['status'] == 'added']
+    if len(old_left) * len(new_left) <= MAX_UNALIGNED_COMPARISONS:
+        for new_index in new_left:
+            scored = [(_similarity(old_clauses[i], new_clauses[new_index]), i) for i in old_left if i not in used_old]
+            ratio, old_index = max(scored, default=(0.0, None))
+            if old_index is not None and ratio >= min_similarity:
+                matches[new_index] = {'status': 'modified', 'previous': old_index}
+                used_old.add(old_index)
+
+    return {
+        'matches': matches,
+        'removed': [i for i in range(len(old_clauses)) if i not in used_old],
+    }
+
+
+def _similarity(old_text: str, new_text: str) -> float:
+    """Text similarity of two clauses (0-1)"""
+    return difflib.SequenceMatcher(None, normalize_clause_text(old_text), normalize_clause_text(new_text)).ratio()
+
+
+def _pair_in_gaps(old_left: List[int], new_left: List[int], anchors: List[tuple]) -> List[tuple]:
+    """
+    Pair unmatched old and new clauses that sit between the same two in-order
+    matches (``anchors`` of (old index, new index)), first with first
+    """
+    old_anchors = [a for a, _ in anchors]
+    new_anchors = [b for _, b in anchors]
+
+    old_gaps: Dict[int, List[int]] = {}
+    for index in old_left:
+        old_gaps.setdefault(bisect.bisect_left(old_anchors, index), []).append(index)
+
+    pairs = []
+    new_gaps: Dict[int, List[int]] = {}
+    for index in new_left:
+        new_gaps.setdefault(bisect.bisect_left(new_anchors, index), []).append(index)
+    for gap, new_indexes in new_gaps.items():
+        pairs.extend(zip(old_gaps.get(gap, []), new_indexes))
+    return pairs
@@ -0,0 +1,367 @@
+"""
+Memory-mapped on-disk embedding store
+Embeddings are persisted once and shared by every worker process: vectors live
+in a flat binary matrix that readers memory-map read-only (zero-copy, pages
+shared through the OS page cache), next to an id map of (object id, group id)
+rows, e.g. (ClauseAnalysis pk, MOU pk). Each embedding model gets its own
+store, so a model upgrade never mixes vectors.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Sequence
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding matrix with tombstones and compaction
+
+    Layout of ``directory``:
+        meta.json            dim, dtype, model name and current generation
+        vectors-<gen>.bin    (rows, dim) matrix in ``dtype``
+        ids-<gen>.bin        (rows, 2) int64 (object_id, group_id); its length
+                             defines how many rows are committed
+        tombstones-<gen>.bin int64 row numbers deleted since the last compaction
+                             (rows, not object ids, so an id deleted and
+                             appended again stays visible)
+
+    Writers serialize on an flock; readers never lock. Compaction writes the
+    next generation and switches ``meta.json`` atomically, so existing
+    memory maps stay valid until the reader refreshes.
+    """
+
+    ID_COLUMNS = 2
+
+    def __init__(self, directory: str, dim: int, dtype: str = 'float16', model_name: str = ''):
+        self.directory = directory
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+
+        with self._file_lock():
+            meta = self._read_meta()
+            if meta is None:
+                meta = {'dim': dim, 'dtype': dtype, 'model': model_name, 'generation': 0}
+                self._write_meta(meta)
+        if meta['dim'] != dim:
+            raise ValueError(f"Embedding store {directory} holds {meta['dim']}-d vectors, got {dim}")
+
+        self.dim = meta['dim']
+        self.dtype = np.dtype(meta['dtype'])
+        self.model_name = meta.get('model', model_name)
+        self._generation = None
+        self._rows = 0
+        self._tombstone_bytes = 0
+        self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+        self._ids = np.zeros((0, self.ID_COLUMNS), dtype=np.int64)
+        self._deleted = np.zeros(0, dtype=np.int64)
+        self._alive = np.zeros(0, dtype=bool)
+        self.refresh()
+
+    # Files ------------------------------------------------------------------
+
+    def _path(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self._generation if generation is None else generation
+        return os.path.join(self.directory, f"{name}-{generation}.bin")
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.directory, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta: Dict):
+        tmp_path = os.path.join(self.directory, '.meta.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.directory, 'meta.json'))
+
+    def _file_lock(self):
+        lock_file = open(os.path.join(self.directory, '.lock'), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    # Reading ------------------------------------------------------------------
+
+    def refresh(self) -> bool:
+        """
+        Pick up rows, tombstones and compactions written by other processes
+
+        Returns:
+            True if the visible contents changed
+        """
+        with self._lock:
+            meta = self._read_meta()
+            generation = meta['generation']
+            changed = generation != self._generation
+            if changed:
+                self._generation = generation
+                self._rows = 0
+                self._tombstone_bytes = 0
+                self._deleted = np.zeros(0, dtype=np.int64)
+
+            rows = self._size(self._path('ids')) // (8 * self.ID_COLUMNS)
+            if rows != self._rows or changed:
+                self._rows = rows
+                if rows:
+                    self._ids = np.memmap(self._path('ids'), dtype=np.int64, mode='r',
+                                          shape=(rows, self.ID_COLUMNS))
+                    self._vectors = np.memmap(self._path('vectors'), dtype=self.dtype, mode='r',
+                                              shape=(rows, self.dim))
+                else:
+                    self._ids = np.zeros((0, self.ID_COLUMNS), dtype=np.int64)
+                    self._vectors = np.zeros((0, self.dim), dtype=self.dtype)
+                changed = True
+
+            tombstone_bytes = self._size(self._path('tombstones'))
+            if tombstone_bytes != self._tombstone_bytes:
+                self._tombstone_bytes = tombstone_bytes
+                self._deleted = np.fromfile(self._path('tombstones'), dtype=np.int64)
+                changed = True
+
+            if changed:
+                self._alive = np.ones(rows, dtype=bool)
+                self._alive[self._deleted[self._deleted < rows]] = False
+            return changed
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def vectors(self):
+        """(rows, dim) read-only memory map of every committed row (including deleted ones)"""
+        return self._vectors
+
+    @property
+    def object_ids(self):
+        return self._ids[:, 0]
+
+    @property
+    def group_ids(self):
+        return self._ids[:, 1]
+
+    @property
+    def alive(self):
+        """Boolean mask of rows that have not been deleted"""
+        return self._alive
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    def get(self, object_ids: Iterable[int]) -> Dict[int, 'np.ndarray']:
+        """Return float32 vectors for the given object ids that are stored and alive"""
+        self.refresh()
+        wanted = np.fromiter(object_ids, dtype=np.int64)
+        rows = np.flatnonzero(np.isin(self.object_ids, wanted) & self._alive)
+        return {int(self.object_ids[r]): np.asarray(self._vectors[r], dtype=np.float32) for r in rows}
+
+    # Writing ------------------------------------------------------------------
+
+    def append(self, vectors, object_ids: Sequence[int], group_ids: Sequence[int]) -> int:
+        """
+        Append vectors with their ids
+
+        Returns:
+            Row number of the first appended vector
+        """
+        vectors = np.ascontiguousarray(np.asarray(vectors).reshape(-1, self.dim), dtype=self.dtype)
+        ids = np.ascontiguousarray(np.column_stack([
+            np.asarray(object_ids, dtype=np.int64),
+            np.asarray(group_ids, dtype=np.int64),
+        ]))
+        if len(vectors) != len(ids):
+            raise ValueError("vectors and ids must have the same length")
+
+        lock_file = self._file_lock()
+        try:
+            with self._lock:
+                self.refresh()
+                first_row = self._rows
+                # Drop vector rows left behind by an interrupted append
+                with open(self._path('vectors'), 'ab') as f:
+                    f.truncate(first_row * self.dim * self.dtype.itemsize)
+                    f.write(vectors.tobytes())
+                    f.flush()
+                # The id file defines the committed row count, so write it last
+                with open(self._path('ids'), 'ab') as f:
+                    f.write(ids.tobytes())
+                    f.flush()
+                self.refresh()
+                return first_row
+        finally:
+            lock_file.close()
+
+    def delete(self, object_ids: Iterable[int]) -> int:
+        """Tombstone the live rows of the given object ids; returns the number of rows deleted"""
+        wanted = np.fromiter(object_ids, dtype=np.int64)
+        if not len(wanted):
+            return 0
+        return self._delete_rows(lambda: np.isin(self.object_ids, wanted))
+
+    def delete_group(self, group_id: int) -> int:
+        """Tombstone every live row of a group (e.g. all clauses of an MOU)"""
+        return self._delete_rows(lambda: self.group_ids == group_id)
+
+    def _delete_rows(self, select) -> int:
+        """Tombstone the live rows matching ``select()``, evaluated under the writer lock"""
+        lock_file = self._file_lock()
+        try:
+            with self._lock:
+                self.refresh()
+                rows = np.flatnonzero(select() & self._alive).astype(np.int64)
+                if len(rows):
+                    with open(self._path('tombstones'), 'ab') as f:
+                        f.write(rows.tobytes())
+                    self.refresh()
+                return int(len(rows))
+        finally:
+            lock_file.close()
+
+    def compact(self, on_compacted=None) -> int:
+        """
+        Rewrite live rows into a new generation
+
+        Args:
+            on_compacted: Optional callback(store) run under the writer lock
+                once the new generation is visible
+
+        Returns:
+            Number of rows dropped
+        """
+        lock_file = self._file_lock()
+        try:
+            with self._lock:
+                self.refresh()
+                old_generation = self._generation
+                new_generation = old_generation + 1
+                alive = self._alive
+                dropped = int(self._rows - alive.sum())
+
+                with open(self._path('vectors', new_generation), 'wb') as f:
+                    for start in range(0, self._rows, 65536):
+                        f.write(np.ascontiguousarray(self._vectors[start:start + 65536][alive[start:start + 65536]]).tobytes())
+                with open(self._path('ids', new_generation), 'wb') as f:
+                    f.write(np.ascontiguousarray(self._ids[alive]).tobytes())
+
+                meta = self._read_meta()
+                meta['generation'] = new_generation
+                self._write_meta(meta)
+                self.refresh()
+
+                # Readers that still map the old files keep them alive until they refresh
+                for name in ('vectors', 'ids', 'tombstones'):
+                    try:
+                        os.remove(self._path(name, old_generation))
+                    except FileNotFoundError:
+                        pass
+
+                if on_compacted is not None:
+                    on_compacted(self)
+                return dropped
+        finally:
+            lock_file.close()
+
+    def stats(self) -> Dict:
+        """Report size and layout"""
+        self.refresh()
+        return {
+            'model': self.model_name,
+            'dim': self.dim,
+            'dtype': self.dtype.name,
+            'generation': self._generation,
+            'rows': self._rows,
+            'alive': len(self),
+            'tombstones': int(len(self._deleted)),
+            'disk_mb': round(self._size(self._path('vectors')) / (1024 * 1024), 1),
+        }
+
+
+_STORES: Dict[str, EmbeddingStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _store_root() -> str:
+    from .ai_services import _get_setting
+    return str(_get_setting('AI_INDEX_DIR', 'ai_index'))
+
+
+def _store_directory(kind: str, model_name: str) -> str:
+    return os.path.join(_store_root(), kind, model_name.replace('/', '__'))
+
+
+def get_embedding_store(kind: str, model_name: str, dim: int) -> EmbeddingStore:
+    """
+    Return the process-wide store for an object kind ("clauses", "documents")
+    and embedding model. Each model has its own directory.
+    """
+    key = f"{kind}:{model_name}"
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None:
+            from .ai_services import _get_setting
+            store = _STORES[key] = EmbeddingStore(
+                _store_directory(kind, model_name), dim,
+                dtype=_get_setting('AI_EMBEDDING_DTYPE', 'float16'),
+                model_name=model_name,
+            )
+        return store
+
+
+def find_embedding_store(kind: str, model_name: str) -> Optional[EmbeddingStore]:
+    """Return the store for an object kind and model if one exists on disk, without knowing its dimension"""
+    try:
+        with open(os.path.join(_store_directory(kind, model_name), 'meta.json')) as f:
+            dim = json.load(f)['dim']
+    except FileNotFoundError:
+        return None
+    return get_embedding_store(kind, model_name, dim)
+
+
+def delete_mou_embeddings(mou_id: int) -> int:
+    """
+    Tombstone the clause and document vectors of an MOU in every store on disk,
+    including stores of models this process has not loaded
+
+    Returns:
+        Number of vectors tombstoned
+    """
+    if not HAS_NUMPY:
+        return 0
+
+    deleted = 0
+    root = _store_root()
+    for kind in ('clauses', 'documents'):
+        try:
+            model_dirs = os.listdir(os.path.join(root, kind))
+        except FileNotFoundError:
+            continue
+        for model_dir in model_dirs:
+            meta_path = os.path.join(root, kind, model_dir, 'meta.json')
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                store = get_embedding_store(kind, meta.get('model') or model_dir.replace('__', '/'), meta['dim'])
+                deleted += store.delete_group(mou_id)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.warning(f"Could not tombstone embeddings of MOU {mou_id} in {model_dir}: {str(e)}")
+    return deleted
@@ -0,0 +1,399 @@
+"""
+Nearest-neighbour index over clause embeddings
+Similarity queries run as matrix products over the memory-mapped clause
+embedding store (see ai_embeddings), so every worker process searches the same
+on-disk vectors without loading them into private memory or reading other
+clauses from the database.
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .ai_embeddings import EmbeddingStore, find_embedding_store, get_embedding_store
+
+logger = logging.getLogger(__name__)
+
+
+class ClauseVectorIndex:
+    """
+    Cosine-similarity index over L2-normalized clause embeddings
+
+    Vectors are appended with ``add`` and removed per MOU with ``remove_mou``;
+    both go straight to the embedding store, and other processes see the
+    change on their next ``refresh``.
+
+    Small indexes are searched exhaustively. Once the index holds
+    ``IVF_MIN_SIZE`` vectors, compaction trains spherical k-means centroids
+    (an inverted-file index) and queries only scan the ``nprobe`` lists whose
+    centroids are closest, keeping latency in milliseconds at a few hundred
+    thousand clauses. Centroids and list assignments are saved next to the
+    store for its current generation; rows appended later are assigned by
+    each process as it sees them.
+    """
+
+    QUERY_BLOCK_SIZE = 64
+    IVF_MIN_SIZE = 50000
+    MAX_LISTS = 1024
+    TRAIN_POINTS_PER_LIST = 32
+    KMEANS_ITERATIONS = 8
+    ASSIGN_CHUNK_SIZE = 16384
+    MAX_DEAD_FRACTION = 0.25
+
+    def __init__(self, store: EmbeddingStore, nprobe: int = 16):
+        self.store = store
+        self.dim = store.dim
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._generation = None
+        self._ivf_mtime = None
+        self._centroids = None
+        self._trained_size = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = None
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def ivf_path(self) -> str:
+        return os.path.join(self.store.directory, 'ivf.npz')
+
+    # Persistence -----------------------------------------------------------
+
+    def refresh(self):
+        """Pick up vectors, deletions and compactions written by other processes"""
+        with self._lock:
+            self.store.refresh()
+            if self._generation != self.store.generation or (
+                    self._centroids is None and self._ivf_modified() != self._ivf_mtime):
+                self._load_ivf()
+
+            rows = len(self.store.object_ids)
+            if self._centroids is not None and len(self._assign) < rows:
+                new_assign = self._assign_to(self.store.vectors[len(self._assign):rows], self._centroids)
+                self._assign = np.concatenate([self._assign, new_assign])
+                self._lists = None
+
+    def _ivf_modified(self) -> Optional[int]:
+        try:
+            return os.stat(self.ivf_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load_ivf(self):
+        """
+        Load the IVF lists saved for the store's current generation. Without
+        lists for it, the file is only read again once it changes.
+        """
+        self._centroids = None
+        self._trained_size = 0
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = None
+        self._generation = self.store.generation
+        self._ivf_mtime = self._ivf_modified()
+        if self._ivf_mtime is None:
+            return
+        try:
+            with np.load(self.ivf_path) as ivf:
+                if int(ivf['generation']) != self.store.generation:
+                    # Compaction is still writing the lists; search exhaustively until then
+                    return
+                self._centroids = ivf['centroids'].astype(np.float32)
+                self._trained_size = int(ivf['trained_size'])
+                self._assign = ivf['assign'].astype(np.int32)
+        except FileNotFoundError:
+            self._ivf_mtime = None
+
+    def _write_ivf(self, generation: int, centroids, assign, trained_size: int):
+        tmp_path = os.path.join(self.store.directory, '.ivf.npz.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, generation=generation, centroids=centroids, assign=assign, trained_size=trained_size)
+        os.replace(tmp_path, self.ivf_path)
+
+    # Mutation ----------------------------------------------------------------
+
+    def add(self, vectors, clause_ids: Sequence[int], mou_ids: Sequence[int]):
+        """Append normalized vectors for the given clauses"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not len(vectors):
+            return
+
+        with self._lock:
+            self.store.append(vectors, clause_ids, mou_ids)
+            self.refresh()
+            if self._needs_compaction():
+                self.compact()
+
+    def remove_mou(self, mou_id: int, keep: Sequence[int] = ()) -> int:
+        """Tombstone the clauses of an MOU, except the clause ids in ``keep`` (e.g. before re-indexing it)"""
+        with self._lock:
+            if not len(keep):
+                return self.store.delete_group(mou_id)
+            self.store.refresh()
+            rows = (self.store.group_ids == mou_id) & self.store.alive
+            stale = np.setdiff1d(self.store.object_ids[rows], np.asarray(keep, dtype=np.int64))
+            return self.store.delete(stale)
+
+    def _needs_compaction(self) -> bool:
+        rows = len(self.store.object_ids)
+        alive = len(self)
+        if rows - alive > self.MAX_DEAD_FRACTION * max(rows, 1) and rows - alive > 1000:
+            return True
+        if self._centroids is None:
+            return alive >= self.IVF_MIN_SIZE
+        return alive > 2 * self._trained_size
+
+    def compact(self):
+        """
+        Compact the embedding store, dropping tombstoned rows, and save IVF
+        lists for the new generation. (Re)trains the centroids when the index
+        first reaches IVF_MIN_SIZE or has doubled since they were trained.
+        """
+        with self._lock:
+            self.refresh()
+            centroids = self._centroids
+            trained_size = self._trained_size
+
+            def rebuild_lists(store):
+                vectors = store.vectors
+                new_centroids, new_trained_size = centroids, trained_size
+                if len(vectors) >= self.IVF_MIN_SIZE and (centroids is None or len(vectors) > 2 * trained_size):
+                    new_centroids = self._train_centroids(vectors)
+                    new_trained_size = len(vectors)
+                if new_centroids is None:
+                    try:
+                        os.remove(self.ivf_path)
+                    except FileNotFoundError:
+                        pass
+                    return
+                assign = self._assign_to(vectors, new_centroids)
+                self._write_ivf(store.generation, new_centroids, assign, new_trained_size)
+
+            self.store.compact(on_compacted=rebuild_lists)
+            self.refresh()
+
+    # Inverted file -----------------------------------------------------------
+
+    def _assign_to(self, vectors, centroids):
+        """Nearest centroid (by inner product) for each vector"""
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), self.ASSIGN_CHUNK_SIZE):
+            chunk = np.asarray(vectors[start:start + self.ASSIGN_CHUNK_SIZE], dtype=np.float32)
+            assign[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return assign
+
+    def _train_centroids(self, vectors):
+        """Spherical k-means on a sample of the vectors"""
+        rng = np.random.default_rng(0)
+        nlist = int(min(self.MAX_LISTS, max(16, np.sqrt(len(vectors)))))
+        sample_size = min(len(vectors), nlist * self.TRAIN_POINTS_PER_LIST)
+        sample = np.asarray(vectors[rng.choice(len(vectors), sample_size, replace=False)], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.KMEANS_ITERATIONS):
+            assign = self._assign_to(sample, centroids)
+            order = np.argsort(assign, kind='stable')
+            counts = np.bincount(assign, minlength=nlist)
+            used = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[used]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids[used] = sums / np.maximum(norms, 1e-12)
+
+        logger.info(f"Trained {nlist} IVF lists on {sample_size} clause vectors")
+        return centroids
+
+    def _inverted_lists(self):
+        """Row numbers grouped by list, with list offsets (rebuilt after appends)"""
+        if self._lists is None:
+            assign = self._assign
+            order = np.argsort(assign, kind='stable')
+            offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=len(self._centroids)))))
+            self._lists = (order, offsets)
+        return self._lists
+
+    # Query -------------------------------------------------------------------
+
+    def search(self, queries, k: int = 5, exclude_mou_id: Optional[int] = None,
+               min_score: float = 0.0) -> List[List[Tuple[int, int, float]]]:
+        """
+        Find the top-k most similar clauses for each query vector
+
+        Args:
+            queries: (n, dim) array of normalized query vectors
+            k: Neighbours per query
+            exclude_mou_id: Skip clauses of this MOU (e.g. the one being analyzed)
+            min_score: Minimum cosine similarity
+
+        Returns:
+            For each query, a list of (clause_id, mou_id, score) tuples, best first
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            self.refresh()
+            vectors = self.store.vectors
+            alive = self.store.alive
+            clause_ids = self.store.object_ids
+            mou_ids = self.store.group_ids
+            size = len(clause_ids)
+            centroids = self._centroids
+            lists = self._inverted_lists() if centroids is not None else None
+
+            if not size or not len(queries):
+                return [[] for _ in range(len(queries))]
+
+            if lists is None:
+                return self._search_exhaustive(queries, k, exclude_mou_id, min_score,
+                                               vectors, alive, clause_ids, mou_ids)
+
+            order, offsets = lists
+            nprobe = min(self.nprobe, len(centroids))
+            probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+            # Gather each probed list from the memory map once for all queries probing it
+            query_scores = [[] for _ in range(len(queries))]
+            query_rows = [[] for _ in range(len(queries))]
+            for list_id in np.unique(probes):
+                rows = order[offsets[list_id]:offsets[list_id + 1]]
+                keep = alive[rows]
+                if exclude_mou_id is not None:
+                    keep &= mou_ids[rows] != exclude_mou_id
+                rows = rows[keep]
+                if not len(rows):
+                    continue
+                probing = np.flatnonzero((probes == list_id).any(axis=1))
+                scores = queries[probing] @ np.asarray(vectors[rows], dtype=np.float32).T
+                for query_index, row_scores in zip(probing, scores):
+                    query_scores[query_index].append(row_scores)
+                    query_rows[query_index].append(rows)
+
+            return [
+                self._top_k(np.concatenate(scores), np.concatenate(rows), k, min_score, clause_ids, mou_ids)
+                if scores else []
+                for scores, rows in zip(query_scores, query_rows)
+            ]
+
+    def _search_exhaustive(self, queries, k, exclude_mou_id, min_score, vectors, alive, clause_ids, mou_ids):
+        rows = np.flatnonzero(alive)
+        if exclude_mou_id is not None:
+            rows = rows[mou_ids[rows] != exclude_mou_id]
+        candidates = np.asarray(vectors[rows], dtype=np.float32)
+
+        results = []
+        for start in range(0, len(queries), self.QUERY_BLOCK_SIZE):
+            scores = queries[start:start + self.QUERY_BLOCK_SIZE] @ candidates.T
+            for row_scores in scores:
+                results.append(self._top_k(row_scores, rows, k, min_score, clause_ids, mou_ids))
+        return results
+
+    def _top_k(self, scores, rows, k, min_score, clause_ids, mou_ids):
+        if not len(rows):
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (int(clause_ids[rows[i]]), int(mou_ids[rows[i]]), round(float(scores[i]), 4))
+            for i in top if scores[i] >= min_score
+        ]
+
+    def stats(self) -> Dict:
+        """Report index size and on-disk layout"""
+        stats = self.store.stats()
+        stats.update({
+            'vectors': stats['alive'],
+            'ivf_lists': 0 if self._centroids is None else len(self._centroids),
+            'nprobe': self.nprobe,
+        })
+        return stats
+
+
+_INDEXES: Dict[str, ClauseVectorIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_clause_index(model_name: str, dim: int) -> ClauseVectorIndex:
+    """Return the process-wide index over an embedding model's clause store"""
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(model_name)
+        if index is None:
+            from .ai_services import _get_setting
+            index = _INDEXES[model_name] = ClauseVectorIndex(
+                get_embedding_store('clauses', model_name, dim),
+                nprobe=_get_setting('AI_INDEX_NPROBE', 16)
+            )
+        return index
+
+
+def update_similar_clauses(ai_analysis, analyzer=None) -> int:
+    """
+    Embed an analysis' clauses, store their top-k neighbours from other MOUs in
+    ``similar_clauses``, add them to the index and store the MOU's document vector
+
+    Args:
+        ai_analysis: AIAnalysis whose ClauseAnalysis rows were just written
+        analyzer: ClauseAnalyzer providing the sentence encoder (defaults to the shared deep-tier one)
+
+    Returns:
+        Number of clauses updated
+    """
+    if not HAS_NUMPY:
+        return 0
+
+    from .ai_models import ClauseAnalysis
+    from .ai_services import _get_setting, get_analyzer
+
+    analyzer = analyzer or get_analyzer('deep')
+    clauses = list(ai_analysis.clauses.only('id', 'clause_text'))
+    if not clauses:
+        return 0
+
+    # Clauses kept from an earlier analysis (incremental re-analysis) are
+    # already in the store; only new ones are embedded
+    existing = find_embedding_store('clauses', analyzer.SIMILARITY_MODEL_NAME)
+    stored = existing.get(c.id for c in clauses) if existing is not None else {}
+    missing = [c for c in clauses if c.id not in stored]
+    missing_ids = {c.id for c in missing}
+    if missing:
+        embedded = analyzer.embed_clauses([c.clause_text for c in missing])
+        if embedded is None:
+            return 0
+        stored.update(zip((c.id for c in missing), embedded))
+    vectors = np.stack([stored[c.id] for c in clauses]).astype(np.float32)
+
+    index = get_clause_index(analyzer.SIMILARITY_MODEL_NAME, vectors.shape[1])
+    mou_id = ai_analysis.mou_id
+    # Unchanged clauses keep their rows; only removed and new clauses change the index
+    index.remove_mou(mou_id, keep=[c.id for c in clauses if c.id not in missing_ids])
+
+    neighbours = index.search(
+        vectors,
+        k=_get_setting('AI_SIMILAR_CLAUSES_TOP_K', 5),
+        exclude_mou_id=mou_id,
+        min_score=_get_setting('AI_SIMILAR_CLAUSES_MIN_SCORE', 0.75),
+    )
+    for clause, hits in zip(clauses, neighbours):
+        clause.similar_clauses = [
+            {'clause_id': clause_id, 'mou_id': other_mou_id, 'score': score}
+            for clause_id, other_mou_id, score in hits
+        ]
+    ClauseAnalysis.objects.bulk_update(clauses, ['similar_clauses'], batch_size=500)
+
+    if missing:
+        index.add(np.stack([stored[c.id] for c in missing]), [c.id for c in missing], [mou_id] * len(missing))
+
+    # Document vector: normalized mean of the clause vectors
+    document_vector = vectors.mean(axis=0)
+    document_vector /= max(float(np.linalg.norm(document_vector)), 1e-12)
+    documents = get_embedding_store('documents', analyzer.SIMILARITY_MODEL_NAME, vectors.shape[1])
+    documents.delete_group(mou_id)
+    documents.append(document_vector[None, :], [mou_id], [mou_id])
+    return len(clauses)
@@ -0,0 +1,376 @@
+"""
+Boilerplate clause library with MinHash LSH near-duplicate matching
+Standard clauses (confidentiality, governing law, force majeure, ...) reappear
+with only party names, dates or numbering changed, which the exact-hash clause
+cache misses. The library holds canonical clauses with known labels; new
+clauses whose word shingles are near-duplicates of a library clause copy its
+labels instead of going through model inference.
+"""
+
+import hashlib
+import logging
+import re
+import statistics
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .ai_cache import normalize_clause_text
+from .ai_rules import get_rule_engine
+
+logger = logging.getLogger(__name__)
+
+_NUMBERING_RE = re.compile(r'^\s*(?:(?:clause|article|section)\s+)?(?:\d+|[ivxlc]+|[a-z])(?:\.\d+)*[.:)]\s+', re.IGNORECASE)
+# Capitalized names (parties, places) following a lower-case word or comma
+_NAME_RE = re.compile(r"(?<=[a-z,;] )[A-Z][\w'&.-]*(?: (?:of|and|for|the|de|&) [A-Z][\w'&.-]*| [A-Z][\w'&.-]*)*")
+_DIGITS_RE = re.compile(r'\d+')
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 5
+
+# Labels copied from a library entry onto a matching clause
+LABEL_FIELDS = ('type', 'confidence', 'risk_score', 'risk_factors', 'suggestions', 'sentiment')
+
+
+def library_normalize(clause_text: str) -> str:
+    """
+    Normalize a clause for near-duplicate matching: without its numbering,
+    with mid-sentence capitalized names and digits (dates, amounts,
+    references) collapsed, lowercase and without punctuation
+    """
+    text = _NUMBERING_RE.sub('', normalize_clause_text(clause_text))
+    text = _NAME_RE.sub('NAME', text).lower()
+    text = _DIGITS_RE.sub('0', text)
+    return ' '.join(_PUNCTUATION_RE.sub(' ', text).split())
+
+
+def library_hash(clause_text: str) -> str:
+    """Hash of the library-normalized clause text"""
+    return hashlib.sha256(library_normalize(clause_text).encode('utf-8')).hexdigest()
+
+
+def shingles(clause_text: str) -> frozenset:
+    """Word ``SHINGLE_SIZE``-grams of the library-normalized clause"""
+    words = library_normalize(clause_text).split()
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([' '.join(words)]) if words else frozenset()
+    return frozenset(' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+class MinHasher:
+    """MinHash signatures from universal hashes (a * x + b) mod p of CRC32 shingle hashes"""
+
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: Iterable[str]):
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set), dtype=np.uint64)
+        if not len(hashes):
+            return np.full(self.num_perm, self.PRIME, dtype=np.uint64)
+        # a, x < 2**32 so a * x + b stays below 2**64
+        return ((hashes[:, None] * self._a[None, :] + self._b[None, :]) % self.PRIME).min(axis=0)
+
+
+class ClauseLibrary:
+    """
+    In-memory LSH index over the active ClauseLibraryEntry rows
+
+    Signatures are split into ``bands`` bands of ``num_perm // bands`` rows;
+    clauses sharing any band bucket with an entry are candidates, and a
+    candidate matches when the exact Jaccard similarity of the shingle sets
+    is at least ``min_similarity``. The index reloads from the database when
+    the entries change (checked at most every ``refresh_seconds``).
+    """
+
+    def __init__(self, min_similarity: float = 0.8, num_perm: int = 128, bands: int = 16,
+                 refresh_seconds: float = 300):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.min_similarity = min_similarity
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.refresh_seconds = refresh_seconds
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.RLock()
+        self._entries: List[Dict] = []
+        self._shingles: List[frozenset] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self._db_state = None
+        self._checked_at = 0.0
+        self.stats_counters = {'lookups': 0, 'matches': 0, 'too_short': 0}
+
+    # Index ------------------------------------------------------------------
+
+    def _band_keys(self, signature) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def add_entry(self, entry: Dict) -> int:
+        """Index an entry dictionary (``text`` plus LABEL_FIELDS); returns its position"""
+        with self._lock:
+            position = len(self._entries)
+            entry_shingles = shingles(entry['text'])
+            self._entries.append(entry)
+            self._shingles.append(entry_shingles)
+            for key in self._band_keys(self.hasher.signature(entry_shingles)):
+                self._buckets.setdefault(key, []).append(position)
+            return position
+
+    def load(self, entries: Iterable[Dict]):
+        """Replace the index contents"""
+        with self._lock:
+            self._entries, self._shingles, self._buckets = [], [], {}
+            for entry in entries:
+                self.add_entry(entry)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Reload from the database if entries were added, changed or removed
+
+        Returns:
+            True if the index was reloaded
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                from django.db.models import Count, Max
+                from .ai_models import ClauseLibraryEntry
+
+                active = ClauseLibraryEntry.objects.filter(is_active=True)
+                state = tuple(active.aggregate(count=Count('id'), updated=Max('updated_at')).values())
+                if not force and state == self._db_state:
+                    return False
+                self.load(entry.as_label_dict() for entry in active.order_by('id'))
+                self._db_state = state
+                return True
+            except Exception as e:
+                logger.warning(f"Clause library refresh failed: {str(e)}")
+                return False
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Matching ---------------------------------------------------------------
+
+    def best_match(self, clause_text: str) -> Optional[Tuple[Dict, float]]:
+        """Return (entry, similarity) of the most similar entry above ``min_similarity``"""
+        clause_shingles = shingles(clause_text)
+        if len(clause_shingles) < MIN_SHINGLES:
+            self.stats_counters['too_short'] += 1
+            return None
+
+        candidates = set()
+        for key in self._band_keys(self.hasher.signature(clause_shingles)):
+            candidates.update(self._buckets.get(key, ()))
+
+        best = None
+        for position in candidates:
+            entry_shingles = self._shingles[position]
+            similarity = len(clause_shingles & entry_shingles) / len(clause_shingles | entry_shingles)
+            if similarity >= self.min_similarity and (best is None or similarity > best[1]):
+                best = (self._entries[position], similarity)
+        return best
+
+    def match_many(self, clauses: List[str]) -> Dict[int, Dict]:
+        """
+        Label clauses that are near-duplicates of library entries
+
+        Returns:
+            Mapping of clause index to a clause analysis built from the
+            matching entry's labels; the risk score is recomputed from the
+            entry's risk factors with the current rule engine weights
+        """
+        self.refresh()
+        if not self._entries:
+            return {}
+
+        rule_engine = get_rule_engine()
+        results = {}
+        hits = Counter()
+        with self._lock:
+            for index, clause_text in enumerate(clauses):
+                self.stats_counters['lookups'] += 1
+                match = self.best_match(clause_text)
+                if match is None:
+                    continue
+                entry, similarity = match
+                results[index] = dict(
+                    {field: entry[field] for field in LABEL_FIELDS},
+                    text=clause_text,
+                    risk_score=rule_engine.risk_score(entry['risk_factors']),
+                    risk_factors=list(entry['risk_factors']),
+                    suggestions=list(entry['suggestions']),
+                    library_entry=entry.get('id'),
+                    library_similarity=round(similarity, 4),
+                )
+                if entry.get('id') is not None:
+                    hits[entry['id']] += 1
+        self.stats_counters['matches'] += len(results)
+        if hits:
+            self._record_hits(hits)
+        return results
+
+    def _record_hits(self, hits: Counter):
+        try:
+            from django.db.models import F
+            from .ai_models import ClauseLibraryEntry
+
+            by_count: Dict[int, List[int]] = {}
+            for entry_id, count in hits.items():
+                by_count.setdefault(count, []).append(entry_id)
+            for count, entry_ids in by_count.items():
+                ClauseLibraryEntry.objects.filter(id__in=entry_ids).update(hit_count=F('hit_count') + count)
+        except Exception as e:
+            logger.warning(f"Could not record clause library hits: {str(e)}")
+
+    def stats(self) -> Dict:
+        """Report how much inference the library avoided in this process"""
+        counters = dict(self.stats_counters)
+        counters['entries'] = len(self._entries)
+        counters['inference_avoided'] = counters['matches']
+        counters['match_rate'] = round(counters['matches'] / counters['lookups'], 4) if counters['lookups'] else 0.0
+        return counters
+
+
+def seed_library(min_occurrences: int = 3, min_agreement: float = 0.8, include_rules: bool = False,
+                 min_similarity: Optional[float] = None) -> Dict:
+    """
+    Build library entries from analyzed clauses that recur across MOUs
+
+    Clauses are clustered by near-duplicate matching (the same test used at
+    analysis time); clusters seen in at least ``min_occurrences`` MOUs whose
+    clause type agrees in at least ``min_agreement`` of the rows become
+    entries labelled with the majority type, median risk and mean confidence.
+    Clusters that match an existing entry only update its occurrence count.
+
+    Returns:
+        Counts of rows scanned, clusters found, and entries created/merged
+    """
+    from .ai_models import ClauseAnalysis, ClauseLibraryEntry
+    from .ai_services import _get_setting
+
+    min_similarity = min_similarity or _get_setting('AI_CLAUSE_LIBRARY_MIN_SIMILARITY', 0.8)
+    rows = ClauseAnalysis.objects.filter(ai_analysis__status='completed')
+    if not include_rules:
+        rows = rows.filter(ai_analysis__analyzer_version__contains='|ai:')
+
+    # Identical texts after normalization first, so each is hashed once
+    groups: Dict[str, Dict] = {}
+    scanned = 0
+    for row in rows.values(
+            'clause_text', 'clause_type', 'risk_score', 'confidence_score', 'sentiment',
+            'risk_factors', 'suggestions', 'ai_analysis__mou_id').iterator(chunk_size=2000):
+        scanned += 1
+        group = groups.setdefault(library_hash(row['clause_text']), {'rows': [], 'mous': set()})
+        group['rows'].append(row)
+        group['mous'].add(row['ai_analysis__mou_id'])
+
+    # Merge near-duplicate groups into clusters, largest group first
+    clusterer = ClauseLibrary(min_similarity=min_similarity)
+    clusters: List[Dict] = []
+    for group in sorted(groups.values(), key=lambda g: len(g['rows']), reverse=True):
+        text = group['rows'][0]['clause_text']
+        if len(shingles(text)) < MIN_SHINGLES:
+            continue
+        match = clusterer.best_match(text)
+        if match is None:
+            clusterer.add_entry({'text': text, 'cluster': len(clusters)})
+            clusters.append({'text': text, 'rows': list(group['rows']), 'mous': set(group['mous'])})
+        else:
+            cluster = clusters[match[0]['cluster']]
+            cluster['rows'].extend(group['rows'])
+            cluster['mous'] |= group['mous']
+
+    library = ClauseLibrary(min_similarity=min_similarity)
+    existing = {entry.text_hash: entry for entry in ClauseLibraryEntry.objects.all()}
+    library.load(entry.as_label_dict() for entry in existing.values() if entry.is_active)
+
+    created = merged = ambiguous = 0
+    candidates = sorted(
+        (c for c in clusters if len(c['mous']) >= min_occurrences),
+        key=lambda c: len(c['mous']), reverse=True
+    )
+    for cluster in candidates:
+        text = cluster['text']
+        entry = existing.get(library_hash(text))
+        if entry is None:
+            match = library.best_match(text)
+            entry = existing.get(match[0]['text_hash']) if match else None
+        if entry is not None:
+            entry.occurrences = max(entry.occurrences, len(cluster['mous']))
+            entry.save(update_fields=['occurrences', 'updated_at'])
+            merged += 1
+            continue
+
+        type_counts = Counter(row['clause_type'] for row in cluster['rows'])
+        clause_type, type_count = type_counts.most_common(1)[0]
+        if type_count / len(cluster['rows']) < min_agreement:
+            ambiguous += 1
+            continue
+        labelled = [row for row in cluster['rows'] if row['clause_type'] == clause_type]
+        representative = labelled[0]
+        entry = ClauseLibraryEntry.objects.create(
+            canonical_text=text,
+            text_hash=library_hash(text),
+            clause_type=clause_type,
+            risk_score=round(statistics.median(float(r['risk_score'] or 0) for r in labelled), 2),
+            confidence_score=round(statistics.mean(float(r['confidence_score'] or 0) for r in labelled), 4),
+            sentiment=representative['sentiment'],
+            risk_factors=representative['risk_factors'],
+            suggestions=representative['suggestions'],
+            occurrences=len(cluster['mous']),
+        )
+        existing[entry.text_hash] = entry
+        library.add_entry(entry.as_label_dict())
+        created += 1
+
+    shared = get_clause_library()
+    if shared is not None:
+        shared.refresh(force=True)
+    return {
+        'rows_scanned': scanned,
+        'clusters': len(clusters),
+        'candidates': len(candidates),
+        'created': created,
+        'merged': merged,
+        'ambiguous': ambiguous,
+    }
+
+
+_CLAUSE_LIBRARY = None
+_CLAUSE_LIBRARY_LOCK = threading.Lock()
+
+
+def get_clause_library() -> Optional[ClauseLibrary]:
+    """Return the process-wide clause library, or None when disabled or numpy is missing"""
+    global _CLAUSE_LIBRARY
+    from .ai_services import _get_setting
+
+    if not HAS_NUMPY or not _get_setting('AI_CLAUSE_LIBRARY_ENABLED', True):
+        return None
+    with _CLAUSE_LIBRARY_LOCK:
+        if _CLAUSE_LIBRARY is None:
+            _CLAUSE_LIBRARY = ClauseLibrary(
+                min_similarity=_get_setting('AI_CLAUSE_LIBRARY_MIN_SIMILARITY', 0.8),
+                refresh_seconds=_get_setting('AI_CLAUSE_LIBRARY_REFRESH_SECONDS', 300),
+            )
+        return _CLAUSE_LIBRARY
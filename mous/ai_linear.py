@@ -0,0 +1,234 @@
+"""
+TF-IDF linear clause classifier, the middle tier of the analysis cascade
+A sparse TF-IDF (word 1-2 grams of the library-normalized clause) plus
+logistic regression model is trained from stored clause types (see the
+``train_clause_classifier`` command) and saved as a versioned artifact under
+AI_INDEX_DIR. In the cascade it types the clauses the keyword rules cannot
+decide, a whole batch per call, and only clauses it is unsure of reach the
+transformer.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import joblib
+    import numpy as np
+    import sklearn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    HAS_SKLEARN = True
+except ImportError:
+    HAS_SKLEARN = False
+
+from .ai_library import library_normalize
+
+logger = logging.getLogger(__name__)
+
+MIN_EXAMPLES_PER_TYPE = 5
+
+
+class LinearClauseClassifier:
+    """
+    A trained TF-IDF + logistic regression pipeline and its metadata
+
+    ``version`` identifies the artifact (a hash of the training set and
+    parameters) and is part of the analyzer version of cascades using it.
+    """
+
+    def __init__(self, pipeline, version: str, meta: Dict):
+        self.pipeline = pipeline
+        self.version = version
+        self.meta = meta
+
+    @property
+    def classes(self) -> List[str]:
+        return [str(label) for label in self.pipeline.classes_]
+
+    def predict(self, clauses: Sequence[str]) -> Tuple[List[str], List[float]]:
+        """
+        Type a batch of clauses in one vectorized pass
+
+        Returns:
+            (clause types, confidences), the confidence being the predicted
+            probability of the chosen type
+        """
+        if not clauses:
+            return [], []
+        probabilities = self.pipeline.predict_proba(list(clauses))
+        best = probabilities.argmax(axis=1)
+        classes = self.classes
+        return [classes[index] for index in best], [round(float(p), 4) for p in probabilities.max(axis=1)]
+
+    def save(self, directory: str) -> str:
+        """Write the artifact and make it the current version; returns its path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'clause_tfidf-{self.version}.joblib')
+        tmp_path = f'{path}.tmp'
+        joblib.dump({'pipeline': self.pipeline, 'version': self.version, 'meta': self.meta}, tmp_path)
+        os.replace(tmp_path, path)
+        # Metadata beside the model, so versions can be listed without unpickling them
+        with open(os.path.join(directory, f'clause_tfidf-{self.version}.json'), 'w') as f:
+            json.dump(dict(self.meta, version=self.version), f, indent=2)
+        activate_version(self.version, directory)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearClauseClassifier':
+        artifact = joblib.load(path)
+        trained_with = artifact['meta'].get('sklearn_version')
+        if trained_with and trained_with != sklearn.__version__:
+            logger.warning(f"Clause classifier {artifact['version']} was trained with scikit-learn {trained_with}, "
+                           f"running {sklearn.__version__}")
+        return cls(artifact['pipeline'], artifact['version'], artifact['meta'])
+
+
+def classifier_directory() -> str:
+    from .ai_services import _get_setting
+    return os.path.join(str(_get_setting('AI_INDEX_DIR', 'ai_index')), 'linear')
+
+
+def _current_path(directory: str) -> str:
+    return os.path.join(directory, 'current.json')
+
+
+def activate_version(version: str, directory: Optional[str] = None):
+    """Make a saved classifier version the one analyzers use"""
+    directory = directory or classifier_directory()
+    if not os.path.exists(os.path.join(directory, f'clause_tfidf-{version}.joblib')):
+        raise ValueError(f'No saved clause classifier {version}')
+    tmp_path = f'{_current_path(directory)}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': version, 'activated': datetime.now().isoformat(timespec='seconds')}, f)
+    os.replace(tmp_path, _current_path(directory))
+
+
+def saved_versions(directory: Optional[str] = None) -> List[Dict]:
+    """Metadata of every saved classifier, newest first"""
+    directory = directory or classifier_directory()
+    versions = []
+    if not os.path.isdir(directory):
+        return versions
+    for name in os.listdir(directory):
+        if name.startswith('clause_tfidf-') and name.endswith('.json'):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    versions.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {name}: {str(e)}")
+    return sorted(versions, key=lambda meta: meta.get('trained_at', ''), reverse=True)
+
+
+_LOADED: Dict[str, Tuple[float, Optional[LinearClauseClassifier]]] = {}
+_LOADED_LOCK = threading.Lock()
+
+
+def get_linear_classifier() -> Optional[LinearClauseClassifier]:
+    """
+    Return the current saved classifier, or None when none was trained;
+    reloaded when another version is activated, so workers pick up a retrain
+    """
+    if not HAS_SKLEARN:
+        return None
+    directory = classifier_directory()
+    pointer = _current_path(directory)
+    try:
+        mtime = os.path.getmtime(pointer)
+    except OSError:
+        return None
+    with _LOADED_LOCK:
+        loaded = _LOADED.get(directory)
+        if loaded is None or loaded[0] != mtime:
+            classifier = None
+            try:
+                with open(pointer) as f:
+                    version = json.load(f)['version']
+                classifier = LinearClauseClassifier.load(os.path.join(directory, f'clause_tfidf-{version}.joblib'))
+            except Exception as e:
+                logger.warning(f"Could not load the clause classifier: {str(e)}")
+            loaded = _LOADED[directory] = (mtime, classifier)
+        return loaded[1]
+
+
+def _build_pipeline(regularization: float, max_features: int):
+    return make_pipeline(
+        TfidfVectorizer(
+            preprocessor=library_normalize, ngram_range=(1, 2), sublinear_tf=True, min_df=2,
+            max_features=max_features, dtype=np.float32,
+        ),
+        LogisticRegression(C=regularization, max_iter=1000, class_weight='balanced'),
+    )
+
+
+def _evaluate(pipeline, texts: List[str], labels: List[str]) -> Dict:
+    started = time.perf_counter()
+    predicted = pipeline.predict(texts)
+    elapsed = time.perf_counter() - started
+    per_type: Dict[str, List[int]] = {}
+    for prediction, label in zip(predicted, labels):
+        counts = per_type.setdefault(label, [0, 0])
+        counts[0] += prediction == label
+        counts[1] += 1
+    return {
+        'clauses': len(texts),
+        'accuracy': round(sum(c[0] for c in per_type.values()) / len(texts), 4),
+        'per_type_accuracy': {t: round(c[0] / c[1], 4) for t, c in sorted(per_type.items())},
+        'ms_per_clause': round(elapsed * 1000 / len(texts), 4),
+    }
+
+
+def train_linear_classifier(examples: Sequence[Tuple[Optional[int], str, str]], test_share: float = 0.2,
+                            regularization: float = 4.0, max_features: int = 200000,
+                            seed: int = 42) -> Tuple[LinearClauseClassifier, Dict]:
+    """
+    Train a classifier from labelled clauses (see ai_prototypes.labelled_examples)
+
+    ``test_share`` of the examples is held out to measure accuracy and
+    latency; the saved model is then refitted on all of them. Types with
+    fewer than MIN_EXAMPLES_PER_TYPE examples are left out.
+
+    Returns:
+        (classifier, report with the example counts and held-out evaluation)
+    """
+    counts: Dict[str, int] = {}
+    for _, _, clause_type in examples:
+        counts[clause_type] = counts.get(clause_type, 0) + 1
+    skipped = sorted(t for t, count in counts.items() if count < MIN_EXAMPLES_PER_TYPE)
+    examples = [e for e in examples if e[2] not in skipped]
+    if len({e[2] for e in examples}) < 2:
+        raise ValueError('Need labelled clauses of at least two clause types')
+
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    texts, labels = [e[1] for e in examples], [e[2] for e in examples]
+    test_size = int(len(examples) * test_share)
+
+    report = {'examples': len(examples), 'skipped_types': skipped}
+    if test_size:
+        started = time.perf_counter()
+        pipeline = _build_pipeline(regularization, max_features).fit(texts[test_size:], labels[test_size:])
+        report['holdout'] = dict(_evaluate(pipeline, texts[:test_size], labels[:test_size]),
+                                 train_seconds=round(time.perf_counter() - started, 3))
+
+    started = time.perf_counter()
+    pipeline = _build_pipeline(regularization, max_features).fit(texts, labels)
+    report['train_seconds'] = round(time.perf_counter() - started, 3)
+
+    digest = hashlib.sha256(json.dumps([regularization, max_features, sorted(zip(labels, texts))]).encode('utf-8'))
+    meta = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'examples': dict(sorted((t, c) for t, c in counts.items() if t not in skipped)),
+        'features': len(pipeline[0].vocabulary_),
+        'regularization': regularization,
+        'holdout_accuracy': report.get('holdout', {}).get('accuracy'),
+    }
+    return LinearClauseClassifier(pipeline, digest.hexdigest()[:12], meta), report
@@ -12,6 +12,7 @@ class AIAnalysis(models.Model):
     
     STATUS_CHOICES = [
         ('pending', 'Pending Analysis'),
+        ('in_progress', 'Analysis In Progress'),
         ('completed', 'Analysis Completed'),
         ('failed', 'Analysis Failed'),
         ('outdated', 'Outdated - Needs Reanalysis'),
@@ -25,6 +26,13 @@ class AIAnalysis(models.Model):
         ('pending', 'Pending Analysis'),
     ]
     
+    # Cheapest first (see ai_services.ANALYSIS_TIERS)
+    TIER_CHOICES = [
+        ('rules', 'Rules only'),
+        ('standard', 'Standard'),
+        ('deep', 'Deep'),
+    ]
+    
     mou = models.OneToOneField(
         MOU, 
         on_delete=models.CASCADE, 
@@ -37,6 +45,41 @@ class AIAnalysis(models.Model):
     model_version = models.CharField(max_length=50, default='1.0.0')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    # Inputs the stored results were computed from (used to skip unchanged re-runs)
+    source_hash = models.CharField(
+        max_length=64, 
+        blank=True,
+        help_text="SHA-256 of the analyzed PDF file"
+    )
+    analyzer_version = models.CharField(
+        max_length=100, 
+        blank=True,
+        help_text="Analyzer, model and rule-set version that produced the results"
+    )
+    analysis_tier = models.CharField(
+        max_length=10,
+        choices=TIER_CHOICES,
+        blank=True,
+        help_text="Analysis tier that produced the results (blank for analyses made before tiers)"
+    )
+    
+    # Progress of a streaming analysis (clauses are persisted in chunks)
+    clauses_total = models.PositiveIntegerField(default=0)
+    clauses_done = models.PositiveIntegerField(default=0)
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Percent of clauses analyzed"
+    )
+    delivery_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Deliveries of the running analysis task that have not finished (reset when a run ends)"
+    )
+    shard_progress = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Clauses and progress of each finished shard of a sharded analysis, by shard index"
+    )
+    
     # Analysis results
     overall_risk_score = models.DecimalField(
         max_digits=4, 
@@ -123,6 +166,44 @@ class AIAnalysis(models.Model):
         }
         return colors.get(risk_level, "secondary")
     
+    def is_current(self, source_hash, analyzer_version, analysis_tier=None):
+        """
+        Whether this completed analysis was produced from the same PDF and
+        analyzer, by ``analysis_tier`` or a deeper tier
+        """
+        return (
+            self.status == 'completed' and
+            bool(self.source_hash) and
+            self.source_hash == source_hash and
+            self.analyzer_version == analyzer_version and
+            (analysis_tier is None or self.covers_tier(analysis_tier))
+        )
+    
+    def covers_tier(self, analysis_tier):
+        """Whether the stored results include everything ``analysis_tier`` produces"""
+        if not self.analysis_tier:
+            return True  # Analyses made before tiers ran every model
+        tiers = [choice for choice, _ in self.TIER_CHOICES]
+        return tiers.index(self.analysis_tier) >= tiers.index(analysis_tier)
+    
+    def can_resume(self, source_hash, analyzer_version):
+        """Whether an interrupted streaming analysis of the same PDF and analyzer can be continued"""
+        return (
+            self.status in ('in_progress', 'failed') and
+            bool(self.source_hash) and
+            self.source_hash == source_hash and
+            self.analyzer_version == analyzer_version and
+            self.clauses_total > 0
+        )
+    
+    def is_running(self, stale_after_seconds=600):
+        """Whether a streaming analysis is in progress and has persisted a chunk recently"""
+        from django.utils import timezone
+        return (
+            self.status == 'in_progress' and
+            self.last_updated >= timezone.now() - timezone.timedelta(seconds=stale_after_seconds)
+        )
+    
     def get_high_risk_clauses(self):
         """Get clauses with risk score > 7"""
         return self.clauses.filter(risk_score__gt=7)
@@ -151,6 +232,20 @@ class ClauseAnalysis(models.Model):
         ('unknown', 'Unknown/Other'),
     ]
     
+    CHANGE_STATUS_CHOICES = [
+        ('unchanged', 'Unchanged'),
+        ('modified', 'Modified'),
+        ('added', 'Added'),
+    ]
+    
+    TIER_CHOICES = [
+        ('rules', 'Rules'),
+        ('fallback', 'Rules Fallback'),
+        ('linear', 'Linear Classifier'),
+        ('model', 'Model'),
+        ('library', 'Clause Library'),
+    ]
+    
     SENTIMENT_CHOICES = [
         ('positive', 'Positive'),
         ('neutral', 'Neutral'),
@@ -173,11 +268,27 @@ class ClauseAnalysis(models.Model):
     )
     
     # Position in document (optional)
+    sequence = models.PositiveIntegerField(
+        default=0,
+        help_text="Index of the clause in the analyzed document"
+    )
+    change_status = models.CharField(
+        max_length=20,
+        choices=CHANGE_STATUS_CHOICES,
+        blank=True,
+        help_text="Change since the previously analyzed PDF version (blank after a full analysis)"
+    )
     start_position = models.IntegerField(null=True, blank=True)
     end_position = models.IntegerField(null=True, blank=True)
     clause_number = models.CharField(max_length=20, blank=True)
     
     # AI analysis results
+    tier = models.CharField(
+        max_length=20,
+        choices=TIER_CHOICES,
+        blank=True,
+        help_text="Analysis tier that decided the clause labels"
+    )
     confidence_score = models.DecimalField(
         max_digits=5, 
         decimal_places=4,
@@ -224,7 +335,10 @@ class ClauseAnalysis(models.Model):
     class Meta:
         verbose_name = "Clause Analysis"
         verbose_name_plural = "Clause Analyses"
-        ordering = ['clause_number', 'start_position']
+        ordering = ['sequence', 'clause_number', 'start_position']
+        indexes = [
+            models.Index(fields=['ai_analysis', 'sequence']),
+        ]
     
     def __str__(self):
         return f"{self.get_clause_type_display()} clause (Risk: {self.risk_score})"
@@ -373,3 +487,87 @@ class AIModelMetrics(models.Model):
     
     def __str__(self):
         return f"AI Metrics for {self.date} (v{self.model_version})"
+
+
+class ClauseResultCache(models.Model):
+    """Shared tier of the clause-level analysis cache"""
+    
+    cache_key = models.CharField(
+        max_length=64, 
+        unique=True,
+        help_text="SHA-256 of the analyzer version and normalized clause text"
+    )
+    model_version = models.CharField(max_length=100, db_index=True)
+    result = models.JSONField(default=dict)
+    
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Clause Result Cache Entry"
+        verbose_name_plural = "Clause Result Cache"
+    
+    def __str__(self):
+        return f"Cached clause result {self.cache_key[:12]} (v{self.model_version})"
+
+
+class ClauseLibraryEntry(models.Model):
+    """Canonical boilerplate clause with known labels, matched by MinHash LSH"""
+    
+    canonical_text = models.TextField()
+    text_hash = models.CharField(
+        max_length=64, 
+        unique=True,
+        help_text="SHA-256 of the library-normalized clause text"
+    )
+    
+    # Labels copied onto matching clauses
+    clause_type = models.CharField(
+        max_length=50, 
+        choices=ClauseAnalysis.CLAUSE_TYPE_CHOICES,
+        default='unknown'
+    )
+    risk_score = models.DecimalField(max_digits=4, decimal_places=2, default=0)
+    confidence_score = models.DecimalField(max_digits=5, decimal_places=4, default=0)
+    sentiment = models.CharField(
+        max_length=20, 
+        choices=ClauseAnalysis.SENTIMENT_CHOICES,
+        default='neutral'
+    )
+    risk_factors = models.JSONField(default=list)
+    suggestions = models.JSONField(default=list)
+    
+    occurrences = models.IntegerField(
+        default=0,
+        help_text="Number of MOUs the clause was seen in when seeded"
+    )
+    hit_count = models.IntegerField(
+        default=0,
+        help_text="Clauses labelled from this entry instead of model inference"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Clause Library Entry"
+        verbose_name_plural = "Clause Library"
+        ordering = ['-occurrences']
+    
+    def __str__(self):
+        return f"{self.get_clause_type_display()} library clause ({self.occurrences} MOUs)"
+    
+    def as_label_dict(self):
+        """Entry in the form indexed by ai_library.ClauseLibrary"""
+        return {
+            'id': self.id,
+            'text': self.canonical_text,
+            'text_hash': self.text_hash,
+            'type': self.clause_type,
+            'confidence': float(self.confidence_score),
+            'risk_score': float(self.risk_score),
+            'sentiment': self.sentiment,
+            'risk_factors': self.risk_factors or [],
+            'suggestions': self.suggestions or [],
+        }
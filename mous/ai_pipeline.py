@@ -0,0 +1,345 @@
+"""
+Pipelined analysis of many MOUs
+A single analysis reads the PDF, extracts its text, runs the models and
+writes rows strictly in sequence, leaving the CPU idle during file and
+database I/O and the database idle during inference. AnalysisPipeline runs
+these as stages connected by bounded queues, so while one document is being
+classified the next ones are read and extracted and the previous ones are
+written:
+
+    reader -> extractor pool -> inference -> batched writer
+
+Stages are threads in one process: the models are shared, and torch and the
+database driver release the GIL while they work. PDF text extraction is pure
+Python, so the extractor threads hand it to a pool of processes. Each stage
+reports its utilization (busy time over wall time) and the depth of its
+input queue.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Put on a queue once per consumer thread when its producers are done
+_DONE = object()
+
+
+@dataclass
+class PipelineItem:
+    """One MOU travelling through the pipeline"""
+    mou: object
+    pdf_path: str
+    source_hash: str
+    started: float
+    full_text: str = ''
+    ai_result: Optional[Dict] = None
+
+
+@dataclass
+class StageStats:
+    """Work and queue depth counters of one stage"""
+    name: str
+    threads: int = 1
+    items: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    queue_samples: int = 0
+    queue_total: int = 0
+    queue_max: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, busy_seconds: float, items: int = 1, errors: int = 0):
+        with self._lock:
+            self.items += items
+            self.errors += errors
+            self.busy_seconds += busy_seconds
+
+    def sample_queue(self, depth: int):
+        with self._lock:
+            self.queue_samples += 1
+            self.queue_total += depth
+            self.queue_max = max(self.queue_max, depth)
+
+    def report(self, wall_seconds: float) -> Dict:
+        capacity = wall_seconds * self.threads
+        return {
+            'threads': self.threads,
+            'items': self.items,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy_seconds, 3),
+            'utilization': round(self.busy_seconds / capacity, 3) if capacity else 0.0,
+            'queue_depth_mean': round(self.queue_total / self.queue_samples, 2) if self.queue_samples else 0.0,
+            'queue_depth_max': self.queue_max,
+        }
+
+
+def _init_extractor():
+    """Process pool initializer: extract_pdf_data needs the Django apps loaded"""
+    import django
+    django.setup()
+
+
+def _extract_text(pdf_path: str) -> str:
+    from .utils import extract_pdf_data
+    pdf_data = extract_pdf_data(pdf_path, run_ai_analysis=False)
+    if pdf_data.get('error'):
+        raise ValueError(pdf_data['error'])
+    return pdf_data['full_text']
+
+
+class AnalysisPipeline:
+    """
+    Staged executor that analyzes many MOUs with overlapping I/O, extraction,
+    inference and persistence
+
+    Args:
+        tier: Analysis tier (defaults to AI_ANALYSIS_TIER)
+        force: Analyze MOUs whose stored analysis is current as well
+        extract_workers: Extractor threads and processes (defaults to
+            AI_PIPELINE_EXTRACT_WORKERS; 0 extracts in the extractor thread)
+        queue_size: Capacity of each queue between stages (defaults to AI_PIPELINE_QUEUE_SIZE)
+        write_batch: Analyses written per transaction (defaults to AI_PIPELINE_WRITE_BATCH)
+        progress: Called with (mou, message) when an MOU finishes or is skipped
+    """
+
+    def __init__(self, tier: Optional[str] = None, force: bool = False, extract_workers: Optional[int] = None,
+                 queue_size: Optional[int] = None, write_batch: Optional[int] = None,
+                 progress: Optional[Callable[[object, str], None]] = None):
+        from .ai_services import _get_setting, get_analyzer
+
+        self.analyzer = get_analyzer(tier)
+        self.force = force
+        if extract_workers is None:
+            extract_workers = _get_setting('AI_PIPELINE_EXTRACT_WORKERS', 2)
+        self.extract_workers = max(int(extract_workers), 0)
+        self.queue_size = max(int(queue_size or _get_setting('AI_PIPELINE_QUEUE_SIZE', 8)), 1)
+        self.write_batch = max(int(write_batch or _get_setting('AI_PIPELINE_WRITE_BATCH', 8)), 1)
+        self.progress = progress
+        self.results: Dict[str, int] = {'analyzed': 0, 'skipped': 0, 'failed': 0}
+        self._results_lock = threading.Lock()
+
+    def run(self, mous: Iterable) -> Dict:
+        """
+        Analyze ``mous`` (MOU instances or a queryset) and return the report
+
+        Returns:
+            Dictionary with ``analyzed``, ``skipped`` and ``failed`` counts,
+            ``wall_seconds``, ``documents_per_second`` and per-stage ``stages``
+            (items, busy time, utilization, input queue depth)
+        """
+        extractor_threads = max(self.extract_workers, 1)
+        self.stages = {
+            'reader': StageStats('reader'),
+            'extractor': StageStats('extractor', threads=extractor_threads),
+            'inference': StageStats('inference'),
+            'writer': StageStats('writer'),
+        }
+        to_extract = queue.Queue(self.queue_size)
+        to_infer = queue.Queue(self.queue_size)
+        to_write = queue.Queue(self.queue_size)
+
+        pool = None
+        if self.extract_workers:
+            # Spawned, not forked: the parent already runs threads
+            import multiprocessing
+            pool = ProcessPoolExecutor(self.extract_workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_extractor)
+
+        threads = [self._thread('reader', self._reader, mous, to_extract, extractor_threads)]
+        threads += [self._thread(f'extractor-{i}', self._extractor, to_extract, to_infer, pool)
+                    for i in range(extractor_threads)]
+        threads.append(self._thread('inference', self._inference, to_infer, to_write, extractor_threads))
+        threads.append(self._thread('writer', self._writer, to_write))
+
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        wall_seconds = time.perf_counter() - started
+
+        report = dict(self.results)
+        report['analysis_tier'] = self.analyzer.tier
+        report['wall_seconds'] = round(wall_seconds, 3)
+        report['documents_per_second'] = round(report['analyzed'] / wall_seconds, 3) if wall_seconds else None
+        report['stages'] = {name: stage.report(wall_seconds) for name, stage in self.stages.items()}
+        logger.info(
+            f"Pipeline analyzed {report['analyzed']} MOUs in {report['wall_seconds']}s "
+            f"({report['skipped']} skipped, {report['failed']} failed)"
+        )
+        return report
+
+    # Stages ------------------------------------------------------------------
+
+    def _thread(self, name: str, target: Callable, *args) -> threading.Thread:
+        def run_stage():
+            from django.db import connection
+            try:
+                target(*args)
+            finally:
+                # Each stage thread has its own database connection
+                connection.close()
+        return threading.Thread(target=run_stage, name=f'pipeline-{name}')
+
+    def _put(self, target: queue.Queue, item, stage: str):
+        """Put ``item`` on the input queue of ``stage``, sampling its depth"""
+        target.put(item)
+        self.stages[stage].sample_queue(target.qsize())
+
+    def _reader(self, mous, to_extract: queue.Queue, consumers: int):
+        """Resolve each MOU's PDF, hash it and skip MOUs whose analysis is current"""
+        from .utils import compute_file_hash
+
+        stage = self.stages['reader']
+        version = self.analyzer.version_key
+        try:
+            for mou in mous:
+                busy = time.perf_counter()
+                try:
+                    if not mou.pdf_file:
+                        self._finish(mou, 'skipped', 'no PDF file')
+                        stage.record(time.perf_counter() - busy)
+                        continue
+                    pdf_path = mou.pdf_file.path
+                    source_hash = compute_file_hash(pdf_path)
+                    existing = getattr(mou, 'ai_analysis', None)
+                    if (not self.force and existing is not None and
+                            existing.is_current(source_hash, version, self.analyzer.effective_tier)):
+                        self._finish(mou, 'skipped', 'analysis is up to date')
+                        stage.record(time.perf_counter() - busy)
+                        continue
+                except Exception as e:
+                    stage.record(time.perf_counter() - busy, errors=1)
+                    self._fail(mou, e)
+                    continue
+                stage.record(time.perf_counter() - busy)
+                self._put(to_extract, PipelineItem(mou, pdf_path, source_hash, time.time()), 'extractor')
+        finally:
+            for _ in range(consumers):
+                to_extract.put(_DONE)
+
+    def _extractor(self, to_extract: queue.Queue, to_infer: queue.Queue, pool: Optional[ProcessPoolExecutor]):
+        """Extract the PDF text (in the process pool when there is one)"""
+        stage = self.stages['extractor']
+        while True:
+            item = to_extract.get()
+            if item is _DONE:
+                to_infer.put(_DONE)
+                return
+            busy = time.perf_counter()
+            try:
+                if pool is not None:
+                    item.full_text = pool.submit(_extract_text, item.pdf_path).result()
+                else:
+                    item.full_text = _extract_text(item.pdf_path)
+                if not item.full_text.strip():
+                    raise ValueError('Could not extract text from PDF')
+            except Exception as e:
+                stage.record(time.perf_counter() - busy, errors=1)
+                self._fail(item.mou, e)
+                continue
+            stage.record(time.perf_counter() - busy)
+            self._put(to_infer, item, 'inference')
+
+    def _inference(self, to_infer: queue.Queue, to_write: queue.Queue, producers: int):
+        """Segment and analyze each document with the shared analyzer"""
+        stage = self.stages['inference']
+        remaining = producers
+        try:
+            while remaining:
+                item = to_infer.get()
+                if item is _DONE:
+                    remaining -= 1
+                    continue
+                busy = time.perf_counter()
+                try:
+                    item.ai_result = self.analyzer.analyze_document(item.full_text, item.mou.title)
+                    item.ai_result['source_hash'] = item.source_hash
+                    item.full_text = ''  # Not needed downstream; free it while the item waits
+                except Exception as e:
+                    stage.record(time.perf_counter() - busy, errors=1)
+                    self._fail(item.mou, e)
+                    continue
+                stage.record(time.perf_counter() - busy)
+                self._put(to_write, item, 'writer')
+        finally:
+            to_write.put(_DONE)
+
+    def _writer(self, to_write: queue.Queue):
+        """Persist finished analyses, several per transaction"""
+        from django.db import transaction
+        from .tasks import _finish_ai_analysis
+        from .utils import save_ai_analysis
+
+        stage = self.stages['writer']
+        done = False
+        while not done:
+            batch = [to_write.get()]
+            while len(batch) < self.write_batch:
+                try:
+                    batch.append(to_write.get_nowait())
+                except queue.Empty:
+                    break
+            done = any(item is _DONE for item in batch)
+            batch = [item for item in batch if item is not _DONE]
+            if not batch:
+                continue
+
+            busy = time.perf_counter()
+            saved, failed = [], []
+            try:
+                with transaction.atomic():
+                    for item in batch:
+                        item.ai_result['processing_time'] = time.time() - item.started
+                        try:
+                            # A savepoint per MOU: a failed save rolls back only that MOU
+                            with transaction.atomic():
+                                saved.append((item, save_ai_analysis(item.mou, item.ai_result)))
+                        except Exception as e:
+                            failed.append((item, e))
+            except Exception as e:
+                # The commit failed, so none of the batch was saved
+                saved, failed = [], [(item, e) for item in batch]
+            for item, error in failed:
+                self._fail(item.mou, error)
+            for item, ai_analysis in saved:
+                try:
+                    _finish_ai_analysis(item.mou, ai_analysis, item.ai_result, self.analyzer, item.started)
+                except Exception as e:
+                    # The analysis is saved; similar clauses or the notification are missing
+                    logger.warning(f"Finishing the analysis of MOU {item.mou.id} failed: {str(e)}")
+                self._finish(item.mou, 'analyzed', f"risk score {item.ai_result['overall_risk_score']:.2f}")
+            stage.record(time.perf_counter() - busy, items=len(batch), errors=len(batch) - len(saved))
+
+    # Outcomes ----------------------------------------------------------------
+
+    def _finish(self, mou, outcome: str, message: str):
+        with self._results_lock:
+            self.results[outcome] += 1
+        if self.progress:
+            self.progress(mou, f'{outcome}: {message}')
+
+    def _fail(self, mou, error: Exception):
+        from .tasks import _mark_ai_analysis_failed
+
+        logger.error(f"Pipeline analysis of MOU {mou.id} failed: {str(error)}")
+        _mark_ai_analysis_failed(mou.id, str(error))
+        self._finish(mou, 'failed', str(error))
+
+
+def run_pipeline(mous: Iterable, **options) -> Dict:
+    """
+    Analyze many MOUs with an AnalysisPipeline
+    Usage: report = run_pipeline(MOU.objects.exclude(pdf_file=''), tier='standard')
+    """
+    return AnalysisPipeline(**options).run(mous)
@@ -0,0 +1,325 @@
+"""
+Clause typing by nearest label prototype
+Each clause type is represented by the normalized mean sentence-encoder
+embedding of clauses labelled with it (stored ClauseAnalysis rows, clause
+library entries and a small seed set). With AI_CLAUSE_TYPING=prototype the
+analyzer embeds every clause once, takes the type of the most similar
+prototype, and reuses the same vector for similar clause search, instead of
+running the classifier and the sentence encoder as two separate passes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+# Softmax temperature over prototype cosine similarities (the confidence score)
+TEMPERATURE = 0.05
+
+# Example clauses per type, so every type has a prototype before enough
+# clauses of it have been analyzed
+SEED_CLAUSES = {
+    'termination': [
+        "Either party may terminate this Memorandum by giving ninety days written notice to the other party.",
+        "This Memorandum shall expire at the end of the initial term unless renewed in writing by both parties.",
+    ],
+    'payment': [
+        "The partner shall pay the agreed fees within thirty days of receipt of a valid invoice.",
+        "Each party shall bear its own costs and expenses unless otherwise agreed in writing.",
+    ],
+    'liability': [
+        "Each party shall be liable for damages caused by its own negligence or wilful misconduct.",
+        "The partner shall indemnify and hold harmless the university against all claims arising from its acts.",
+    ],
+    'confidentiality': [
+        "Each party shall keep confidential all proprietary information disclosed by the other party.",
+        "Confidential information shall not be disclosed to any third party without prior written consent.",
+    ],
+    'intellectual_property': [
+        "Intellectual property created jointly under this Memorandum shall be owned jointly by the parties.",
+        "Nothing in this Memorandum transfers any copyright, patent or trademark rights of either party.",
+    ],
+    'dispute_resolution': [
+        "Any dispute arising out of this Memorandum shall first be settled amicably through negotiation.",
+        "Disputes not settled by mediation within sixty days shall be referred to binding arbitration.",
+    ],
+    'governing_law': [
+        "This Memorandum shall be governed by and construed in accordance with the laws of the host country.",
+        "The courts of the jurisdiction of the first party shall have exclusive jurisdiction over this Memorandum.",
+    ],
+    'force_majeure': [
+        "Neither party shall be liable for delay caused by force majeure, including acts of God, war or epidemic.",
+        "Obligations are suspended while performance is prevented by events beyond the reasonable control of a party.",
+    ],
+    'performance': [
+        "The partner shall deliver the agreed training programme to the standards set out in the annex.",
+        "Each party shall meet the milestones and performance indicators agreed in the annual work plan.",
+    ],
+    'warranties': [
+        "Each party represents and warrants that it has full authority to enter into this Memorandum.",
+        "The partner warrants that the services will be performed with reasonable skill and care.",
+    ],
+    'general': [
+        "The parties shall establish a joint steering committee that meets twice a year.",
+        "This Memorandum may only be amended in writing signed by authorized representatives of both parties.",
+    ],
+}
+
+
+class LabelPrototypes:
+    """
+    One unit-length prototype vector per clause type
+
+    ``vectors`` is a float32 (types x dim) matrix aligned with ``types``;
+    ``counts`` is the number of examples each prototype was averaged from.
+    ``version`` identifies the prototypes in the analyzer version, so clause
+    results cached under older prototypes are not reused.
+    """
+
+    def __init__(self, types: List[str], vectors, counts: List[int], model_name: str, created: str = ''):
+        self.types = list(types)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+        self.counts = [int(count) for count in counts]
+        self.model_name = model_name
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+        digest = hashlib.sha256(json.dumps(self.types).encode('utf-8'))
+        digest.update(self.vectors.tobytes())
+        self.version = digest.hexdigest()[:12]
+
+    @classmethod
+    def from_embeddings(cls, labels: Sequence[str], vectors, model_name: str) -> 'LabelPrototypes':
+        """Average the embeddings of each label into a normalized prototype"""
+        labels = np.asarray(labels)
+        types = sorted(set(labels.tolist()))
+        prototypes = np.stack([vectors[labels == clause_type].mean(axis=0) for clause_type in types])
+        prototypes /= np.maximum(np.linalg.norm(prototypes, axis=1, keepdims=True), 1e-12)
+        counts = [int((labels == clause_type).sum()) for clause_type in types]
+        return cls(types, prototypes, counts, model_name)
+
+    def classify(self, embeddings) -> Tuple[List[str], List[float]]:
+        """
+        Type of each embedding by its most similar prototype
+
+        Returns:
+            (clause types, confidences), the confidence being the softmax
+            probability of the chosen prototype over all prototypes
+        """
+        scores = np.asarray(embeddings, dtype=np.float32) @ self.vectors.T
+        best = scores.argmax(axis=1)
+        scaled = np.exp((scores - scores.max(axis=1, keepdims=True)) / TEMPERATURE)
+        confidences = scaled.max(axis=1) / scaled.sum(axis=1)
+        return [self.types[index] for index in best], [round(float(c), 4) for c in confidences]
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        meta = {'types': self.types, 'counts': self.counts, 'model_name': self.model_name, 'created': self.created}
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta)), vectors=self.vectors)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'LabelPrototypes':
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(meta['types'], data['vectors'], meta['counts'], meta['model_name'], meta['created'])
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'model_name': self.model_name,
+            'created': self.created,
+            'dim': int(self.vectors.shape[1]),
+            'examples': dict(zip(self.types, self.counts)),
+        }
+
+
+def prototypes_path(model_name: str) -> str:
+    from .ai_services import _get_setting
+    return os.path.join(
+        str(_get_setting('AI_INDEX_DIR', 'ai_index')), 'prototypes', f"{model_name.replace('/', '__')}.npz"
+    )
+
+
+_LOADED: Dict[str, Tuple[float, LabelPrototypes]] = {}
+_LOADED_LOCK = threading.Lock()
+
+
+def get_label_prototypes(model_name: str) -> Optional[LabelPrototypes]:
+    """
+    Return the saved prototypes of an embedding model, or None when none were
+    built; reloaded when the file changes, so workers pick up a rebuild
+    """
+    if not HAS_NUMPY:
+        return None
+    path = prototypes_path(model_name)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _LOADED_LOCK:
+        loaded = _LOADED.get(path)
+        if loaded is None or loaded[0] != mtime:
+            try:
+                loaded = _LOADED[path] = (mtime, LabelPrototypes.load(path))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Could not load label prototypes: {str(e)}")
+                return None
+        return loaded[1]
+
+
+def labelled_examples(min_confidence: float = 0.7, per_type: int = 200,
+                      include_library: bool = True) -> List[Tuple[Optional[int], str, str]]:
+    """
+    Labelled clauses to build prototypes from
+
+    Returns:
+        (ClauseAnalysis id or None, text, clause type) tuples: the most recent
+        ``per_type`` stored clauses of each type with at least
+        ``min_confidence``, plus the active clause library entries
+    """
+    from .ai_models import ClauseAnalysis, ClauseLibraryEntry
+
+    examples = []
+    for clause_type, _ in ClauseAnalysis.CLAUSE_TYPE_CHOICES:
+        if clause_type == 'unknown':
+            continue
+        rows = ClauseAnalysis.objects.filter(
+            clause_type=clause_type, confidence_score__gte=min_confidence
+        ).order_by('-id').values_list('id', 'clause_text')[:per_type]
+        examples.extend((clause_id, text, clause_type) for clause_id, text in rows)
+    if include_library:
+        entries = ClauseLibraryEntry.objects.filter(is_active=True).exclude(clause_type='unknown')
+        examples.extend((None, text, clause_type) for text, clause_type in entries.values_list(
+            'canonical_text', 'clause_type'))
+    return examples
+
+
+def seed_examples() -> List[Tuple[Optional[int], str, str]]:
+    return [(None, text, clause_type) for clause_type, texts in SEED_CLAUSES.items() for text in texts]
+
+
+def embed_examples(analyzer, examples: Sequence[Tuple[Optional[int], str, str]]):
+    """
+    Embeddings of labelled examples, read from the clause embedding store
+    where similar clause search already stored them and encoded otherwise
+    """
+    from .ai_embeddings import find_embedding_store
+
+    store = find_embedding_store('clauses', analyzer.SIMILARITY_MODEL_NAME)
+    stored = store.get(e[0] for e in examples if e[0] is not None) if store is not None else {}
+    missing = [index for index, example in enumerate(examples) if example[0] not in stored]
+    embedded = analyzer.embed_clauses([examples[index][1] for index in missing]) if missing else None
+    if missing and embedded is None:
+        raise ValueError('The sentence encoder is not available')
+
+    dim = embedded.shape[1] if embedded is not None else len(next(iter(stored.values())))
+    vectors = np.zeros((len(examples), dim), dtype=np.float32)
+    for index, example in enumerate(examples):
+        if example[0] in stored:
+            vectors[index] = stored[example[0]]
+    if missing:
+        vectors[missing] = embedded
+    return vectors, len(examples) - len(missing)
+
+
+def build_prototypes(analyzer, examples: Sequence[Tuple[Optional[int], str, str]],
+                     include_seed: bool = True) -> Tuple[LabelPrototypes, Dict]:
+    """
+    Build prototypes from labelled examples (see ``labelled_examples``)
+
+    Returns:
+        (prototypes, report with the example counts and embedding reuse)
+    """
+    examples = list(examples) + (seed_examples() if include_seed else [])
+    if not examples:
+        raise ValueError('No labelled clauses to build prototypes from')
+    started = time.perf_counter()
+    vectors, reused = embed_examples(analyzer, examples)
+    prototypes = LabelPrototypes.from_embeddings([e[2] for e in examples], vectors, analyzer.SIMILARITY_MODEL_NAME)
+    return prototypes, {
+        'examples': len(examples),
+        'seed_examples': len(seed_examples()) if include_seed else 0,
+        'embeddings_reused': reused,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def save_label_prototypes(prototypes: LabelPrototypes) -> str:
+    path = prototypes_path(prototypes.model_name)
+    prototypes.save(path)
+    return path
+
+
+def _typing_run(analyzer, texts: List[str], labels: List[str]) -> Dict:
+    """Label and embed clauses as an analysis with similar clause links does"""
+    started = time.perf_counter()
+    results = analyzer.analyze_clauses(texts)
+    analyzer.embed_clauses(texts)
+    elapsed = time.perf_counter() - started
+
+    per_type: Dict[str, List[int]] = {}
+    for result, label in zip(results, labels):
+        counts = per_type.setdefault(label, [0, 0])
+        counts[0] += result['type'] == label
+        counts[1] += 1
+    correct = sum(counts[0] for counts in per_type.values())
+    return {
+        'analyzer_version': analyzer.version_key,
+        'clauses': len(texts),
+        'seconds': round(elapsed, 3),
+        'clauses_per_second': round(len(texts) / elapsed, 1) if elapsed else None,
+        'accuracy': round(correct / len(texts), 4) if texts else 0.0,
+        'per_type_accuracy': {
+            clause_type: round(counts[0] / counts[1], 4) for clause_type, counts in sorted(per_type.items())
+        },
+    }
+
+
+def compare_typing(examples: Sequence[Tuple[Optional[int], str, str]], holdout: float = 0.3,
+                   include_seed: bool = True, seed: int = 42) -> Dict:
+    """
+    Compare classifier typing with prototype typing on held-out labelled clauses
+
+    Prototypes are built from the other examples. Both modes run the deep
+    tier without cache, library or cascade and embed the clauses for similar
+    clause search, so the timings cover everything a full analysis encodes.
+    Accuracy is agreement with the stored labels.
+    """
+    from .ai_services import ClauseAnalyzer
+
+    examples = list(examples)
+    random.Random(seed).shuffle(examples)
+    test_size = max(1, int(len(examples) * holdout))
+    test, train = examples[:test_size], examples[test_size:]
+
+    options = dict(use_cache=False, use_library=False, cascade=False, tier='deep')
+    classifier = ClauseAnalyzer(clause_typing='model', **options)
+    prototypes, build = build_prototypes(classifier, train, include_seed=include_seed)
+    prototype = ClauseAnalyzer(clause_typing='prototype', prototypes=prototypes, **options)
+
+    texts, labels = [e[1] for e in test], [e[2] for e in test]
+    report = {'train_examples': build['examples'], 'test_clauses': len(test), 'modes': {}}
+    for mode, analyzer in (('classifier', classifier), ('prototype', prototype)):
+        # Models load and warm up outside the measured run
+        analyzer.load_tier_models()
+        _typing_run(analyzer, texts[:2], labels[:2])
+        analyzer.clear_embedding_memo()
+        report['modes'][mode] = _typing_run(analyzer, texts, labels)
+    classifier_rate = report['modes']['classifier']['clauses_per_second']
+    prototype_rate = report['modes']['prototype']['clauses_per_second']
+    report['speedup'] = round(prototype_rate / classifier_rate, 2) if classifier_rate and prototype_rate else None
+    return report
@@ -0,0 +1,217 @@
+"""
+Bulk re-scoring of stored clause analyses with the current rule set
+Changing the rules or risk weights in ai_rules does not need the PDFs or the
+models: stored clause texts are streamed from the database in chunks,
+re-labelled by the compiled rule engine and written back with bulk updates,
+followed by the document rollups and risk flags of each affected analysis.
+"""
+
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .ai_rules import get_rule_engine
+
+logger = logging.getLogger(__name__)
+
+CLAUSE_FIELDS = ['clause_type', 'confidence_score', 'risk_score', 'risk_factors', 'suggestions']
+ANALYSIS_FIELDS = [
+    'overall_risk_score', 'compliance_status', 'analysis_data', 'recommendations',
+    'summary_stats', 'analyzer_version', 'last_updated',
+]
+
+
+def rescored_version(analyzer_version: str, fingerprint: str) -> str:
+    """Analyzer version of a re-scored analysis: the same models, the new rule fingerprint"""
+    if '|' not in analyzer_version:
+        return analyzer_version
+    return f"{analyzer_version.rsplit('|', 1)[0]}|{fingerprint}"
+
+
+def is_rule_based(analyzer_version: str) -> bool:
+    """Whether an analysis was produced by the rule-based fallback rather than the models"""
+    return '|ai:' not in analyzer_version
+
+
+def uses_fallback_scoring(clause_tier: str, analyzer_version: str) -> bool:
+    """
+    Whether a stored clause was scored by the rule-based fallback (every risk
+    factor FALLBACK_RISK_WEIGHT), which also happens inside model analyses
+    when inference fails, rather than with the weighted rules of the model path
+    """
+    if clause_tier == 'fallback':
+        return True
+    if clause_tier == 'rules':
+        # Before the fallback had its own tier, only the cascade decided clauses by rules on the model path
+        return is_rule_based(analyzer_version) or ':cascade' not in analyzer_version
+    return not clause_tier and is_rule_based(analyzer_version)
+
+
+def is_prototype_typed(analyzer_version: str) -> bool:
+    """Whether model-tier clause types came from label prototypes (kept when re-scoring)"""
+    return '|ai:proto:' in analyzer_version
+
+
+def _analysis_batches(analyses, chunk_size: int) -> Iterable[List[int]]:
+    """Group analysis ids into batches of about ``chunk_size`` clauses"""
+    batch, clauses = [], 0
+    for analysis_id, count in analyses.annotate(clause_count=Count('clauses')).order_by('id').values_list(
+            'id', 'clause_count').iterator():
+        batch.append(analysis_id)
+        clauses += count
+        if clauses >= chunk_size:
+            yield batch
+            batch, clauses = [], 0
+    if batch:
+        yield batch
+
+
+def rescore_analyses(chunk_size: Optional[int] = None, force: bool = False, dry_run: bool = False,
+                     mou_ids: Optional[List[int]] = None,
+                     progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Re-apply the current rules and risk weights to every completed analysis
+
+    Args:
+        chunk_size: Clauses loaded and updated per batch (defaults to AI_RESCORE_CHUNK_SIZE)
+        force: Also re-score analyses whose rule fingerprint is already current
+            (analyses without an analyzer version, made before versioning, are
+            always skipped: how they were scored is unknown, so they are left
+            for re-analysis from the PDF)
+        dry_run: Compute the changes without writing them
+        mou_ids: Only re-score the analyses of these MOUs
+        progress: Called with the running totals after each batch
+
+    Returns:
+        Totals: analyses and clauses processed, unversioned analyses skipped,
+        clauses and document scores changed, risk flags written, elapsed seconds
+    """
+    from .ai_models import AIAnalysis, ClauseAnalysis, RiskFlag
+    from .ai_services import ClauseAnalyzer, _get_setting
+    from .utils import _clause_data_from_row, build_risk_flags
+
+    chunk_size = max(int(chunk_size or _get_setting('AI_RESCORE_CHUNK_SIZE', 5000)), 1)
+    fingerprint = get_rule_engine().fingerprint
+    analyzer = ClauseAnalyzer(use_cache=False, use_models=False, use_library=False)
+
+    analyses = AIAnalysis.objects.filter(status='completed')
+    if mou_ids is not None:
+        analyses = analyses.filter(mou_id__in=mou_ids)
+    unversioned = analyses.exclude(analyzer_version__contains='|')
+    skipped = unversioned.count()
+    analyses = analyses.filter(analyzer_version__contains='|')
+    if not force:
+        analyses = analyses.exclude(analyzer_version__endswith=f'|{fingerprint}')
+
+    totals = {
+        'analyses': 0, 'clauses': 0, 'skipped_unversioned': skipped, 'clauses_changed': 0, 'documents_changed': 0,
+        'risk_flags': 0, 'seconds': 0.0, 'dry_run': dry_run, 'rule_fingerprint': fingerprint,
+    }
+    started = time.perf_counter()
+    for analysis_ids in _analysis_batches(analyses, chunk_size):
+        batch = {a.id: a for a in AIAnalysis.objects.filter(id__in=analysis_ids).select_related('mou')}
+        rows_by_analysis: Dict[int, List] = {analysis_id: [] for analysis_id in batch}
+        for row in ClauseAnalysis.objects.filter(ai_analysis_id__in=analysis_ids).order_by('ai_analysis_id', 'sequence'):
+            rows_by_analysis[row.ai_analysis_id].append(row)
+
+        # Repeated boilerplate is labelled once per batch
+        labels: Dict[tuple, Dict] = {}
+        changed_rows, flagged_mous, flags = [], [], []
+        for analysis_id, rows in rows_by_analysis.items():
+            ai_analysis = batch[analysis_id]
+            prototype_typed = is_prototype_typed(ai_analysis.analyzer_version)
+            rows_changed = 0
+            for row in rows:
+                # Types from the linear classifier or label prototypes are not rule-derived
+                learned_type = row.tier == 'linear' or (prototype_typed and row.tier == 'model')
+                kept_type = row.clause_type if learned_type else None
+                # Decided per row: clauses that fell back to rules inside a model analysis keep fallback scoring
+                rule_based = uses_fallback_scoring(row.tier, ai_analysis.analyzer_version)
+                key = (row.clause_text, rule_based, kept_type)
+                if key not in labels:
+                    labels[key] = analyzer.rescore_clause(row.clause_text, rule_based, kept_type)
+                if _apply_labels(row, labels[key]):
+                    changed_rows.append(row)
+                    rows_changed += 1
+            totals['clauses'] += len(rows)
+
+            previous = (_score(ai_analysis.overall_risk_score), ai_analysis.compliance_status)
+            _apply_rollups(ai_analysis, analyzer, [_clause_data_from_row(row) for row in rows], fingerprint)
+            document_changed = previous != (_score(ai_analysis.overall_risk_score), ai_analysis.compliance_status)
+            totals['documents_changed'] += document_changed
+
+            # Flags are only rebuilt where their inputs changed
+            if rows_changed or document_changed:
+                flagged_mous.append(ai_analysis.mou_id)
+                flags.extend(build_risk_flags(ai_analysis.mou, ai_analysis, rows))
+
+        totals['analyses'] += len(batch)
+        totals['clauses_changed'] += len(changed_rows)
+        totals['risk_flags'] += len(flags)
+        if not dry_run:
+            with transaction.atomic():
+                ClauseAnalysis.objects.bulk_update(changed_rows, CLAUSE_FIELDS, batch_size=1000)
+                AIAnalysis.objects.bulk_update(list(batch.values()), ANALYSIS_FIELDS, batch_size=500)
+                RiskFlag.objects.filter(mou_id__in=flagged_mous, is_resolved=False).delete()
+                RiskFlag.objects.bulk_create(flags, batch_size=1000)
+
+        totals['seconds'] = round(time.perf_counter() - started, 3)
+        if progress:
+            progress(dict(totals))
+
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    totals['clauses_per_second'] = round(totals['clauses'] / totals['seconds'], 1) if totals['seconds'] else None
+    logger.info(f"Re-scored {totals['clauses']} clauses in {totals['analyses']} analyses in {totals['seconds']}s")
+    return totals
+
+
+def _score(value) -> Optional[float]:
+    """Stored decimal or computed float score, comparable at the stored precision"""
+    return round(float(value), 2) if value is not None else None
+
+
+def _apply_labels(row, labels: Dict) -> bool:
+    """Copy re-scored labels onto a ClauseAnalysis row; returns True if anything changed"""
+    values = {
+        'clause_type': labels['type'],
+        'risk_score': round(float(labels['risk_score']), 2),
+        'risk_factors': labels['risk_factors'],
+        'suggestions': labels['suggestions'],
+    }
+    if 'confidence' in labels:
+        values['confidence_score'] = round(float(labels['confidence']), 4)
+
+    changed = False
+    for field, value in values.items():
+        current = getattr(row, field)
+        if field in ('risk_score', 'confidence_score'):
+            current = round(float(current), 4) if current is not None else None
+        if current != value:
+            setattr(row, field, value)
+            changed = True
+    return changed
+
+
+def _apply_rollups(ai_analysis, analyzer, clause_results: List[Dict], fingerprint: str):
+    """Recompute the document-level results of an analysis from its re-scored clauses"""
+    previous = ai_analysis.analysis_data or {}
+    ai_data = analyzer.finalize_document_analysis(
+        clause_results, previous.get('key_entities', []), ai_analysis.mou.title
+    )
+    for key in ('analysis_timestamp', 'source_hash', 'version_diff'):
+        if key in previous:
+            ai_data[key] = previous[key]
+    ai_data['analyzer_version'] = rescored_version(ai_analysis.analyzer_version, fingerprint)
+    ai_data['rescored_at'] = timezone.now().isoformat()
+
+    ai_analysis.overall_risk_score = ai_data['overall_risk_score']
+    ai_analysis.compliance_status = ai_data['compliance_status']
+    ai_analysis.analysis_data = ai_data
+    ai_analysis.recommendations = ai_data['recommendations']
+    ai_analysis.summary_stats = ai_data['summary_stats']
+    ai_analysis.analyzer_version = ai_data['analyzer_version']
+    ai_analysis.last_updated = timezone.now()
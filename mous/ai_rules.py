@@ -0,0 +1,239 @@
+"""
+Compiled rule engine for the rule-based clause classifier and risk detector
+Runs on every clause when transformer models are unavailable, so all keyword
+tables and regexes are compiled once per process. Each distinct keyword is
+looked up once per clause (a substring test each, not one combined scan), and
+the clause type and risk factors are both derived from that set of hits.
+"""
+
+import hashlib
+import json
+import re
+from typing import Dict, FrozenSet, List, Tuple
+
+# Clause type keywords, in priority order (first matching type wins)
+CLAUSE_TYPE_KEYWORDS = {
+    'termination': ['termination', 'terminate', 'end', 'expir', 'cancel'],
+    'payment': ['payment', 'fee', 'cost', 'expense', 'invoice', 'billing'],
+    'liability': ['liable', 'liability', 'damages', 'indemnif', 'responsible'],
+    'confidentiality': ['confidential', 'non-disclosure', 'proprietary', 'secret'],
+    'intellectual_property': ['intellectual property', 'copyright', 'patent', 'trademark', 'ip'],
+    'dispute_resolution': ['dispute', 'arbitration', 'mediation', 'court', 'litigation'],
+    'governing_law': ['governing law', 'jurisdiction', 'applicable law'],
+    'force_majeure': ['force majeure', 'acts of god', 'unforeseeable'],
+}
+
+# Risk rules, in reporting order. A rule fires when any of its ``any`` keywords
+# occur, all of its ``all`` keywords occur and none of its ``none`` keywords
+# occur. ``patterns`` are only evaluated when one of their ``requires``
+# keywords is present.
+RISK_RULES = {
+    'Unlimited liability': {'any': ['unlimited liability', 'unlimited damages']},
+    'Vague termination': {'any': ['may terminate', 'at any time', 'without cause']},
+    'No dispute resolution': {'all': ['termination'], 'none': ['dispute', 'arbitration', 'mediation']},
+    'Excessive penalties': {'any': ['penalty', 'fine', 'liquidated damages']},
+    'Broad indemnification': {
+        'patterns': [r'indemnify.*all', r'hold harmless.*any'],
+        'requires': ['indemnify', 'hold harmless'],
+    },
+}
+
+# Risk score contribution of each risk factor (AI path); unlisted factors
+# count DEFAULT_RISK_WEIGHT and a clause without risk factors scores NO_RISK_SCORE
+RISK_WEIGHTS = {
+    'Unlimited liability': 3.0,
+    'Vague termination': 2.0,
+    'No dispute resolution': 2.5,
+    'Excessive penalties': 2.0,
+    'Broad indemnification': 2.5,
+}
+DEFAULT_RISK_WEIGHT = 1.5
+NO_RISK_SCORE = 3.0
+
+# The rule-based fallback scores every risk factor the same
+FALLBACK_RISK_WEIGHT = 1.5
+
+# Document compliance status: non-compliant with more than
+# ``non_compliant_clauses`` clauses scoring above ``high_risk_clause`` or an
+# overall score above ``non_compliant_score``; review required with any such
+# clause or an overall score above ``review_score``
+COMPLIANCE_THRESHOLDS = {
+    'high_risk_clause': 7.0,
+    'non_compliant_clauses': 2,
+    'non_compliant_score': 8.0,
+    'review_score': 6.0,
+}
+
+
+class RuleEngine:
+    """
+    Compiled keyword/regex rules returning clause type and risk factors
+    from one set of keyword hits per lowercased clause
+    """
+
+    def __init__(self, clause_types: Dict[str, List[str]] = None, risk_rules: Dict[str, Dict] = None,
+                 risk_weights: Dict[str, float] = None, compliance_thresholds: Dict[str, float] = None):
+        self.clause_types = clause_types if clause_types is not None else CLAUSE_TYPE_KEYWORDS
+        self.risk_rules = risk_rules if risk_rules is not None else RISK_RULES
+        self.risk_weights = risk_weights if risk_weights is not None else RISK_WEIGHTS
+        self.compliance_thresholds = dict(COMPLIANCE_THRESHOLDS, **(compliance_thresholds or {}))
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [self.clause_types, self.risk_rules, self.risk_weights, self.compliance_thresholds], sort_keys=True
+        ).encode('utf-8')).hexdigest()[:12]
+        self._compile()
+
+    def _compile(self):
+        """Build the shared keyword table and compile regex rules"""
+        keywords = []
+        for words in self.clause_types.values():
+            keywords.extend(words)
+        for rule in self.risk_rules.values():
+            for key in ('any', 'all', 'none', 'requires'):
+                keywords.extend(rule.get(key, []))
+        # Each distinct keyword is searched for exactly once per clause
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k.lower() for k in keywords))
+
+        self._type_rules: List[Tuple[str, FrozenSet[str]]] = [
+            (clause_type, frozenset(w.lower() for w in words))
+            for clause_type, words in self.clause_types.items()
+        ]
+        # Multi-word phrases ("governing law") are stronger evidence than single words
+        self._keyword_weights: Dict[str, int] = {
+            k: (2 if ' ' in k or '-' in k else 1) for k in self.keywords
+        }
+
+        self._risk_rules = []
+        for name, rule in self.risk_rules.items():
+            patterns = rule.get('patterns', [])
+            self._risk_rules.append((
+                name,
+                frozenset(w.lower() for w in rule.get('any', [])),
+                frozenset(w.lower() for w in rule.get('all', [])),
+                frozenset(w.lower() for w in rule.get('none', [])),
+                re.compile('|'.join(f'(?:{p})' for p in patterns)) if patterns else None,
+                frozenset(w.lower() for w in rule.get('requires', [])),
+            ))
+
+    def matched_keywords(self, clause_lower: str) -> FrozenSet[str]:
+        """
+        Return every rule keyword occurring in the (already lowercased) clause
+
+        One substring test per distinct keyword; keywords overlap ("liability"
+        in "unlimited liability"), so a single alternation scan would miss hits.
+        """
+        return frozenset(k for k in self.keywords if k in clause_lower)
+
+    def classify(self, clause_text: str) -> Tuple[str, List[str]]:
+        """
+        Classify a clause and detect its risk factors
+
+        Args:
+            clause_text: Text of the clause
+
+        Returns:
+            Tuple of (clause_type, risk_factors)
+        """
+        clause_lower = clause_text.lower()
+        hits = self.matched_keywords(clause_lower)
+        return self._clause_type(hits), self._risk_factors(clause_lower, hits)
+
+    def classify_with_confidence(self, clause_text: str) -> Tuple[str, List[str], float, bool]:
+        """
+        Classify a clause and rate how clear-cut the classification is
+
+        Confidence grows with the keyword evidence for the chosen type (phrases
+        count double) and its share of the evidence for all matching types.
+
+        Returns:
+            Tuple of (clause_type, risk_factors, confidence, ambiguous), where
+            ambiguous means keywords of more than one clause type matched
+        """
+        clause_lower = clause_text.lower()
+        hits = self.matched_keywords(clause_lower)
+        clause_type = self._clause_type(hits)
+        evidence = {
+            name: sum(self._keyword_weights[k] for k in words & hits)
+            for name, words in self._type_rules if not hits.isdisjoint(words)
+        }
+        if not evidence:
+            confidence = 0.3
+        else:
+            chosen = evidence[clause_type]
+            confidence = 0.5 + 0.45 * (chosen / sum(evidence.values())) * min(chosen, 2) / 2
+        return clause_type, self._risk_factors(clause_lower, hits), round(confidence, 4), len(evidence) > 1
+
+    def clause_type(self, clause_text: str) -> str:
+        """Return only the clause type"""
+        return self._clause_type(self.matched_keywords(clause_text.lower()))
+
+    def risk_factors(self, clause_text: str) -> List[str]:
+        """Return only the risk factors"""
+        clause_lower = clause_text.lower()
+        return self._risk_factors(clause_lower, self.matched_keywords(clause_lower))
+
+    def risk_score(self, risk_factors: List[str]) -> float:
+        """Weighted risk score (0-10) of a clause's risk factors"""
+        if not risk_factors:
+            return NO_RISK_SCORE
+        total_risk = sum(self.risk_weights.get(risk, DEFAULT_RISK_WEIGHT) for risk in risk_factors)
+        return min(total_risk, 10.0)
+
+    def compliance_status(self, overall_risk_score: float, high_risk_clauses: int) -> str:
+        """Document compliance status from its overall score and number of high-risk clauses"""
+        thresholds = self.compliance_thresholds
+        if high_risk_clauses > thresholds['non_compliant_clauses'] or overall_risk_score > thresholds['non_compliant_score']:
+            return 'non_compliant'
+        if high_risk_clauses > 0 or overall_risk_score > thresholds['review_score']:
+            return 'review_required'
+        return 'compliant'
+
+    def _clause_type(self, hits: FrozenSet[str]) -> str:
+        for clause_type, words in self._type_rules:
+            if not hits.isdisjoint(words):
+                return clause_type
+        return 'general'
+
+    def _risk_factors(self, clause_lower: str, hits: FrozenSet[str]) -> List[str]:
+        risks = []
+        for name, any_words, all_words, none_words, pattern, requires in self._risk_rules:
+            if any_words and hits.isdisjoint(any_words):
+                continue
+            if all_words and not all_words <= hits:
+                continue
+            if none_words and not hits.isdisjoint(none_words):
+                continue
+            if pattern is not None:
+                if requires and hits.isdisjoint(requires):
+                    continue
+                if not pattern.search(clause_lower):
+                    continue
+            risks.append(name)
+        return risks
+
+
+_RULE_ENGINE = None
+
+
+def get_rule_engine() -> RuleEngine:
+    """
+    Return the process-wide compiled rule engine
+
+    Risk weights and compliance thresholds can be overridden per deployment
+    with the AI_RISK_WEIGHTS and AI_COMPLIANCE_THRESHOLDS settings.
+    """
+    global _RULE_ENGINE
+    if _RULE_ENGINE is None:
+        from django.conf import settings
+
+        _RULE_ENGINE = RuleEngine(
+            risk_weights=dict(RISK_WEIGHTS, **getattr(settings, 'AI_RISK_WEIGHTS', {})),
+            compliance_thresholds=getattr(settings, 'AI_COMPLIANCE_THRESHOLDS', {}),
+        )
+    return _RULE_ENGINE
+
+
+def set_rule_engine(engine: RuleEngine) -> RuleEngine:
+    """Replace the process-wide rule engine (e.g. to apply simulated weights); returns the previous one"""
+    global _RULE_ENGINE
+    previous, _RULE_ENGINE = get_rule_engine(), engine
+    return previous
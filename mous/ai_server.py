@@ -0,0 +1,504 @@
+"""
+Local inference server with cross-request micro-batching
+One long-lived process owns the ClauseAnalyzer models and serves clause
+classification and embeddings over a Unix socket. Clause
+requests from many Celery tasks are merged into micro-batches (bounded by
+size and a max-wait deadline) so concurrent tasks share forward passes
+instead of competing for CPU threads. Workers use RemoteClauseAnalyzer, a
+thin client that loads no transformer models and segments documents itself,
+so only clause texts cross the socket.
+"""
+
+import base64
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from . import ai_services
+from .ai_services import ANALYSIS_TIERS, ClauseAnalyzer, _get_setting, get_analyzer, resolve_analysis_tier
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+
+
+class InferenceServerError(Exception):
+    """Raised by the client when the server reports an error or cannot be reached"""
+
+
+def _send_message(sock, message: Dict):
+    payload = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _recv_message(sock) -> Optional[Dict]:
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    payload = _recv_exactly(sock, _HEADER.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload.decode('utf-8'))
+
+
+def _encode_array(array) -> Dict:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {'shape': list(array.shape), 'data': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def _decode_array(encoded: Dict):
+    return np.frombuffer(base64.b64decode(encoded['data']), dtype=np.float32).reshape(encoded['shape'])
+
+
+class _PendingRequest:
+    """A clause request waiting for its micro-batch"""
+
+    __slots__ = ('op', 'clauses', 'enqueued', 'started', 'done', 'result', 'error')
+
+    def __init__(self, op: str, clauses: List[str]):
+        self.op = op
+        self.clauses = clauses
+        self.enqueued = time.monotonic()
+        self.started = None
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceServer:
+    """
+    Micro-batching inference server
+
+    ``analyze`` and ``embed`` requests are queued; a single batching thread
+    takes the oldest request, keeps collecting requests until
+    ``max_batch_size`` clauses are pending or ``max_wait_ms`` has passed since
+    that request arrived, runs one batched call per request kind and hands
+    each caller its slice of the results. ``entities`` (the NER fallback for
+    clients without spaCy) runs per document on the connection thread.
+    """
+
+    LATENCY_WINDOW = 10000
+
+    def __init__(self, socket_path: str, analyzer: Optional[ClauseAnalyzer] = None,
+                 max_batch_size: int = 64, max_wait_ms: float = 10.0):
+        self.socket_path = socket_path
+        # This process owns the models: never hand out a client of itself
+        ai_services._IN_INFERENCE_SERVER = True
+        # Clients pick their tier; the server loads each model on the first request needing it
+        self.analyzer = analyzer or get_analyzer('deep')
+        # Clients run the cascade's rule tier; only escalated clauses arrive here
+        self.analyzer.cascade = False
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.max_wait = max(float(max_wait_ms), 0.0) / 1000.0
+        self._queue: 'queue.Queue[_PendingRequest]' = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._queued_clauses = 0
+        self._batch_sizes: Dict[str, int] = {}
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self._queue_waits = deque(maxlen=self.LATENCY_WINDOW)
+        self._counters = {'requests': 0, 'clauses': 0, 'batches': 0, 'errors': 0}
+        self._started_at = time.time()
+        self._server = None
+        self._batch_thread = None
+
+    # Serving -----------------------------------------------------------------
+
+    def serve_forever(self):
+        """Bind the socket and serve until shutdown() is called"""
+        self._remove_stale_socket()
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        message = _recv_message(self.request)
+                    except (OSError, ValueError):
+                        return
+                    if message is None:
+                        return
+                    try:
+                        _send_message(self.request, server.handle_message(message))
+                    except OSError:
+                        return
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+            request_queue_size = 128  # Many workers may connect at once
+
+        self._server = Server(self.socket_path, Handler)
+        os.chmod(self.socket_path, 0o660)
+        self._batch_thread = threading.Thread(target=self._batch_loop, name='inference-batcher', daemon=True)
+        self._batch_thread.start()
+        logger.info(
+            f"Inference server listening on {self.socket_path} "
+            f"(max batch {self.max_batch_size} clauses, max wait {self.max_wait * 1000:.1f} ms, "
+            f"AI ready: {self.analyzer.is_ready})"
+        )
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.remove(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _remove_stale_socket(self):
+        """Remove a socket file left behind by a dead server (refuse to steal a live one)"""
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.remove(self.socket_path)
+        else:
+            raise RuntimeError(f"An inference server is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def handle_message(self, message: Dict) -> Dict:
+        """Dispatch one request and return the response message"""
+        op = message.get('op')
+        try:
+            if op in ('analyze', 'embed'):
+                return {'ok': True, 'result': self._submit(op, list(message.get('clauses') or []))}
+            if op == 'entities':
+                return {'ok': True, 'result': self.analyzer._extract_entities(message['text'])}
+            if op == 'info':
+                return {'ok': True, 'result': self.info()}
+            if op == 'stats':
+                return {'ok': True, 'result': self.stats()}
+            return {'ok': False, 'error': f"Unknown op {op!r}"}
+        except Exception as e:
+            logger.error(f"Inference server request {op!r} failed: {str(e)}")
+            return {'ok': False, 'error': str(e)}
+
+    def info(self) -> Dict:
+        return {
+            'ready': self.analyzer.is_ready,
+            'version_key': self.analyzer.version_key,
+            'precision': self.analyzer.precision,
+            'similarity_model': self.analyzer.SIMILARITY_MODEL_NAME,
+            'pid': os.getpid(),
+        }
+
+    # Micro-batching ----------------------------------------------------------
+
+    def _submit(self, op: str, clauses: List[str]):
+        if not clauses:
+            return []
+        request = _PendingRequest(op, clauses)
+        with self._stats_lock:
+            self._queued_clauses += len(clauses)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def _batch_loop(self):
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            size = len(first.clauses)
+            deadline = first.enqueued + self.max_wait
+            while size < self.max_batch_size:
+                # Past the deadline, still take whatever queued up during the last batch
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        request = self._queue.get(timeout=remaining)
+                    else:
+                        request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.clauses)
+
+            for op in ('analyze', 'embed'):
+                requests = [request for request in batch if request.op == op]
+                if requests:
+                    self._run_batch(op, requests)
+
+    def _run_batch(self, op: str, batch: List[_PendingRequest]):
+        clauses = [clause for request in batch for clause in request.clauses]
+        started = time.monotonic()
+        for request in batch:
+            request.started = started
+
+        try:
+            if op == 'analyze':
+                # Callers do their own cache lookups, so only cache misses arrive here
+                results = [[result, cacheable] for result, cacheable in self.analyzer._analyze_uncached(clauses)]
+            else:
+                vectors = self.analyzer.embed_clauses(clauses)
+                results = None if vectors is None else list(vectors)
+            error = None
+        except Exception as e:
+            logger.error(f"Inference batch of {len(clauses)} clauses failed: {str(e)}")
+            results, error = None, str(e)
+
+        offset = 0
+        finished = time.monotonic()
+        for request in batch:
+            count = len(request.clauses)
+            if error is not None:
+                request.error = error
+            elif op == 'embed':
+                request.result = None if results is None else _encode_array(np.stack(results[offset:offset + count]))
+            else:
+                request.result = results[offset:offset + count]
+            offset += count
+            request.done.set()
+
+        with self._stats_lock:
+            self._queued_clauses -= len(clauses)
+            self._counters['requests'] += len(batch)
+            self._counters['clauses'] += len(clauses)
+            self._counters['batches'] += 1
+            if error is not None:
+                self._counters['errors'] += 1
+            bucket = self._size_bucket(len(clauses))
+            self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+            for request in batch:
+                self._queue_waits.append(request.started - request.enqueued)
+                self._latencies.append(finished - request.enqueued)
+
+    def _size_bucket(self, size: int) -> str:
+        upper = 1
+        while upper < size:
+            upper *= 2
+        lower = upper // 2 + 1
+        return str(upper) if lower >= upper else f"{lower}-{upper}"
+
+    # Reporting ---------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        """Queue depth, batch-size distribution and request latency"""
+        with self._stats_lock:
+            counters = dict(self._counters)
+            latencies = sorted(self._latencies)
+            waits = sorted(self._queue_waits)
+            counters.update({
+                'queue_depth_requests': self._queue.qsize(),
+                'queue_depth_clauses': self._queued_clauses,
+                'batch_sizes': dict(sorted(self._batch_sizes.items(), key=lambda item: int(item[0].split('-')[-1]))),
+                'avg_batch_size': round(counters['clauses'] / counters['batches'], 2) if counters['batches'] else 0.0,
+                'latency_ms': self._percentiles(latencies),
+                'queue_wait_ms': self._percentiles(waits),
+                'uptime_seconds': round(time.time() - self._started_at, 1),
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+            })
+        return counters
+
+    def _percentiles(self, values: List[float]) -> Dict:
+        if not values:
+            return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+
+        def pick(fraction):
+            return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 2)
+
+        return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(values[-1] * 1000, 2)}
+
+
+class InferenceClient:
+    """Client for InferenceServer (one persistent connection per instance, thread-safe)"""
+
+    def __init__(self, socket_path: str, timeout: float = 120.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def call(self, message: Dict):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked (e.g. a prefork child): never share the parent's connection
+                self.close()
+                self._pid = os.getpid()
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._sock = self._connect()
+                    _send_message(self._sock, message)
+                    response = _recv_message(self._sock)
+                    if response is None:
+                        raise ConnectionError("Inference server closed the connection")
+                    break
+                except OSError as e:
+                    self.close()
+                    if attempt == 2:
+                        raise InferenceServerError(f"Inference server unavailable at {self.socket_path}: {str(e)}")
+        if not response.get('ok'):
+            raise InferenceServerError(response.get('error', 'Unknown inference server error'))
+        return response['result']
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def info(self) -> Dict:
+        return self.call({'op': 'info'})
+
+    def stats(self) -> Dict:
+        return self.call({'op': 'stats'})
+
+    def analyze(self, clauses: List[str]) -> List[Tuple[Dict, bool]]:
+        return [(result, cacheable) for result, cacheable in self.call({'op': 'analyze', 'clauses': clauses})]
+
+    def embed(self, clauses: List[str]):
+        encoded = self.call({'op': 'embed', 'clauses': clauses})
+        return None if encoded is None else _decode_array(encoded)
+
+    def entities(self, text: str) -> List[Dict]:
+        return self.call({'op': 'entities', 'text': text})
+
+
+class RemoteClauseAnalyzer(ClauseAnalyzer):
+    """
+    ClauseAnalyzer whose models live in the inference server
+
+    Clause caching, spaCy parsing, rule fallbacks, risk scoring and document
+    rollups run locally; only clause texts are sent to the server for
+    classification and embeddings, so its batching thread never waits on a
+    document parse. If the server cannot be reached the analyzer runs
+    rules-only, exactly like a worker without AI libraries.
+    """
+
+    RECONNECT_INTERVAL = 30.0
+
+    def __init__(self, socket_path: str, use_cache: Optional[bool] = None, tier: Optional[str] = None):
+        # Clause typing happens in the server, under its AI_CLAUSE_TYPING
+        super().__init__(use_cache=use_cache, use_models=False, clause_typing='model')
+        self.tier = resolve_analysis_tier(tier)
+        self.capabilities = ANALYSIS_TIERS[self.tier]
+        self.client = InferenceClient(socket_path, timeout=_get_setting('AI_INFERENCE_SERVER_TIMEOUT', 120))
+        self._remote_version = None
+        self._next_connect = 0.0
+        self._connect_to_server()
+
+    def _connect_to_server(self):
+        """Fetch the server's model info; retried every RECONNECT_INTERVAL while unreachable"""
+        if self.is_ready or time.monotonic() < self._next_connect:
+            return
+        self._next_connect = time.monotonic() + self.RECONNECT_INTERVAL
+        try:
+            info = self.client.info()
+        except InferenceServerError as e:
+            logger.warning(f"{str(e)}. Using fallback analysis.")
+            return
+        self.precision = info['precision']
+        self._remote_version = info['version_key']
+        self.SIMILARITY_MODEL_NAME = info['similarity_model']
+        self.is_ready = info['ready']
+
+    @property
+    def version_key(self) -> str:
+        self._connect_to_server()
+        if self.is_ready and self._remote_version:
+            # The rule tier of the cascade runs here, in front of the server
+            return self._remote_version + self._cascade_version()
+        return super().version_key
+
+    def analyze_document(self, pdf_text: str, mou_title: str = "") -> Dict:
+        self._connect_to_server()
+        return super().analyze_document(pdf_text, mou_title)
+
+    def analyze_clauses(self, clauses: List[str], batch_size: Optional[int] = None,
+                        key_terms: Optional[List[List[str]]] = None) -> List[Dict]:
+        self._connect_to_server()
+        return super().analyze_clauses(clauses, batch_size, key_terms)
+
+    def _analyze_with_models(self, clauses: List[str], batch_size: Optional[int] = None) -> List[Tuple[Dict, bool]]:
+        try:
+            return self.client.analyze(clauses)
+        except InferenceServerError as e:
+            logger.error(f"Remote clause analysis failed: {str(e)}")
+            results = []
+            for clause_text in clauses:
+                clause_analysis = self._default_clause_analysis(clause_text)
+                clause_analysis.update(self._analyze_clause_fallback(clause_text))
+                results.append((clause_analysis, False))
+            return results
+
+    def _load_capability(self, capability: str):
+        """Only spaCy loads here, to segment documents; the other models live in the server"""
+        if capability != 'spacy' or not self.supports('spacy'):
+            return None
+        try:
+            return self._get_spacy()
+        except Exception as e:
+            logger.warning(f"spaCy is not available in this worker, segmenting clauses with rules: {str(e)}")
+            self._unavailable.add('spacy')
+            return None
+
+    def embed_clauses(self, clauses: List[str]):
+        self._connect_to_server()
+        if not self.supports('similarity') or not clauses or not HAS_NUMPY:
+            return None
+        try:
+            return self.client.embed(list(clauses))
+        except InferenceServerError as e:
+            logger.error(f"Remote clause embedding failed: {str(e)}")
+            return None
+
+    def _get_spacy(self):
+        import spacy
+
+        disabled = _get_setting('AI_SPACY_DISABLED_COMPONENTS', ['lemmatizer'])
+        return ai_services.load_model(
+            f'spacy:{self.SPACY_MODEL_NAME}',
+            lambda: spacy.load(self.SPACY_MODEL_NAME, disable=list(disabled))
+        )
+
+    def _extract_entities(self, text: str) -> List[Dict]:
+        if not self.supports('ner'):
+            return []
+        try:
+            return self.client.entities(text)
+        except InferenceServerError as e:
+            logger.error(f"Remote entity extraction failed: {str(e)}")
+            return []
@@ -3,55 +3,487 @@ AI Services for MOU Management System
 Provides intelligent clause analysis, risk assessment, and recommendations
 """
 
+import importlib.util
+import os
 import re
 import json
+import time
 import logging
-from typing import Dict, List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple, Optional
 from decimal import Decimal
 from datetime import datetime
 
+from .ai_cache import get_clause_cache
+from .ai_rules import FALLBACK_RISK_WEIGHT, get_rule_engine
+
 # Optional imports - install when ready for AI features
-try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
-    import torch
-    from sentence_transformers import SentenceTransformer
-    import spacy
-    HAS_AI_LIBS = True
-except ImportError:
-    HAS_AI_LIBS = False
+# The AI libraries take seconds and hundreds of MB to import, so they are only
+# located here and imported on first use (load_ai_libs); web workers, celery
+# beat and management commands that never run inference don't pay for them.
+_AI_LIB_MODULES = ('transformers', 'torch', 'sentence_transformers', 'spacy')
+HAS_AI_LIBS = all(importlib.util.find_spec(name) is not None for name in _AI_LIB_MODULES)
+if not HAS_AI_LIBS:
     print("AI libraries not installed. Install with: pip install transformers torch sentence-transformers spacy")
 
+torch = None
+spacy = None
+AutoTokenizer = AutoModelForSequenceClassification = pipeline = SentenceTransformer = None
+_AI_LIBS_LOCK = threading.Lock()
+
 logger = logging.getLogger(__name__)
 
+# Bump when analysis logic changes in a way that invalidates stored results
+ANALYZER_VERSION = '1.0.0'
+
+# CPU inference precision modes for the classification and NER models
+PRECISION_MODES = ('fp32', 'int8', 'bf16')
+
+# Analysis tiers, cheapest first, and the model capabilities each one uses.
+# Models are loaded on first use, so a tier never pays for models it skips:
+# "rules" loads nothing, "standard" classifies and segments clauses, "deep"
+# adds the sentence encoder (similar clause links) and the NER fallback.
+ANALYSIS_TIERS = {
+    'rules': (),
+    'standard': ('classifier', 'spacy'),
+    'deep': ('classifier', 'spacy', 'similarity', 'ner'),
+}
+DEFAULT_ANALYSIS_TIER = 'deep'
+
+# How clause types are assigned on the model path: "model" runs the classifier
+# (types from the rules), "prototype" takes the nearest label prototype of the
+# sentence encoder embedding (see ai_prototypes), so tiers use the encoder in
+# place of the classifier.
+CLAUSE_TYPING_MODES = ('model', 'prototype')
+
+
+# Process-wide model registry: each model is loaded once per worker process
+# and shared by every ClauseAnalyzer built in that process.
+_MODEL_REGISTRY: Dict[str, object] = {}
+_MODEL_LOAD_STATS: Dict[str, Dict] = {}
+_REGISTRY_LOCK = threading.RLock()
+_SHARED_ANALYZERS: Dict[str, 'ClauseAnalyzer'] = {}
+_IN_INFERENCE_SERVER = False
+
+# Classification workload counters (sliding windows over long clauses,
+# clause library matches and the rules -> linear -> model cascade)
+_INFERENCE_STATS: Dict[str, float] = {
+    'clauses': 0,
+    'windows': 0,
+    'tokens': 0,
+    'windowed_clauses': 0,
+    'extra_windows': 0,
+    'overlap_tokens': 0,
+    'library_matches': 0,
+    'cascade_clauses': 0,
+    'cascade_rules': 0,
+    'cascade_escalated': 0,
+    'cascade_escalated_low_confidence': 0,
+    'cascade_escalated_ambiguous': 0,
+    'cascade_escalated_risk': 0,
+    'cascade_linear': 0,
+    'cascade_rule_seconds': 0.0,
+    'cascade_linear_seconds': 0.0,
+    'cascade_model_seconds': 0.0,
+    'prototype_clauses': 0,
+    'embedding_memo_hits': 0,
+}
+
+
+def load_ai_libs() -> bool:
+    """
+    Import torch, transformers, sentence-transformers and spaCy on first use
+    
+    Returns:
+        True if the libraries are available (HAS_AI_LIBS is cleared if an
+        installed library fails to import)
+    """
+    global HAS_AI_LIBS, torch, spacy, AutoTokenizer, AutoModelForSequenceClassification, pipeline, SentenceTransformer
+    if not HAS_AI_LIBS or torch is not None:
+        return HAS_AI_LIBS
+    with _AI_LIBS_LOCK:
+        if torch is None:
+            try:
+                from transformers import (
+                    AutoTokenizer as _AutoTokenizer,
+                    AutoModelForSequenceClassification as _AutoModelForSequenceClassification,
+                    pipeline as _pipeline,
+                )
+                from sentence_transformers import SentenceTransformer as _SentenceTransformer
+                import spacy as _spacy
+                import torch as _torch
+            except ImportError as e:
+                logger.error(f"AI libraries failed to import: {str(e)}")
+                HAS_AI_LIBS = False
+                return False
+            AutoTokenizer = _AutoTokenizer
+            AutoModelForSequenceClassification = _AutoModelForSequenceClassification
+            pipeline = _pipeline
+            SentenceTransformer = _SentenceTransformer
+            spacy = _spacy
+            torch = _torch
+    return HAS_AI_LIBS
+
+
+def _current_rss_mb() -> float:
+    """Return the resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS (KB on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024.0 * 1024.0) if os.uname().sysname == 'Darwin' else maxrss / 1024.0
+    except Exception:
+        return 0.0
+
+
+def process_memory(pid='self') -> Dict[str, float]:
+    """
+    Memory of a process in MB from /proc/<pid>/smaps_rollup (Linux)
+    
+    ``uss_mb`` (private pages) is what the process alone costs; ``pss_mb``
+    splits shared pages between the processes sharing them, and ``shared_mb``
+    are pages shared with others, e.g. model weights inherited copy-on-write
+    from the Celery parent.
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as smaps:
+            for line in smaps:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1]) / 1024.0
+    except OSError:
+        return {'rss_mb': round(_current_rss_mb(), 1) if pid == 'self' else 0.0}
+    return {
+        'rss_mb': round(fields.get('Rss', 0.0), 1),
+        'pss_mb': round(fields.get('Pss', 0.0), 1),
+        'uss_mb': round(fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0), 1),
+        'shared_mb': round(fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0), 1),
+    }
+
+
+def _get_setting(name: str, default):
+    """Read an AI setting from Django settings, falling back to ``default``"""
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def load_model(key: str, loader: Callable[[], object]):
+    """
+    Return the model registered under ``key``, loading it on first use
+
+    Args:
+        key: Registry key, e.g. "classifier:nlpaueb/legal-bert-base-uncased"
+        loader: Zero-argument callable that loads the model
+
+    Returns:
+        The loaded (and cached) model object
+    """
+    model = _MODEL_REGISTRY.get(key)
+    if model is not None:
+        return model
+
+    with _REGISTRY_LOCK:
+        model = _MODEL_REGISTRY.get(key)
+        if model is not None:
+            return model
+
+        rss_before = _current_rss_mb()
+        started = time.perf_counter()
+        model = loader()
+        load_seconds = time.perf_counter() - started
+        rss_after = _current_rss_mb()
+
+        _MODEL_REGISTRY[key] = model
+        _MODEL_LOAD_STATS[key] = {
+            'load_seconds': round(load_seconds, 3),
+            'rss_delta_mb': round(rss_after - rss_before, 1),
+            'loaded_at': datetime.now().isoformat(),
+        }
+        logger.info(f"Loaded model {key} in {load_seconds:.2f}s (+{rss_after - rss_before:.1f} MB RSS)")
+        return model
+
+
+def get_model_registry_stats() -> Dict:
+    """Report loaded models, their load cost and current process memory"""
+    return {
+        'pid': os.getpid(),
+        'rss_mb': round(_current_rss_mb(), 1),
+        'models': {key: dict(stats) for key, stats in _MODEL_LOAD_STATS.items()},
+        'total_load_seconds': round(sum(s['load_seconds'] for s in _MODEL_LOAD_STATS.values()), 3),
+        'memory': process_memory(),
+        'inference': get_inference_stats(),
+    }
+
+
+def get_inference_stats() -> Dict:
+    """
+    Report how many clauses needed sliding-window classification and the
+    extra compute that cost (windows and re-encoded overlap tokens), and how
+    the cascade split clauses between the rule, linear and model tiers
+    
+    ``cascade_seconds_saved`` estimates the model time avoided: clauses the
+    rule and linear tiers decided times the measured per-clause cost
+    difference to the model tier (None until the model tier has run).
+    """
+    stats = dict(_INFERENCE_STATS)
+    stats['windowed_clause_rate'] = round(stats['windowed_clauses'] / stats['clauses'], 4) if stats['clauses'] else 0.0
+    stats['extra_window_rate'] = round(stats['extra_windows'] / stats['clauses'], 4) if stats['clauses'] else 0.0
+    stats['overlap_token_rate'] = round(stats['overlap_tokens'] / stats['tokens'], 4) if stats['tokens'] else 0.0
+    
+    # Cascade: share of clauses each tier decided, and model time the cheaper tiers saved
+    cascade = stats['cascade_clauses']
+    model_clauses = stats['cascade_escalated'] - stats['cascade_linear']
+    stats['cascade_rule_share'] = round(stats['cascade_rules'] / cascade, 4) if cascade else 0.0
+    stats['cascade_linear_share'] = round(stats['cascade_linear'] / cascade, 4) if cascade else 0.0
+    stats['cascade_model_share'] = round(model_clauses / cascade, 4) if cascade else 0.0
+    if model_clauses and (stats['cascade_rules'] or stats['cascade_linear']):
+        model_per_clause = stats['cascade_model_seconds'] / model_clauses
+        rule_per_clause = stats['cascade_rule_seconds'] / cascade
+        linear_per_clause = stats['cascade_linear_seconds'] / stats['cascade_escalated']
+        stats['cascade_seconds_saved'] = round(
+            stats['cascade_rules'] * max(model_per_clause - rule_per_clause, 0.0)
+            + stats['cascade_linear'] * max(model_per_clause - linear_per_clause, 0.0), 3
+        )
+    else:
+        stats['cascade_seconds_saved'] = None
+    stats['cascade_rule_seconds'] = round(stats['cascade_rule_seconds'], 3)
+    stats['cascade_linear_seconds'] = round(stats['cascade_linear_seconds'], 3)
+    stats['cascade_model_seconds'] = round(stats['cascade_model_seconds'], 3)
+    return stats
+
+
+def bf16_supported() -> bool:
+    """Whether the CPU has native bfloat16 instructions (AVX512-BF16 or AMX)"""
+    try:
+        with open('/proc/cpuinfo') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('flags'):
+                    flags = line.split()
+                    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        pass
+    return False
+
+
+def resolve_precision(precision: Optional[str] = None) -> str:
+    """
+    Return the precision mode to run in, falling back to fp32 when the
+    requested mode is unknown or unsupported on this machine
+    """
+    precision = (precision or _get_setting('AI_INFERENCE_PRECISION', 'fp32')).lower()
+    if precision not in PRECISION_MODES:
+        logger.warning(f"Unknown inference precision '{precision}', using fp32")
+        return 'fp32'
+    if precision == 'bf16' and not bf16_supported():
+        logger.warning("CPU lacks native bfloat16 support, using fp32")
+        return 'fp32'
+    if precision == 'int8' and load_ai_libs() and not any(
+            engine != 'none' for engine in torch.backends.quantized.supported_engines):
+        logger.warning("No quantized engine available, using fp32")
+        return 'fp32'
+    return precision
+
+
+def tier_capabilities(tier: str, clause_typing: str = 'model') -> Tuple[str, ...]:
+    """Model capabilities of an analysis tier under a clause typing mode"""
+    capabilities = ANALYSIS_TIERS[tier]
+    if clause_typing == 'prototype' and 'classifier' in capabilities:
+        capabilities = tuple(dict.fromkeys(
+            'similarity' if capability == 'classifier' else capability for capability in capabilities
+        ))
+    return capabilities
+
+
+def resolve_analysis_tier(tier: Optional[str] = None) -> str:
+    """
+    Return the analysis tier to run, falling back to the default tier when
+    the requested one is unknown
+    """
+    tier = (tier or _get_setting('AI_ANALYSIS_TIER', DEFAULT_ANALYSIS_TIER)).lower()
+    if tier not in ANALYSIS_TIERS:
+        logger.warning(f"Unknown analysis tier '{tier}', using {DEFAULT_ANALYSIS_TIER}")
+        return DEFAULT_ANALYSIS_TIER
+    return tier
+
+
+def apply_precision(model, precision: str):
+    """
+    Convert a loaded fp32 torch model to ``precision``
+
+    int8 applies dynamic quantization to the Linear layers (weights stored as
+    int8, activations quantized on the fly); bf16 casts all weights.
+    """
+    if precision == 'int8':
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if precision == 'bf16':
+        return model.to(torch.bfloat16)
+    return model
+
+
+def clear_model_registry():
+    """Drop all cached models and the shared analyzers (mainly for tests)"""
+    with _REGISTRY_LOCK:
+        _MODEL_REGISTRY.clear()
+        _MODEL_LOAD_STATS.clear()
+        _SHARED_ANALYZERS.clear()
+
+
 class ClauseAnalyzer:
     """Main AI service for analyzing MOU clauses and documents"""
     
-    def __init__(self):
+    def __init__(self, use_cache: Optional[bool] = None, precision: Optional[str] = None,
+                 use_models: bool = True, use_library: Optional[bool] = None, cascade: Optional[bool] = None,
+                 tier: Optional[str] = None, clause_typing: Optional[str] = None, prototypes=None):
         self.is_ready = False
-        if HAS_AI_LIBS:
-            self._initialize_models()
+        self.use_cache = _get_setting('AI_CLAUSE_CACHE_ENABLED', True) if use_cache is None else use_cache
+        self.use_library = _get_setting('AI_CLAUSE_LIBRARY_ENABLED', True) if use_library is None else use_library
+        self.cascade = _get_setting('AI_CASCADE_ENABLED', False) if cascade is None else cascade
+        self.tier = resolve_analysis_tier(tier) if use_models else 'rules'
+        self._unavailable = set()
+        self._prototypes = prototypes
+        self._embedding_memo: 'OrderedDict[str, object]' = OrderedDict()
+        self._embedding_memo_lock = threading.Lock()
+        self.clause_typing = self._resolve_clause_typing(clause_typing)
+        self.capabilities = tier_capabilities(self.tier, self.clause_typing)
+        if self.capabilities and load_ai_libs():
+            # Models load on first use (see _load_capability)
+            self.precision = resolve_precision(precision)
+            self.is_ready = True
         else:
-            logger.warning("AI models not available. Using fallback analysis.")
+            self.precision = 'fp32'
+            if self.capabilities:
+                logger.warning("AI models not available. Using fallback analysis.")
+    
+    CLASSIFICATION_MODEL_NAME = 'nlpaueb/legal-bert-base-uncased'
+    SIMILARITY_MODEL_NAME = 'all-MiniLM-L6-v2'
+    NER_MODEL_NAME = 'dbmdz/bert-large-cased-finetuned-conll03-english'
+    SPACY_MODEL_NAME = 'en_core_web_sm'
+    MAX_SEQUENCE_LENGTH = 512
     
-    def _initialize_models(self):
-        """Initialize AI models (load lazily to avoid startup delays)"""
+    def _resolve_clause_typing(self, clause_typing: Optional[str]) -> str:
+        """Validate a clause typing mode (defaults to AI_CLAUSE_TYPING); prototype typing needs built prototypes"""
+        clause_typing = clause_typing or _get_setting('AI_CLAUSE_TYPING', 'model')
+        if clause_typing not in CLAUSE_TYPING_MODES:
+            logger.warning(f"Unknown clause typing {clause_typing!r}, using 'model'")
+            return 'model'
+        if clause_typing == 'prototype' and ANALYSIS_TIERS[self.tier] and self.label_prototypes is None:
+            logger.warning("No label prototypes built (manage.py clause_prototypes --build). Typing with the classifier.")
+            return 'model'
+        return clause_typing
+    
+    @property
+    def label_prototypes(self):
+        """Label prototypes for prototype typing (given ones, else the saved ones of the sentence encoder)"""
+        if self._prototypes is not None:
+            return self._prototypes
+        from .ai_prototypes import get_label_prototypes
+        return get_label_prototypes(self.SIMILARITY_MODEL_NAME)
+    
+    @property
+    def _typing_capability(self) -> str:
+        """The capability that types clauses on the model path; without it the analyzer runs rules"""
+        return 'similarity' if self.clause_typing == 'prototype' else 'classifier'
+    
+    def supports(self, capability: str) -> bool:
+        """Whether this analyzer's tier uses ``capability`` and its models can run"""
+        return self.is_ready and capability in self.capabilities and capability not in self._unavailable
+    
+    def _load_capability(self, capability: str):
+        """
+        Load the models of one capability from the process-wide registry
+        
+        Returns the loaded model (the classifier for "classifier"), or None
+        when the tier does not use it or loading failed. Failures are not
+        retried; a failure of the clause typing model (the classifier, or the
+        sentence encoder with prototype typing) switches the analyzer to rules.
+        """
+        if not self.supports(capability):
+            return None
         try:
-            # Legal BERT model for clause classification
-            self.tokenizer = AutoTokenizer.from_pretrained('nlpaueb/legal-bert-base-uncased')
-            self.classification_model = AutoModelForSequenceClassification.from_pretrained('nlpaueb/legal-bert-base-uncased')
-            
-            # Sentence transformer for semantic similarity
-            self.similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
-            
-            # NLP pipeline for named entity recognition
-            self.nlp_pipeline = pipeline('ner', model='dbmdz/bert-large-cased-finetuned-conll03-english')
-            
-            self.is_ready = True
-            logger.info("AI models loaded successfully")
-            
+            if capability == 'classifier':
+                # Legal BERT model for clause classification
+                self._tokenizer = load_model(
+                    f'tokenizer:{self.CLASSIFICATION_MODEL_NAME}',
+                    lambda: AutoTokenizer.from_pretrained(self.CLASSIFICATION_MODEL_NAME)
+                )
+                return load_model(
+                    f'classifier:{self.CLASSIFICATION_MODEL_NAME}:{self.precision}',
+                    lambda: apply_precision(
+                        AutoModelForSequenceClassification.from_pretrained(self.CLASSIFICATION_MODEL_NAME).eval(),
+                        self.precision
+                    )
+                )
+            if capability == 'similarity':
+                # Sentence transformer for semantic similarity
+                return load_model(
+                    f'similarity:{self.SIMILARITY_MODEL_NAME}',
+                    lambda: SentenceTransformer(self.SIMILARITY_MODEL_NAME)
+                )
+            if capability == 'ner':
+                # NLP pipeline for named entity recognition
+                return load_model(f'ner:{self.NER_MODEL_NAME}:{self.precision}', self._load_ner_pipeline)
+            if capability == 'spacy':
+                return self._get_spacy()
         except Exception as e:
-            logger.error(f"Failed to load AI models: {str(e)}")
-            self.is_ready = False
+            logger.error(f"Failed to load AI models for {capability}: {str(e)}")
+            self._unavailable.add(capability)
+            if capability == self._typing_capability:
+                self.is_ready = False
+        return None
+    
+    def load_tier_models(self, tier: Optional[str] = None) -> List[str]:
+        """
+        Load the models of ``tier`` (defaults to this analyzer's tier) ahead of
+        first use; returns the capabilities that loaded
+        """
+        return [capability for capability in tier_capabilities(tier or self.tier, self.clause_typing)
+                if self._load_capability(capability) is not None]
+    
+    @property
+    def effective_tier(self) -> str:
+        """
+        Deepest tier, up to this analyzer's tier, whose models all can run:
+        the tier its results actually cover ("rules" without the AI libraries)
+        """
+        tiers = list(ANALYSIS_TIERS)
+        for tier in reversed(tiers[:tiers.index(self.tier) + 1]):
+            if all(self.supports(capability) for capability in tier_capabilities(tier, self.clause_typing)):
+                return tier
+        return 'rules'
+    
+    @property
+    def classification_model(self):
+        return self._load_capability('classifier')
+    
+    @property
+    def tokenizer(self):
+        return self._tokenizer if self.classification_model is not None else None
+    
+    @property
+    def similarity_model(self):
+        return self._load_capability('similarity')
+    
+    @property
+    def nlp_pipeline(self):
+        return self._load_capability('ner')
+    
+    def _load_ner_pipeline(self):
+        """Load the NER pipeline with its model converted to the configured precision"""
+        ner = pipeline('ner', model=self.NER_MODEL_NAME)
+        ner.model = apply_precision(ner.model.eval(), self.precision)
+        return ner
     
     def analyze_document(self, pdf_text: str, mou_title: str = "") -> Dict:
         """
@@ -67,37 +499,79 @@ class ClauseAnalyzer:
         if not pdf_text.strip():
             return self._empty_analysis()
         
+        document = self.prepare_document(pdf_text)
+        clause_results = []
+        # One chunk: all clauses share the length-bucketed batches
+        for _, chunk in self.iter_clause_analyses(document['clauses'], document['key_terms'],
+                                                  chunk_size=max(len(document['clauses']), 1)):
+            clause_results.extend(chunk)
+        return self.finalize_document_analysis(clause_results, document['entities'], mou_title)
+    
+    def prepare_document(self, pdf_text: str) -> Dict:
+        """
+        Segment a document into clauses (one spaCy pass when models are loaded)
+        
+        Returns:
+            Dictionary with ``clauses``, per-clause ``key_terms`` (or None) and
+            document ``entities``
+        """
+        if self.is_ready:
+            # AI-powered analysis: one spaCy pass gives clauses, entities and key terms
+            parsed = self._parse_document(pdf_text)
+            if parsed is not None:
+                return parsed
+            return {
+                'clauses': self._extract_clauses_fallback(pdf_text),
+                'key_terms': None,
+                'entities': self._extract_entities(pdf_text),
+            }
+        # Fallback rule-based analysis
+        return {'clauses': self._extract_clauses_fallback(pdf_text), 'key_terms': None, 'entities': []}
+    
+    def iter_clause_analyses(self, clauses: List[str], key_terms: Optional[List[List[str]]] = None,
+                             start: int = 0, chunk_size: Optional[int] = None):
+        """
+        Analyze clauses progressively, yielding results as each chunk finishes
+        
+        Args:
+            clauses: Clause texts from prepare_document
+            key_terms: Optional per-clause key terms from prepare_document
+            start: Index of the first clause to analyze (to resume a partial run)
+            chunk_size: Clauses per chunk (defaults to AI_STREAM_CHUNK_SIZE)
+            
+        Yields:
+            Tuples of (index of the chunk's first clause, list of clause analyses)
+        """
+        chunk_size = max(int(chunk_size or _get_setting('AI_STREAM_CHUNK_SIZE', 32)), 1)
+        for chunk_start in range(start, len(clauses), chunk_size):
+            chunk_end = chunk_start + chunk_size
+            yield chunk_start, self.analyze_clauses(
+                clauses[chunk_start:chunk_end],
+                key_terms=key_terms[chunk_start:chunk_end] if key_terms is not None else None
+            )
+    
+    def finalize_document_analysis(self, clause_results: List[Dict], entities: List[Dict],
+                                   mou_title: str = "") -> Dict:
+        """Build the document analysis (rollups, recommendations, compliance) from clause results"""
         analysis = {
             'document_title': mou_title,
             'analysis_timestamp': datetime.now().isoformat(),
-            'model_version': '1.0.0',
-            'clauses': [],
+            'model_version': ANALYZER_VERSION,
+            'analyzer_version': self.version_key,
+            'analysis_tier': self.effective_tier,
+            'clauses': list(clause_results),
             'overall_risk_score': 0.0,
             'risk_factors': [],
             'recommendations': [],
             'compliance_status': 'pending',
-            'key_entities': [],
+            'key_entities': entities,
             'summary_stats': {}
         }
         
-        if self.is_ready:
-            # AI-powered analysis
-            clauses = self._extract_clauses_ai(pdf_text)
-            analysis['key_entities'] = self._extract_entities(pdf_text)
-        else:
-            # Fallback rule-based analysis
-            clauses = self._extract_clauses_fallback(pdf_text)
-        
-        # Analyze each clause
-        total_risk = 0
-        for clause in clauses:
-            clause_analysis = self.analyze_clause(clause)
-            analysis['clauses'].append(clause_analysis)
-            total_risk += clause_analysis['risk_score']
-        
         # Calculate overall risk score
-        if len(clauses) > 0:
-            analysis['overall_risk_score'] = min(total_risk / len(clauses), 10.0)
+        if clause_results:
+            total_risk = sum(clause_analysis['risk_score'] for clause_analysis in clause_results)
+            analysis['overall_risk_score'] = min(total_risk / len(clause_results), 10.0)
         
         # Generate recommendations
         analysis['recommendations'] = self._generate_document_recommendations(analysis)
@@ -116,7 +590,331 @@ class ClauseAnalyzer:
         Returns:
             Dictionary containing clause analysis
         """
-        clause_analysis = {
+        return self.analyze_clauses([clause_text])[0]
+    
+    def analyze_clauses(self, clauses: List[str], batch_size: Optional[int] = None,
+                        key_terms: Optional[List[List[str]]] = None) -> List[Dict]:
+        """
+        Analyze many clauses with batched, length-bucketed inference
+        
+        Clauses already in the clause result cache are served from it, and
+        near-duplicates of clause library entries copy the entry's labels. The
+        rest are tokenized in one call, sorted by token length and grouped
+        into batches of ``batch_size`` so each forward pass pads as little as
+        possible. Results are returned in input order.
+        
+        Args:
+            clauses: Clause texts to analyze
+            batch_size: Clauses per forward pass (defaults to AI_INFERENCE_BATCH_SIZE)
+            key_terms: Optional precomputed key terms per clause (from _parse_document)
+            
+        Returns:
+            List of clause analysis dictionaries
+        """
+        cache = self._get_cache()
+        results: Dict[int, Dict] = cache.get_many(clauses, self.version_key) if cache else {}
+        
+        misses = [i for i in range(len(clauses)) if i not in results]
+        if misses:
+            for index, clause_analysis in self._match_library([clauses[i] for i in misses], misses).items():
+                results[index] = clause_analysis
+            misses = [i for i in misses if i not in results]
+        
+        fell_back = set()
+        if misses:
+            fresh = self._analyze_uncached([clauses[i] for i in misses], batch_size)
+            cacheable = []
+            for index, (clause_analysis, cacheable_result) in zip(misses, fresh):
+                results[index] = clause_analysis
+                if cacheable_result:
+                    cacheable.append(clause_analysis)
+                else:
+                    fell_back.add(index)
+            if cache and cacheable:
+                cache.set_many(cacheable, self.version_key)
+        
+        ordered = []
+        for index in range(len(clauses)):
+            clause_analysis = results[index]
+            if self.is_ready and key_terms is not None and key_terms[index] and index not in fell_back:
+                clause_analysis['key_terms'] = key_terms[index]
+            ordered.append(clause_analysis)
+        return ordered
+    
+    def _match_library(self, clauses: List[str], indexes: List[int]) -> Dict[int, Dict]:
+        """
+        Label clauses that are near-duplicates of clause library entries
+        
+        Returns:
+            Mapping of index (from ``indexes``) to clause analysis; library
+            results are not written to the clause result cache
+        """
+        library = self._get_library()
+        if library is None:
+            return {}
+        
+        results = {}
+        for position, match in library.match_many(clauses).items():
+            clause_analysis = self._default_clause_analysis(clauses[position])
+            clause_analysis.update(match)
+            clause_analysis['key_terms'] = self._extract_key_terms_fallback(clauses[position])
+            clause_analysis['tier'] = 'library'
+            results[indexes[position]] = clause_analysis
+        _INFERENCE_STATS['library_matches'] += len(results)
+        return results
+    
+    def _analyze_uncached(self, clauses: List[str], batch_size: Optional[int] = None) -> List[Tuple[Dict, bool]]:
+        """
+        Run the analysis for clauses not found in the cache
+        
+        Returns:
+            List of (clause_analysis, cacheable) tuples; results that fell back
+            to rules because inference failed are not cacheable
+        """
+        if not self.is_ready:
+            results = []
+            for clause_text in clauses:
+                clause_analysis = self._default_clause_analysis(clause_text)
+                clause_analysis.update(self._analyze_clause_fallback(clause_text))
+                results.append((clause_analysis, True))
+            return results
+        
+        if self.cascade:
+            return self._analyze_cascade(clauses, batch_size)
+        return self._analyze_with_models(clauses, batch_size)
+    
+    def _analyze_with_models(self, clauses: List[str], batch_size: Optional[int] = None) -> List[Tuple[Dict, bool]]:
+        """Classify clauses with the transformer model (the model tier)"""
+        if self.clause_typing == 'prototype':
+            return self._analyze_with_prototypes(clauses)
+        confidences = self._classify_batch(clauses, batch_size or _get_setting('AI_INFERENCE_BATCH_SIZE', 16))
+        
+        results = []
+        for clause_text, confidence in zip(clauses, confidences):
+            clause_analysis = self._default_clause_analysis(clause_text)
+            if confidence is None:
+                clause_analysis.update(self._analyze_clause_fallback(clause_text))
+            else:
+                clause_analysis.update(self._build_ai_clause_result(clause_text, confidence))
+            results.append((clause_analysis, confidence is not None))
+        return results
+    
+    def _analyze_with_prototypes(self, clauses: List[str]) -> List[Tuple[Dict, bool]]:
+        """
+        Type clauses by their nearest label prototype
+        
+        The sentence encoder runs once per clause; its vectors stay in the
+        embedding memo, so similar clause search does not encode them again.
+        """
+        prototypes = self.label_prototypes
+        vectors = self.embed_clauses(clauses) if prototypes is not None else None
+        if vectors is None:
+            results = []
+            for clause_text in clauses:
+                clause_analysis = self._default_clause_analysis(clause_text)
+                clause_analysis.update(self._analyze_clause_fallback(clause_text))
+                results.append((clause_analysis, False))
+            return results
+        
+        clause_types, confidences = prototypes.classify(vectors)
+        with _REGISTRY_LOCK:
+            _INFERENCE_STATS['prototype_clauses'] += len(clauses)
+        results = []
+        for clause_text, clause_type, confidence in zip(clauses, clause_types, confidences):
+            clause_analysis = self._default_clause_analysis(clause_text)
+            clause_analysis.update(self._build_ai_clause_result(clause_text, confidence, clause_type))
+            results.append((clause_analysis, True))
+        return results
+    
+    def _analyze_cascade(self, clauses: List[str], batch_size: Optional[int] = None) -> List[Tuple[Dict, bool]]:
+        """
+        Decide clear-cut clauses with the compiled rules and escalate the rest
+        
+        A clause leaves the rule tier when its rule confidence is below
+        AI_CASCADE_MIN_CONFIDENCE, when keywords of several clause types match,
+        or (with AI_CASCADE_ESCALATE_RISK) when it has risk factors. Escalated
+        clauses without risk factors are typed by the TF-IDF linear classifier
+        when one is trained (AI_CASCADE_LINEAR); those below
+        AI_LINEAR_MIN_CONFIDENCE and the risky ones go to the model tier.
+        Results record the deciding tier in ``tier``.
+        """
+        min_confidence = _get_setting('AI_CASCADE_MIN_CONFIDENCE', 0.8)
+        escalate_risk = _get_setting('AI_CASCADE_ESCALATE_RISK', True)
+        engine = get_rule_engine()
+        
+        started = time.perf_counter()
+        results: List[Optional[Tuple[Dict, bool]]] = [None] * len(clauses)
+        escalated = []
+        needs_model = set()
+        for index, clause_text in enumerate(clauses):
+            clause_type, risk_factors, confidence, ambiguous = engine.classify_with_confidence(clause_text)
+            if escalate_risk and risk_factors:
+                needs_model.add(index)
+            if confidence < min_confidence:
+                _INFERENCE_STATS['cascade_escalated_low_confidence'] += 1
+            elif ambiguous:
+                _INFERENCE_STATS['cascade_escalated_ambiguous'] += 1
+            elif escalate_risk and risk_factors:
+                _INFERENCE_STATS['cascade_escalated_risk'] += 1
+            else:
+                clause_analysis = self._default_clause_analysis(clause_text)
+                clause_analysis.update(self._build_ai_clause_result(clause_text, confidence))
+                clause_analysis['tier'] = 'rules'
+                results[index] = (clause_analysis, True)
+                continue
+            escalated.append(index)
+        _INFERENCE_STATS['cascade_rule_seconds'] += time.perf_counter() - started
+        
+        remaining = self._cascade_linear_tier(clauses, escalated, needs_model, results)
+        if remaining:
+            started = time.perf_counter()
+            model_results = self._analyze_with_models([clauses[i] for i in remaining], batch_size)
+            _INFERENCE_STATS['cascade_model_seconds'] += time.perf_counter() - started
+            for index, result in zip(remaining, model_results):
+                results[index] = result
+        
+        _INFERENCE_STATS['cascade_clauses'] += len(clauses)
+        _INFERENCE_STATS['cascade_rules'] += len(clauses) - len(escalated)
+        _INFERENCE_STATS['cascade_escalated'] += len(escalated)
+        return results
+    
+    def _cascade_linear_tier(self, clauses: List[str], escalated: List[int], needs_model: set,
+                             results: List[Optional[Tuple[Dict, bool]]]) -> List[int]:
+        """
+        Type escalated clauses with the linear classifier in one batch
+        
+        Fills ``results`` for the clauses it is confident about and returns
+        the indexes left for the model tier.
+        """
+        classifier = self._linear_classifier()
+        candidates = [index for index in escalated if index not in needs_model]
+        if classifier is None or not candidates:
+            return escalated
+        
+        started = time.perf_counter()
+        try:
+            clause_types, confidences = classifier.predict([clauses[index] for index in candidates])
+        except Exception as e:
+            logger.error(f"Linear clause classification failed: {str(e)}")
+            return escalated
+        min_confidence = _get_setting('AI_LINEAR_MIN_CONFIDENCE', 0.9)
+        decided = set()
+        for index, clause_type, confidence in zip(candidates, clause_types, confidences):
+            if confidence >= min_confidence:
+                clause_analysis = self._default_clause_analysis(clauses[index])
+                clause_analysis.update(self._build_ai_clause_result(clauses[index], confidence, clause_type))
+                clause_analysis['tier'] = 'linear'
+                results[index] = (clause_analysis, True)
+                decided.add(index)
+        _INFERENCE_STATS['cascade_linear_seconds'] += time.perf_counter() - started
+        _INFERENCE_STATS['cascade_linear'] += len(decided)
+        return [index for index in escalated if index not in decided]
+    
+    def _linear_classifier(self):
+        """The trained TF-IDF linear classifier of the cascade, or None when disabled or not trained"""
+        if not _get_setting('AI_CASCADE_LINEAR', True):
+            return None
+        from .ai_linear import get_linear_classifier
+        return get_linear_classifier()
+    
+    @property
+    def version_key(self) -> str:
+        """Version of everything that determines a clause result (used as cache namespace)"""
+        # The typing model loads here, on first use, so a failed load reports "rules"
+        self._load_capability(self._typing_capability)
+        if self.is_ready and self.clause_typing == 'prototype':
+            prototypes = self.label_prototypes
+            models_used = f"ai:proto:{self.SIMILARITY_MODEL_NAME}:{prototypes.version if prototypes else 'none'}"
+            models_used += self._cascade_version()
+        elif self.is_ready:
+            models_used = f"ai:{self.CLASSIFICATION_MODEL_NAME}"
+            if self.precision != 'fp32':
+                models_used += f":{self.precision}"
+            models_used += f":win{_get_setting('AI_WINDOW_STRIDE', 128)}"
+            models_used += self._cascade_version()
+        else:
+            models_used = "rules"
+        return f"{ANALYZER_VERSION}|{models_used}|{get_rule_engine().fingerprint}"
+    
+    def _cascade_version(self) -> str:
+        """Cascade settings that change clause results (part of version_key)"""
+        if not self.cascade:
+            return ''
+        risk = ':risk' if _get_setting('AI_CASCADE_ESCALATE_RISK', True) else ''
+        linear = self._linear_classifier()
+        linear = f":linear{linear.version}@{_get_setting('AI_LINEAR_MIN_CONFIDENCE', 0.9)}" if linear else ''
+        return f":cascade{_get_setting('AI_CASCADE_MIN_CONFIDENCE', 0.8)}{risk}{linear}"
+    
+    def _get_cache(self):
+        """Return the clause result cache, or None when caching is disabled"""
+        if not self.use_cache:
+            return None
+        return get_clause_cache()
+    
+    def _get_library(self):
+        """
+        Return the clause library, or None when it is disabled or the models
+        are not available (library labels come from model analyses, so
+        rule-based results do not mix with them)
+        """
+        if not self.use_library or not self.is_ready:
+            return None
+        from .ai_library import get_clause_library
+        return get_clause_library()
+    
+    def embed_clauses(self, clauses: List[str]):
+        """
+        Embed clauses with the sentence encoder
+        
+        Recently embedded clauses (AI_EMBEDDING_MEMO_SIZE) are served from an
+        in-process memo, so a clause typed by prototype is not encoded again
+        for similar clause search.
+        
+        Returns:
+            (n, dim) float32 array of L2-normalized vectors, or None when the
+            encoder is unavailable or not part of this analyzer's tier
+        """
+        if not clauses or self.similarity_model is None:
+            return None
+        with self._embedding_memo_lock:
+            vectors = [self._embedding_memo.get(clause_text) for clause_text in clauses]
+        missing = [index for index, vector in enumerate(vectors) if vector is None]
+        if missing:
+            try:
+                encoded = self.similarity_model.encode(
+                    [clauses[index] for index in missing],
+                    batch_size=_get_setting('AI_INFERENCE_BATCH_SIZE', 16),
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                ).astype('float32')
+            except Exception as e:
+                logger.error(f"Clause embedding failed: {str(e)}")
+                return None
+            for index, vector in zip(missing, encoded):
+                vectors[index] = vector
+        self._remember_embeddings(clauses, vectors)
+        with _REGISTRY_LOCK:
+            _INFERENCE_STATS['embedding_memo_hits'] += len(clauses) - len(missing)
+        import numpy as np  # installed with sentence-transformers
+        return np.stack(vectors)
+    
+    def _remember_embeddings(self, clauses: List[str], vectors: List):
+        """Add clause vectors to the embedding memo, evicting the least recently used"""
+        limit = _get_setting('AI_EMBEDDING_MEMO_SIZE', 4096)
+        with self._embedding_memo_lock:
+            for clause_text, vector in zip(clauses, vectors):
+                self._embedding_memo[clause_text] = vector
+                self._embedding_memo.move_to_end(clause_text)
+            while len(self._embedding_memo) > limit:
+                self._embedding_memo.popitem(last=False)
+    
+    def clear_embedding_memo(self):
+        with self._embedding_memo_lock:
+            self._embedding_memo.clear()
+    
+    def _default_clause_analysis(self, clause_text: str) -> Dict:
+        """Return the default clause analysis structure"""
+        return {
             'text': clause_text,
             'type': 'unknown',
             'confidence': 0.0,
@@ -126,56 +924,176 @@ class ClauseAnalyzer:
             'key_terms': [],
             'sentiment': 'neutral'
         }
+    
+    def _classify_batch(self, clauses: List[str], batch_size: int) -> List[Optional[float]]:
+        """
+        Run the classification model over clauses in length-bucketed batches
         
-        if self.is_ready:
-            # AI-powered clause analysis
-            clause_analysis.update(self._analyze_clause_ai(clause_text))
-        else:
-            # Fallback rule-based analysis
-            clause_analysis.update(self._analyze_clause_fallback(clause_text))
+        Clauses longer than MAX_SEQUENCE_LENGTH tokens are split into
+        overlapping windows (AI_WINDOW_STRIDE tokens of overlap) that are
+        batched together with ordinary clauses; each clause's window
+        probabilities are averaged, weighted by window length.
+        
+        Returns one confidence per clause, or None where inference failed.
+        """
+        confidences: List[Optional[float]] = [None] * len(clauses)
+        if not clauses or self.classification_model is None:
+            return confidences
         
+        stride = _get_setting('AI_WINDOW_STRIDE', 128)
+        try:
+            encodings = self.tokenizer(
+                list(clauses),
+                max_length=self.MAX_SEQUENCE_LENGTH,
+                truncation=True,
+                stride=stride,
+                return_overflowing_tokens=True,
+            )
+        except Exception as e:
+            logger.error(f"Batch tokenization failed: {str(e)}")
+            return confidences
+        
+        # Window -> clause mapping (slow tokenizers do not window: one per clause)
+        owners = encodings.pop('overflow_to_sample_mapping', None) or list(range(len(clauses)))
+        encodings.pop('overflowing_tokens', None)
+        encodings.pop('num_truncated_tokens', None)
+        lengths = [len(ids) for ids in encodings['input_ids']]
+        self._record_windowing(owners, lengths, stride)
+        
+        # Bucket by token length so each batch pads to a similar size
+        order = sorted(range(len(owners)), key=lambda i: lengths[i])
+        batch_size = max(int(batch_size), 1)
+        pooled: Dict[int, List] = {}
+        failed = set()
+        
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            try:
+                inputs = self.tokenizer.pad(
+                    {key: [encodings[key][i] for i in indices] for key in encodings.keys()},
+                    return_tensors="pt"
+                )
+                with torch.no_grad():
+                    outputs = self.classification_model(**inputs)
+                    predictions = torch.nn.functional.softmax(outputs.logits.float(), dim=-1)
+                for i, probabilities in zip(indices, predictions):
+                    weighted = probabilities * lengths[i]
+                    entry = pooled.get(owners[i])
+                    if entry is None:
+                        pooled[owners[i]] = [weighted, lengths[i]]
+                    else:
+                        entry[0] += weighted
+                        entry[1] += lengths[i]
+            except Exception as e:
+                logger.error(f"Batched clause inference failed: {str(e)}")
+                failed.update(owners[i] for i in indices)
+        
+        for clause_index, (probabilities, total_length) in pooled.items():
+            if clause_index not in failed:
+                confidences[clause_index] = float((probabilities / total_length).max())
+        
+        return confidences
+    
+    def _record_windowing(self, owners: List[int], lengths: List[int], stride: int):
+        """Count clauses that needed sliding windows and the extra tokens they cost"""
+        windows_per_clause: Dict[int, int] = {}
+        for owner in owners:
+            windows_per_clause[owner] = windows_per_clause.get(owner, 0) + 1
+        windowed = [count for count in windows_per_clause.values() if count > 1]
+        
+        stats = _INFERENCE_STATS
+        with _REGISTRY_LOCK:
+            stats['clauses'] += len(windows_per_clause)
+            stats['windows'] += len(owners)
+            stats['tokens'] += sum(lengths)
+            if windowed:
+                stats['windowed_clauses'] += len(windowed)
+                stats['extra_windows'] += sum(windowed) - len(windowed)
+                # Every window after a clause's first re-encodes ``stride`` overlap
+                # tokens plus its own [CLS]/[SEP]
+                stats['overlap_tokens'] += (sum(windowed) - len(windowed)) * (stride + 2)
+        if windowed:
+            logger.debug(f"Sliding windows: {len(windowed)} long clauses -> {sum(windowed)} windows")
+    
+    def _build_ai_clause_result(self, clause_text: str, confidence: float, clause_type: Optional[str] = None) -> Dict:
+        """Build the clause result for an AI-classified clause"""
+        clause_analysis = self._ai_clause_labels(clause_text, clause_type)
+        clause_analysis.update({
+            'confidence': confidence,
+            'key_terms': self._extract_key_terms(clause_text),
+            'sentiment': self._analyze_sentiment(clause_text),
+            'tier': 'model'
+        })
         return clause_analysis
     
-    def _analyze_clause_ai(self, clause_text: str) -> Dict:
-        """AI-powered clause analysis using BERT"""
+    def _ai_clause_labels(self, clause_text: str, clause_type: Optional[str] = None) -> Dict:
+        """Rule-derived labels of an AI-classified clause (type unless given, risk, suggestions)"""
+        # Get clause type
+        clause_type = clause_type or self._classify_clause_type_ai(clause_text)
+        
+        # Risk assessment
+        risk_factors = self._identify_risk_factors(clause_text, clause_type)
+        risk_score = self._calculate_risk_score(risk_factors)
+        
+        # Generate suggestions
+        suggestions = self._generate_clause_suggestions(clause_text, clause_type, risk_factors)
+        
+        return {
+            'type': clause_type,
+            'risk_score': risk_score,
+            'risk_factors': risk_factors,
+            'suggestions': suggestions,
+        }
+    
+    def _classify_clause_type_ai(self, clause_text: str) -> str:
+        """Clause type for the AI path (the base model has no clause-type head yet)"""
+        return self._classify_clause_type_fallback(clause_text)
+    
+    def _identify_risk_factors(self, clause_text: str, clause_type: str) -> List[str]:
+        """Identify risk factors for an AI-classified clause"""
+        return self._identify_risk_factors_fallback(clause_text)
+    
+    def _generate_clause_suggestions(self, clause_text: str, clause_type: str, risk_factors: List[str]) -> List[str]:
+        """Generate suggestions for an AI-classified clause"""
+        return self._generate_fallback_suggestions(clause_type, risk_factors)
+    
+    def _extract_key_terms(self, clause_text: str) -> List[str]:
+        """Extract key terms for an AI-classified clause"""
+        return self._extract_key_terms_fallback(clause_text)
+    
+    def _analyze_sentiment(self, clause_text: str) -> str:
+        """Clause sentiment (no sentiment model is loaded yet)"""
+        return 'neutral'
+    
+    def _extract_entities(self, text: str) -> List[Dict]:
+        """Extract named entities with the NER pipeline (used when spaCy is unavailable)"""
+        if self.nlp_pipeline is None:
+            return []
         try:
-            # Tokenize and classify
-            inputs = self.tokenizer(clause_text, return_tensors="pt", max_length=512, truncation=True, padding=True)
-            
-            with torch.no_grad():
-                outputs = self.classification_model(**inputs)
-                predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            
-            # Get clause type and confidence
-            clause_type = self._classify_clause_type_ai(clause_text)
-            confidence = float(torch.max(predictions))
-            
-            # Risk assessment
-            risk_factors = self._identify_risk_factors(clause_text, clause_type)
-            risk_score = self._calculate_risk_score(risk_factors)
-            
-            # Generate suggestions
-            suggestions = self._generate_clause_suggestions(clause_text, clause_type, risk_factors)
-            
-            return {
-                'type': clause_type,
-                'confidence': confidence,
-                'risk_score': risk_score,
-                'risk_factors': risk_factors,
-                'suggestions': suggestions,
-                'key_terms': self._extract_key_terms(clause_text),
-                'sentiment': self._analyze_sentiment(clause_text)
-            }
-            
+            entities = {}
+            for entity in self.nlp_pipeline(text[:5000], aggregation_strategy='simple'):
+                word = entity.get('word', '').strip()
+                if word and word not in entities:
+                    entities[word] = {'text': word, 'label': entity.get('entity_group', ''), 'score': float(entity.get('score', 0))}
+            return list(entities.values())[:50]
         except Exception as e:
-            logger.error(f"AI clause analysis failed: {str(e)}")
-            return self._analyze_clause_fallback(clause_text)
+            logger.error(f"Entity extraction failed: {str(e)}")
+            return []
     
     def _analyze_clause_fallback(self, clause_text: str) -> Dict:
         """Rule-based fallback clause analysis"""
-        clause_type = self._classify_clause_type_fallback(clause_text)
-        risk_factors = self._identify_risk_factors_fallback(clause_text)
-        risk_score = len(risk_factors) * 1.5  # Simple risk calculation
+        clause_analysis = self._fallback_clause_labels(clause_text)
+        clause_analysis.update({
+            'key_terms': self._extract_key_terms_fallback(clause_text),
+            'sentiment': 'neutral',
+            'tier': 'fallback'
+        })
+        return clause_analysis
+    
+    def _fallback_clause_labels(self, clause_text: str) -> Dict:
+        """Rule-based clause type, confidence, risk and suggestions"""
+        clause_type, risk_factors = get_rule_engine().classify(clause_text)
+        risk_score = len(risk_factors) * FALLBACK_RISK_WEIGHT  # Simple risk calculation
         
         return {
             'type': clause_type,
@@ -183,38 +1101,109 @@ class ClauseAnalyzer:
             'risk_score': min(risk_score, 10.0),
             'risk_factors': risk_factors,
             'suggestions': self._generate_fallback_suggestions(clause_type, risk_factors),
-            'key_terms': self._extract_key_terms_fallback(clause_text),
-            'sentiment': 'neutral'
         }
     
-    def _extract_clauses_ai(self, text: str) -> List[str]:
-        """Extract clauses using AI sentence segmentation"""
-        # Use spacy for better sentence segmentation
+    def rescore_clause(self, clause_text: str, rule_based: bool, clause_type: Optional[str] = None) -> Dict:
+        """
+        Re-apply the current rules and risk weights to a stored clause
+        
+        No model runs: clauses analyzed by the models keep their confidence
+        and only get new rule-derived labels.
+        
+        Args:
+            clause_text: Stored clause text
+            rule_based: Whether the clause was analyzed by the rule-based fallback
+            clause_type: Stored type to keep (prototype-typed clauses); derived
+                from the rules when None
+            
+        Returns:
+            Dictionary with ``type``, ``risk_score``, ``risk_factors`` and
+            ``suggestions`` (plus ``confidence`` for rule-based clauses)
+        """
+        if rule_based:
+            return self._fallback_clause_labels(clause_text)
+        return self._ai_clause_labels(clause_text, clause_type)
+    
+    def _get_spacy(self):
+        """Return the warm spaCy pipeline, with unused components disabled"""
+        disabled = _get_setting('AI_SPACY_DISABLED_COMPONENTS', ['lemmatizer'])
+        return load_model(
+            f'spacy:{self.SPACY_MODEL_NAME}',
+            lambda: spacy.load(self.SPACY_MODEL_NAME, disable=list(disabled))
+        )
+    
+    def _parse_document(self, text: str) -> Optional[Dict]:
+        """
+        Process the document with spaCy exactly once
+        
+        Returns:
+            Dictionary with the segmented ``clauses``, per-clause ``key_terms``
+            candidates and document ``entities``, or None if spaCy is unavailable
+        """
+        nlp = self._load_capability('spacy')
+        if nlp is None:
+            return None
         try:
-            import spacy
-            nlp = spacy.load("en_core_web_sm")
+            nlp.max_length = max(nlp.max_length, len(text) + 1)
             doc = nlp(text)
-            
-            clauses = []
-            current_clause = ""
-            
-            for sent in doc.sents:
-                sent_text = sent.text.strip()
-                if len(sent_text) < 20:  # Too short to be a meaningful clause
-                    current_clause += " " + sent_text
-                else:
-                    if current_clause:
-                        clauses.append(current_clause.strip())
-                    current_clause = sent_text
-            
-            if current_clause:
-                clauses.append(current_clause.strip())
-            
-            return [c for c in clauses if len(c) > 50]  # Filter very short clauses
-            
         except Exception as e:
-            logger.error(f"AI clause extraction failed: {str(e)}")
+            logger.error(f"spaCy document processing failed: {str(e)}")
+            return None
+        
+        # Sentence-based segmentation: short sentences are merged into the current clause
+        spans = []
+        current = []
+        for sent in doc.sents:
+            if len(sent.text.strip()) < 20 or not current:  # Too short to be a meaningful clause
+                current.append(sent)
+            else:
+                spans.append(current)
+                current = [sent]
+        if current:
+            spans.append(current)
+        
+        clauses = []
+        key_terms = []
+        for sents in spans:
+            clause_text = " ".join(sent.text.strip() for sent in sents).strip()
+            if len(clause_text) <= 50:  # Filter very short clauses
+                continue
+            clauses.append(clause_text)
+            key_terms.append(self._key_terms_from_span(doc[sents[0].start:sents[-1].end]))
+        
+        entities = {}
+        for ent in doc.ents:
+            entity_text = ent.text.strip()
+            if entity_text and entity_text not in entities:
+                entities[entity_text] = {'text': entity_text, 'label': ent.label_}
+        
+        return {
+            'clauses': clauses,
+            'key_terms': key_terms,
+            'entities': list(entities.values())[:50],
+        }
+    
+    def _key_terms_from_span(self, span) -> List[str]:
+        """Key-term candidates for a clause: its entities, then multi-word noun chunks"""
+        terms = []
+        for ent in span.ents:
+            if ent.text not in terms:
+                terms.append(ent.text)
+        try:
+            for chunk in span.noun_chunks:
+                chunk_text = chunk.text.strip()
+                if len(chunk) > 1 and chunk_text not in terms:
+                    terms.append(chunk_text)
+        except (ValueError, NotImplementedError):
+            pass  # Parser disabled: no noun chunks
+        return terms[:10]
+    
+    def _extract_clauses_ai(self, text: str) -> List[str]:
+        """Extract clauses using AI sentence segmentation"""
+        parsed = self._parse_document(text)
+        if parsed is None:
             return self._extract_clauses_fallback(text)
+        return parsed['clauses']
     
     def _extract_clauses_fallback(self, text: str) -> List[str]:
         """Fallback rule-based clause extraction"""
@@ -243,49 +1232,11 @@ class ClauseAnalyzer:
     
     def _classify_clause_type_fallback(self, clause_text: str) -> str:
         """Rule-based clause type classification"""
-        clause_lower = clause_text.lower()
-        
-        # Define keyword patterns for different clause types
-        clause_patterns = {
-            'termination': ['termination', 'terminate', 'end', 'expir', 'cancel'],
-            'payment': ['payment', 'fee', 'cost', 'expense', 'invoice', 'billing'],
-            'liability': ['liable', 'liability', 'damages', 'indemnif', 'responsible'],
-            'confidentiality': ['confidential', 'non-disclosure', 'proprietary', 'secret'],
-            'intellectual_property': ['intellectual property', 'copyright', 'patent', 'trademark', 'ip'],
-            'dispute_resolution': ['dispute', 'arbitration', 'mediation', 'court', 'litigation'],
-            'governing_law': ['governing law', 'jurisdiction', 'applicable law'],
-            'force_majeure': ['force majeure', 'acts of god', 'unforeseeable'],
-        }
-        
-        for clause_type, keywords in clause_patterns.items():
-            if any(keyword in clause_lower for keyword in keywords):
-                return clause_type
-        
-        return 'general'
+        return get_rule_engine().clause_type(clause_text)
     
     def _identify_risk_factors_fallback(self, clause_text: str) -> List[str]:
         """Identify risk factors using rule-based patterns"""
-        risks = []
-        clause_lower = clause_text.lower()
-        
-        # High-risk patterns
-        high_risk_patterns = {
-            'Unlimited liability': ['unlimited liability', 'unlimited damages'],
-            'Vague termination': ['may terminate', 'at any time', 'without cause'],
-            'No dispute resolution': len(re.findall(r'dispute|arbitration|mediation', clause_lower)) == 0,
-            'Excessive penalties': ['penalty', 'fine', 'liquidated damages'],
-            'Broad indemnification': ['indemnify.*all', 'hold harmless.*any'],
-        }
-        
-        for risk_name, patterns in high_risk_patterns.items():
-            if isinstance(patterns, bool):
-                if patterns and 'termination' in clause_lower:
-                    risks.append(risk_name)
-            else:
-                if any(re.search(pattern, clause_lower) for pattern in patterns):
-                    risks.append(risk_name)
-        
-        return risks
+        return get_rule_engine().risk_factors(clause_text)
     
     def _generate_fallback_suggestions(self, clause_type: str, risk_factors: List[str]) -> List[str]:
         """Generate suggestions based on clause type and risk factors"""
@@ -325,21 +1276,8 @@ class ClauseAnalyzer:
         return list(set(terms))[:10]  # Return unique terms, max 10
     
     def _calculate_risk_score(self, risk_factors: List[str]) -> float:
-        """Calculate risk score based on identified risk factors"""
-        if not risk_factors:
-            return 3.0  # Low default risk
-        
-        # Weight different risk factors
-        risk_weights = {
-            'Unlimited liability': 3.0,
-            'Vague termination': 2.0,
-            'No dispute resolution': 2.5,
-            'Excessive penalties': 2.0,
-            'Broad indemnification': 2.5,
-        }
-        
-        total_risk = sum(risk_weights.get(risk, 1.5) for risk in risk_factors)
-        return min(total_risk, 10.0)
+        """Calculate risk score based on identified risk factors (weights in ai_rules.RISK_WEIGHTS)"""
+        return get_rule_engine().risk_score(risk_factors)
     
     def _generate_document_recommendations(self, analysis: Dict) -> List[str]:
         """Generate overall document recommendations"""
@@ -362,16 +1300,11 @@ class ClauseAnalyzer:
         return recommendations
     
     def _assess_compliance(self, analysis: Dict) -> str:
-        """Assess compliance status based on analysis"""
-        risk_score = analysis['overall_risk_score']
-        high_risk_count = sum(1 for c in analysis['clauses'] if c['risk_score'] > 7)
-        
-        if high_risk_count > 2 or risk_score > 8:
-            return 'non_compliant'
-        elif high_risk_count > 0 or risk_score > 6:
-            return 'review_required'
-        else:
-            return 'compliant'
+        """Assess compliance status based on analysis (thresholds in ai_rules.COMPLIANCE_THRESHOLDS)"""
+        engine = get_rule_engine()
+        threshold = engine.compliance_thresholds['high_risk_clause']
+        high_risk_count = sum(1 for c in analysis['clauses'] if c['risk_score'] > threshold)
+        return engine.compliance_status(analysis['overall_risk_score'], high_risk_count)
     
     def _calculate_summary_stats(self, analysis: Dict) -> Dict:
         """Calculate summary statistics"""
@@ -398,7 +1331,7 @@ class ClauseAnalyzer:
         return {
             'document_title': '',
             'analysis_timestamp': datetime.now().isoformat(),
-            'model_version': '1.0.0',
+            'model_version': ANALYZER_VERSION,
             'clauses': [],
             'overall_risk_score': 0.0,
             'risk_factors': [],
@@ -410,13 +1343,113 @@ class ClauseAnalyzer:
 
 
 # Helper functions for integration
-def analyze_mou_document(pdf_text: str, mou_title: str = "") -> Dict:
+def get_analyzer(tier: Optional[str] = None) -> ClauseAnalyzer:
+    """
+    Return the process-wide ClauseAnalyzer of an analysis tier, creating it on first use
+    
+    ``tier`` is one of ANALYSIS_TIERS (defaults to AI_ANALYSIS_TIER). The
+    tiers share the model registry, so a model used by several tiers is
+    loaded once. When AI_INFERENCE_SERVER_SOCKET is set, model tiers are thin
+    clients of the local inference server (see ai_server) and no models are
+    loaded here; the rules tier always runs locally.
+    Usage: analyzer = get_analyzer('standard')
+    """
+    tier = resolve_analysis_tier(tier)
+    analyzer = _SHARED_ANALYZERS.get(tier)
+    if analyzer is None:
+        with _REGISTRY_LOCK:
+            analyzer = _SHARED_ANALYZERS.get(tier)
+            if analyzer is None:
+                socket_path = _get_setting('AI_INFERENCE_SERVER_SOCKET', '')
+                if socket_path and ANALYSIS_TIERS[tier] and not _IN_INFERENCE_SERVER:
+                    from .ai_server import RemoteClauseAnalyzer
+                    analyzer = RemoteClauseAnalyzer(socket_path, tier=tier)
+                else:
+                    analyzer = ClauseAnalyzer(tier=tier)
+                _SHARED_ANALYZERS[tier] = analyzer
+    return analyzer
+
+
+def warm_up_analyzer(tier: Optional[str] = None) -> Dict:
+    """
+    Load the models of an analysis tier (defaults to AI_ANALYSIS_TIER) ahead
+    of the first task and run a tiny inference so lazy framework
+    initialisation is paid up front.
+    Usage: stats = warm_up_analyzer()  (e.g. from a worker start signal)
+    """
+    started = time.perf_counter()
+    analyzer = get_analyzer(tier)
+    try:
+        analyzer.load_tier_models()
+        analyzer.analyze_clause(
+            "Either party may terminate this Memorandum of Understanding with thirty days written notice."
+        )
+    except Exception as e:
+        logger.warning(f"Analyzer warm-up inference failed: {str(e)}")
+    
+    stats = get_model_registry_stats()
+    stats['ai_ready'] = analyzer.is_ready
+    stats['precision'] = analyzer.precision
+    stats['analysis_tier'] = analyzer.tier
+    stats['warm_up_seconds'] = round(time.perf_counter() - started, 3)
+    memory = stats['memory']
+    logger.info(
+        f"Analyzer warmed up in {stats['warm_up_seconds']}s, RSS {stats['rss_mb']} MB "
+        f"(unique {memory.get('uss_mb', 'n/a')} MB, shared {memory.get('shared_mb', 'n/a')} MB)"
+    )
+    return stats
+
+
+def preload_models_for_fork(tier: Optional[str] = None) -> Dict:
+    """
+    Load the models of an analysis tier (defaults to AI_ANALYSIS_TIER) in the
+    Celery parent process before the prefork pool forks, so children share
+    the weight pages copy-on-write instead of each loading a private copy.
+    Usage: stats = preload_models_for_fork()  (from the worker_init signal)
+    
+    No inference runs here: torch/OpenMP thread pools started before fork are
+    not safe to use in the children, so the first inference happens in each
+    child (see warm_up_analyzer). gc.freeze() moves the loaded objects out of
+    the collector's generations, so collections in the children do not write
+    to (and un-share) the pages holding them.
+    """
+    import gc
+    
+    started = time.perf_counter()
+    analyzer = get_analyzer(tier)
+    analyzer.load_tier_models()
+    get_rule_engine()
+    
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+    
+    stats = get_model_registry_stats()
+    stats['ai_ready'] = analyzer.is_ready
+    stats['precision'] = analyzer.precision
+    stats['analysis_tier'] = analyzer.tier
+    stats['preload_seconds'] = round(time.perf_counter() - started, 3)
+    logger.info(
+        f"Preloaded AI models before fork in {stats['preload_seconds']}s, "
+        f"parent RSS {stats['memory']['rss_mb']} MB"
+    )
+    return stats
+
+
+def analyze_mou_document(pdf_text: str, mou_title: str = "", tier: Optional[str] = None) -> Dict:
     """
     Main function to analyze MOU document
-    Usage: result = analyze_mou_document(pdf_text, mou_title)
+    Usage: result = analyze_mou_document(pdf_text, mou_title, tier='standard')
+    """
+    return get_analyzer(tier).analyze_document(pdf_text, mou_title)
+
+
+def get_analyzer_version(tier: Optional[str] = None) -> str:
+    """
+    Version of the analyzer this process would run (models, rules, ANALYZER_VERSION)
+    Usage: if analysis.analyzer_version != get_analyzer_version(): ...
     """
-    analyzer = ClauseAnalyzer()
-    return analyzer.analyze_document(pdf_text, mou_title)
+    return get_analyzer(tier).version_key
 
 
 def get_clause_recommendations(clause_text: str) -> Dict:
@@ -424,5 +1457,4 @@ def get_clause_recommendations(clause_text: str) -> Dict:
     Get recommendations for a specific clause
     Usage: recommendations = get_clause_recommendations(clause_text)
     """
-    analyzer = ClauseAnalyzer()
-    return analyzer.analyze_clause(clause_text)
+    return get_analyzer().analyze_clause(clause_text)
@@ -0,0 +1,80 @@
+"""
+Map-reduce analysis of very long MOUs
+The extracted text is cut into shards at clause boundaries, each shard is
+segmented and analyzed independently (in parallel Celery tasks, see
+tasks.dispatch_sharded_analysis, tasks.analyze_mou_shard and
+tasks.merge_mou_shards), and the ordered shard results are merged into one
+clause list whose rollups are computed exactly as for a single-pass analysis.
+"""
+
+import re
+from typing import Dict, List
+
+# Cut points, most preferred first: numbered clauses, lettered clauses,
+# paragraph breaks, line breaks. A shard starts at the newline, so the clause
+# marker stays where the rule-based segmentation expects it.
+SHARD_BOUNDARIES = [
+    re.compile(r'\n(?=\d+\.\s)'),
+    re.compile(r'\n(?=[A-Z]\.\s)'),
+    re.compile(r'\n(?=\s*\n)'),
+    re.compile(r'\n'),
+]
+
+# At most this many entities are kept, as in a single-pass analysis
+MAX_ENTITIES = 50
+
+
+def should_shard(text: str) -> bool:
+    """Whether a document is long enough for sharded analysis (AI_SHARD_MIN_CHARS)"""
+    from .ai_services import _get_setting
+    if not _get_setting('AI_SHARDED_ANALYSIS', True):
+        return False
+    return len(text) >= int(_get_setting('AI_SHARD_MIN_CHARS', 250000))
+
+
+def split_document(text: str, shard_chars: int) -> List[str]:
+    """
+    Cut ``text`` into consecutive shards of about ``shard_chars`` characters
+
+    Each cut is placed at the most preferred boundary between half and one
+    and a half times ``shard_chars`` from the shard start, closest to the
+    target; without any boundary the text is cut at the target. Joining the
+    shards gives back ``text``.
+    """
+    shard_chars = max(int(shard_chars), 1)
+    shards = []
+    start = 0
+    while len(text) - start > shard_chars * 1.5:
+        target = start + shard_chars
+        low, high = start + max(shard_chars // 2, 1), start + shard_chars * 3 // 2
+        cut = target
+        for boundary in SHARD_BOUNDARIES:
+            positions = [match.start() for match in boundary.finditer(text, low, high)]
+            if positions:
+                cut = min(positions, key=lambda position: abs(position - target))
+                break
+        shards.append(text[start:cut])
+        start = cut
+    shards.append(text[start:])
+    return shards
+
+
+def merge_shard_results(shard_results: List[Dict]) -> Dict:
+    """
+    Merge per-shard analyses back into document order
+
+    Args:
+        shard_results: Dictionaries with ``index``, ``clauses`` and ``entities``,
+            in any order
+
+    Returns:
+        Dictionary with the concatenated ``clauses`` and the first occurrence
+        of each entity (``entities``)
+    """
+    clauses = []
+    entities: Dict[str, Dict] = {}
+    for shard in sorted(shard_results, key=lambda shard: shard['index']):
+        clauses.extend(shard['clauses'])
+        for entity in shard['entities']:
+            entities.setdefault(entity['text'], entity)
+    return {'clauses': clauses, 'entities': list(entities.values())[:MAX_ENTITIES]}
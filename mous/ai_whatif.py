@@ -0,0 +1,258 @@
+"""
+Risk-weight what-if simulation over stored risk factors
+Clause risk scores are a capped weighted sum of their risk factors, so the
+whole portfolio can be re-scored without touching clause text: the stored
+``ClauseAnalysis.risk_factors`` are packed into a clause x risk-factor count
+matrix once, and new weights and compliance thresholds are evaluated as one
+matrix-vector product plus per-document reductions.
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .ai_rules import DEFAULT_RISK_WEIGHT, FALLBACK_RISK_WEIGHT, NO_RISK_SCORE, get_rule_engine
+
+logger = logging.getLogger(__name__)
+
+COMPLIANCE_STATUSES = ['compliant', 'review_required', 'non_compliant']
+
+# Lower bounds of AIAnalysis.risk_level
+RISK_LEVELS = [('Very Low', 0.0), ('Low', 4.0), ('Medium', 6.0), ('High', 8.0)]
+
+
+class RiskFactorMatrix:
+    """
+    Clause x risk-factor counts of every completed analysis
+
+    ``counts`` is a uint8 matrix with one row per clause and one column per
+    distinct risk factor; ``clause_analysis`` maps each row to its position in
+    ``analysis_ids``. Clauses the rule-based fallback scored (``weighted``
+    False, decided per clause as by rescore_analyses) score every factor
+    FALLBACK_RISK_WEIGHT, as the fallback does.
+    """
+
+    ARRAYS = ('counts', 'clause_analysis', 'analysis_ids', 'mou_ids', 'weighted')
+
+    def __init__(self, factors: List[str], counts, clause_analysis, analysis_ids, mou_ids, weighted, state=None):
+        self.factors = factors
+        self.counts = counts
+        self.clause_analysis = clause_analysis
+        self.analysis_ids = analysis_ids
+        self.mou_ids = mou_ids
+        self.weighted = weighted
+        self.state = state
+
+    @classmethod
+    def build(cls) -> 'RiskFactorMatrix':
+        """Read the stored risk factors of all completed analyses"""
+        from .ai_models import AIAnalysis, ClauseAnalysis
+        from .ai_rescore import uses_fallback_scoring
+
+        state = _database_state()
+        analyses = list(
+            AIAnalysis.objects.filter(status='completed').order_by('id').values_list('id', 'mou_id', 'analyzer_version')
+        )
+        position = {analysis_id: index for index, (analysis_id, _, _) in enumerate(analyses)}
+
+        factor_index: Dict[str, int] = {}
+        rows, columns, clause_analysis, weighted = [], [], [], []
+        clause_rows = ClauseAnalysis.objects.filter(ai_analysis__status='completed').order_by('ai_analysis_id', 'sequence')
+        for row, (analysis_id, risk_factors, tier) in enumerate(
+                clause_rows.values_list('ai_analysis_id', 'risk_factors', 'tier').iterator(chunk_size=20000)):
+            clause_analysis.append(position[analysis_id])
+            weighted.append(not uses_fallback_scoring(tier, analyses[position[analysis_id]][2]))
+            for factor in risk_factors or []:
+                rows.append(row)
+                columns.append(factor_index.setdefault(factor, len(factor_index)))
+
+        counts = np.zeros((len(clause_analysis), max(len(factor_index), 1)), dtype=np.uint8)
+        np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), 1)
+        return cls(
+            factors=list(factor_index),
+            counts=counts,
+            clause_analysis=np.array(clause_analysis, dtype=np.int32),
+            analysis_ids=np.array([a[0] for a in analyses], dtype=np.int64),
+            mou_ids=np.array([a[1] for a in analyses], dtype=np.int64),
+            weighted=np.array(weighted, dtype=bool),
+            state=state,
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps({'factors': self.factors, 'state': self.state})),
+                     **{name: getattr(self, name) for name in self.ARRAYS})
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RiskFactorMatrix':
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if len(data['weighted']) != len(data['clause_analysis']):
+                raise ValueError('saved with per-analysis weighting; rebuilding')
+            return cls(meta['factors'], state=meta['state'], **{name: data[name] for name in cls.ARRAYS})
+
+    def __len__(self):
+        return len(self.clause_analysis)
+
+    def clause_scores(self, risk_weights: Dict[str, float]):
+        """Risk score of every clause under ``risk_weights``"""
+        vector = np.array([risk_weights.get(f, DEFAULT_RISK_WEIGHT) for f in self.factors] or [0.0], dtype=np.float32)
+        factor_counts = self.counts.sum(axis=1, dtype=np.int32)
+        weighted_scores = np.where(factor_counts > 0, self.counts @ vector, NO_RISK_SCORE)
+        fallback_scores = factor_counts * FALLBACK_RISK_WEIGHT
+        scores = np.where(self.weighted, weighted_scores, fallback_scores)
+        return np.minimum(scores, 10.0).astype(np.float32)
+
+    def document_results(self, risk_weights: Dict[str, float], thresholds: Dict[str, float]):
+        """
+        Overall risk score and compliance status of every analysis
+
+        Returns:
+            (overall scores, status codes indexing COMPLIANCE_STATUSES)
+        """
+        scores = self.clause_scores(risk_weights)
+        documents = len(self.analysis_ids)
+        clauses = np.bincount(self.clause_analysis, minlength=documents)
+        totals = np.bincount(self.clause_analysis, weights=scores, minlength=documents)
+        overall = np.minimum(totals / np.maximum(clauses, 1), 10.0)
+        high_risk = np.bincount(
+            self.clause_analysis, weights=scores > thresholds['high_risk_clause'], minlength=documents
+        )
+
+        non_compliant = (high_risk > thresholds['non_compliant_clauses']) | (overall > thresholds['non_compliant_score'])
+        review = (high_risk > 0) | (overall > thresholds['review_score'])
+        status = np.where(non_compliant, 2, np.where(review, 1, 0)).astype(np.int8)
+        return overall, status
+
+
+def _database_state() -> List:
+    """Cheap fingerprint of the stored analyses, to notice when the matrix is stale"""
+    from django.db.models import Count, Max
+    from .ai_models import AIAnalysis
+
+    state = AIAnalysis.objects.filter(status='completed').aggregate(
+        analyses=Count('id', distinct=True), updated=Max('last_updated'), clauses=Count('clauses')
+    )
+    return [state['analyses'], state['updated'].isoformat() if state['updated'] else None, state['clauses']]
+
+
+def _matrix_path() -> str:
+    from .ai_services import _get_setting
+    return os.path.join(str(_get_setting('AI_INDEX_DIR', 'ai_index')), 'risk_factor_matrix.npz')
+
+
+def get_risk_matrix(rebuild: bool = False) -> RiskFactorMatrix:
+    """Load the saved matrix, rebuilding it when the stored analyses have changed"""
+    path = _matrix_path()
+    if not rebuild and os.path.exists(path):
+        try:
+            matrix = RiskFactorMatrix.load(path)
+            if matrix.state == _database_state():
+                return matrix
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Could not load risk factor matrix: {str(e)}")
+    matrix = RiskFactorMatrix.build()
+    try:
+        matrix.save(path)
+    except OSError as e:
+        logger.warning(f"Could not save risk factor matrix: {str(e)}")
+    return matrix
+
+
+def _distribution(overall, status) -> Dict:
+    levels = {}
+    for index, (name, lower) in enumerate(RISK_LEVELS):
+        upper = RISK_LEVELS[index + 1][1] if index + 1 < len(RISK_LEVELS) else np.inf
+        levels[name] = int(((overall >= lower) & (overall < upper)).sum())
+    return {
+        'mean_risk_score': round(float(overall.mean()), 3) if len(overall) else 0.0,
+        'risk_histogram': np.histogram(overall, bins=10, range=(0, 10))[0].tolist(),
+        'risk_levels': levels,
+        'compliance': {name: int((status == code).sum()) for code, name in enumerate(COMPLIANCE_STATUSES)},
+    }
+
+
+def simulate(risk_weights: Optional[Dict[str, float]] = None, thresholds: Optional[Dict[str, float]] = None,
+             matrix: Optional[RiskFactorMatrix] = None) -> Dict:
+    """
+    Preview the portfolio under changed risk weights and compliance thresholds
+
+    Args:
+        risk_weights: Weights overriding the current rule engine's
+        thresholds: Compliance thresholds overriding the current ones
+        matrix: Risk factor matrix (defaults to ``get_risk_matrix()``)
+
+    Returns:
+        ``before`` (current weights) and ``after`` distributions of overall
+        risk score, risk level and compliance status, the compliance status
+        transitions and the number of documents whose results change
+    """
+    engine = get_rule_engine()
+    matrix = matrix if matrix is not None else get_risk_matrix()
+    current_weights, current_thresholds = dict(engine.risk_weights), dict(engine.compliance_thresholds)
+    new_weights = dict(current_weights, **(risk_weights or {}))
+    new_thresholds = dict(current_thresholds, **(thresholds or {}))
+
+    started = time.perf_counter()
+    before_overall, before_status = matrix.document_results(current_weights, current_thresholds)
+    after_overall, after_status = matrix.document_results(new_weights, new_thresholds)
+    transitions = np.zeros((len(COMPLIANCE_STATUSES), len(COMPLIANCE_STATUSES)), dtype=np.int64)
+    np.add.at(transitions, (before_status, after_status), 1)
+    changed = (np.abs(after_overall - before_overall) >= 0.005) | (after_status != before_status)
+
+    return {
+        'documents': len(matrix.analysis_ids),
+        'clauses': len(matrix),
+        'fallback_clauses': int(len(matrix) - matrix.weighted.sum()),
+        'factors': matrix.factors,
+        'risk_weights': new_weights,
+        'thresholds': new_thresholds,
+        'before': _distribution(before_overall, before_status),
+        'after': _distribution(after_overall, after_status),
+        'transitions': {
+            before: {after: int(transitions[i, j]) for j, after in enumerate(COMPLIANCE_STATUSES) if transitions[i, j]}
+            for i, before in enumerate(COMPLIANCE_STATUSES)
+        },
+        'documents_changed': int(changed.sum()),
+        'changed_mou_ids': matrix.mou_ids[changed][:100].tolist(),
+        'seconds': round(time.perf_counter() - started, 4),
+    }
+
+
+def apply_simulation(risk_weights: Optional[Dict[str, float]] = None,
+                     thresholds: Optional[Dict[str, float]] = None, **rescore_options) -> Dict:
+    """
+    Persist scores under new weights and thresholds with the bulk re-scoring engine
+
+    The process-wide rule engine is swapped for one with the new weights and
+    thresholds while ``rescore_analyses`` runs, so clause scores, document
+    rollups, compliance status and risk flags are all written consistently.
+    Analyses keep the new rule fingerprint; set AI_RISK_WEIGHTS and
+    AI_COMPLIANCE_THRESHOLDS to the same values so new analyses match.
+    """
+    from .ai_rescore import rescore_analyses
+    from .ai_rules import RuleEngine, set_rule_engine
+
+    engine = get_rule_engine()
+    simulated = RuleEngine(
+        clause_types=engine.clause_types,
+        risk_rules=engine.risk_rules,
+        risk_weights=dict(engine.risk_weights, **(risk_weights or {})),
+        compliance_thresholds=dict(engine.compliance_thresholds, **(thresholds or {})),
+    )
+    previous = set_rule_engine(simulated)
+    try:
+        return rescore_analyses(force=True, **rescore_options)
+    finally:
+        set_rule_engine(previous)
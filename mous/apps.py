@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class MousConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mous'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from .models import MOU
+
+        post_delete.connect(_delete_mou_embeddings, sender=MOU, dispatch_uid='mous_delete_mou_embeddings')
+
+
+def _delete_mou_embeddings(sender, instance, **kwargs):
+    """Tombstone a deleted MOU's clause and document embeddings"""
+    from .ai_embeddings import delete_mou_embeddings
+    delete_mou_embeddings(instance.pk)
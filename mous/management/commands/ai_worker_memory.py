@@ -0,0 +1,111 @@
+"""
+Management command to report memory of Celery worker processes
+Usage: python manage.py ai_worker_memory [--pid <parent pid>] [--json]
+
+Shows per-process RSS, PSS, unique (USS) and shared memory for each Celery
+worker parent and its prefork children. With models preloaded before fork
+(AI_PRELOAD_BEFORE_FORK) the weights show up as shared memory, and a child's
+USS is what one more unit of --concurrency costs.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from mous.ai_services import process_memory
+import json
+import os
+
+
+class Command(BaseCommand):
+    help = 'Report per-process unique and shared memory of Celery workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pid',
+            type=int,
+            help='Only report this worker parent process and its children',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isdir('/proc'):
+            raise CommandError('This report needs /proc (Linux).')
+
+        workers = self.find_worker_processes()
+        if options['pid']:
+            workers = {
+                pid: info for pid, info in workers.items()
+                if pid == options['pid'] or info['ppid'] == options['pid']
+            }
+        if not workers:
+            self.stdout.write(self.style.WARNING('No Celery worker processes found.'))
+            return
+
+        report = []
+        for pid, info in sorted(workers.items()):
+            if info['ppid'] in workers:
+                continue
+            children = [
+                dict(pid=child_pid, **process_memory(child_pid))
+                for child_pid, child in sorted(workers.items()) if child['ppid'] == pid
+            ]
+            entry = {
+                'pid': pid,
+                'cmdline': info['cmdline'],
+                'parent': process_memory(pid),
+                'children': children,
+            }
+            if children:
+                entry['child_uss_mb_avg'] = round(sum(c.get('uss_mb', 0.0) for c in children) / len(children), 1)
+                entry['child_shared_mb_avg'] = round(sum(c.get('shared_mb', 0.0) for c in children) / len(children), 1)
+                entry['total_rss_mb'] = round(entry['parent']['rss_mb'] + sum(c['rss_mb'] for c in children), 1)
+                entry['total_pss_mb'] = round(
+                    entry['parent'].get('pss_mb', 0.0) + sum(c.get('pss_mb', 0.0) for c in children), 1
+                )
+            report.append(entry)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for entry in report:
+            self.stdout.write(self.style.SUCCESS(f"Worker {entry['pid']}: {entry['cmdline'][:100]}"))
+            self.write_row('parent', entry['pid'], entry['parent'])
+            for child in entry['children']:
+                self.write_row('child', child['pid'], child)
+            if entry['children']:
+                self.stdout.write(
+                    f"  Children: {len(entry['children'])}, avg unique {entry['child_uss_mb_avg']} MB, "
+                    f"avg shared {entry['child_shared_mb_avg']} MB"
+                )
+                self.stdout.write(
+                    f"  Total RSS {entry['total_rss_mb']} MB, actual (PSS) {entry['total_pss_mb']} MB; "
+                    f"each extra child costs ~{entry['child_uss_mb_avg']} MB"
+                )
+
+    def write_row(self, role, pid, memory):
+        self.stdout.write(
+            f"  {role:<6} {pid:>7}  RSS {memory.get('rss_mb', 0.0):>8} MB  "
+            f"PSS {memory.get('pss_mb', 0.0):>8} MB  USS {memory.get('uss_mb', 0.0):>8} MB  "
+            f"shared {memory.get('shared_mb', 0.0):>8} MB"
+        )
+
+    def find_worker_processes(self):
+        """Return {pid: {'ppid', 'cmdline'}} for running Celery worker processes"""
+        workers = {}
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/cmdline', 'rb') as f:
+                    args = f.read().decode('utf-8', 'replace').split('\0')
+                with open(f'/proc/{name}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            # e.g. "celery -A mou_management worker" or "python -m celery ... worker"
+            if 'worker' in args and 'celery' in (os.path.basename(arg) for arg in args):
+                workers[int(name)] = {'ppid': ppid, 'cmdline': ' '.join(args).strip()}
+        return workers
@@ -1,12 +1,21 @@
 """
 Management command to run AI analysis on existing MOUs
-Usage: python manage.py analyze_existing_mous [--all] [--mou-id <id>] [--limit <count>]
+Usage: python manage.py analyze_existing_mous [--all] [--mou-id <id>] [--limit <count>] [--force] [--rerun-unchanged]
+                                              [--tier rules|standard|deep]
+                                              [--pipeline [--extract-workers <n>] [--json]]
+
+By default each MOU is queued as a Celery task. --pipeline analyzes them in
+this process with a staged executor (reader, extractor pool, inference,
+batched writer) that overlaps file I/O, text extraction, inference and
+database writes, and reports each stage's utilization and queue depth.
 """
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import Q
+from mous.ai_services import ANALYSIS_TIERS
 from mous.models import MOU
 from mous.tasks import analyze_mou_with_ai
+import json
 import time
 
 
@@ -35,8 +44,37 @@ class Command(BaseCommand):
             action='store_true',
             help='Re-analyze MOUs that already have AI analysis',
         )
+        parser.add_argument(
+            '--rerun-unchanged',
+            action='store_true',
+            help='With --force, also re-run MOUs whose PDF and analyzer version are unchanged',
+        )
+        parser.add_argument(
+            '--tier',
+            choices=list(ANALYSIS_TIERS),
+            help='Analysis tier: rules (no models), standard or deep (default: AI_ANALYSIS_TIER)',
+        )
+        parser.add_argument(
+            '--pipeline',
+            action='store_true',
+            help='Analyze in this process with overlapping read, extract, inference and write stages',
+        )
+        parser.add_argument(
+            '--extract-workers',
+            type=int,
+            help='With --pipeline, PDF extraction processes (default: AI_PIPELINE_EXTRACT_WORKERS)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='With --pipeline, print the stage report as JSON',
+        )
 
     def handle(self, *args, **options):
+        if options['pipeline']:
+            self.run_pipeline(options)
+            return
+        
         self.stdout.write(
             self.style.SUCCESS('Starting AI analysis for existing MOUs...')
         )
@@ -49,7 +87,8 @@ class Command(BaseCommand):
                 # Analyze specific MOU
                 try:
                     mou = MOU.objects.get(id=options['mou_id'])
-                    self.analyze_mou(mou, force=options['force'])
+                    self.analyze_mou(mou, force=options['force'], rerun_unchanged=options['rerun_unchanged'],
+                                     tier=options['tier'])
                 except MOU.DoesNotExist:
                     raise CommandError(f'MOU with ID {options["mou_id"]} does not exist')
                     
@@ -81,7 +120,8 @@ class Command(BaseCommand):
                 for i, mou in enumerate(queryset, 1):
                     self.stdout.write(f'Processing MOU {i}/{total_count}: {mou.title}')
                     
-                    if self.analyze_mou(mou, force=options['force']):
+                    if self.analyze_mou(mou, force=options['force'], rerun_unchanged=options['rerun_unchanged'],
+                                        tier=options['tier']):
                         success_count += 1
                     
                     # Add small delay to avoid overwhelming the system
@@ -102,7 +142,48 @@ class Command(BaseCommand):
         except Exception as e:
             raise CommandError(f'Error during analysis: {str(e)}')
 
-    def analyze_mou(self, mou, force=False):
+    def run_pipeline(self, options):
+        """Analyze the selected MOUs in-process with the staged pipeline"""
+        from mous.ai_pipeline import run_pipeline
+        
+        if options['mou_id']:
+            queryset = MOU.objects.filter(id=options['mou_id'])
+            if not queryset.exists():
+                raise CommandError(f'MOU with ID {options["mou_id"]} does not exist')
+        else:
+            queryset = MOU.objects.exclude(pdf_file='')
+            if not options['force']:
+                queryset = queryset.filter(ai_analysis__isnull=True)
+            if not options['all']:
+                queryset = queryset[:options['limit']]
+        
+        def progress(mou, message):
+            if not options['json']:
+                self.stdout.write(f'  MOU {mou.id} "{mou.title}": {message}')
+        
+        report = run_pipeline(
+            queryset.select_related('ai_analysis'),
+            tier=options['tier'],
+            force=options['rerun_unchanged'],
+            extract_workers=options['extract_workers'],
+            progress=progress,
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'\nAnalyzed {report["analyzed"]} MOUs ({report["skipped"]} skipped, {report["failed"]} failed) '
+            f'in {report["wall_seconds"]}s with the {report["analysis_tier"]} tier'
+        ))
+        self.stdout.write(f'  {"stage":<12}{"threads":>8}{"items":>8}{"busy s":>10}{"util":>8}{"queue avg":>11}{"max":>6}')
+        for name, stage in report['stages'].items():
+            self.stdout.write(
+                f'  {name:<12}{stage["threads"]:>8}{stage["items"]:>8}{stage["busy_seconds"]:>10}'
+                f'{stage["utilization"]:>8.0%}{stage["queue_depth_mean"]:>11}{stage["queue_depth_max"]:>6}'
+            )
+    
+    def analyze_mou(self, mou, force=False, rerun_unchanged=False, tier=None):
         """Analyze a single MOU"""
         try:
             # Check if already has analysis and force is not enabled
@@ -120,7 +201,7 @@ class Command(BaseCommand):
                 return False
             
             # Start the analysis task
-            result = analyze_mou_with_ai.delay(mou.id)
+            result = analyze_mou_with_ai.delay(mou.id, force=rerun_unchanged, tier=tier)
             
             self.stdout.write(
                 self.style.SUCCESS(f'  ✓ Started analysis for "{mou.title}" (Task ID: {result.id})')
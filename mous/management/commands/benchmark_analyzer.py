@@ -0,0 +1,170 @@
+"""
+Management command to benchmark ClauseAnalyzer on a synthetic MOU corpus
+Usage: python manage.py benchmark_analyzer [--modes rules,ai,cascade] [--documents <n>] [--output <file.json>] [--compare <file.json>]
+
+The corpus is generated deterministically from --seed, so results saved with
+--output on two commits measure the same documents and can be compared with
+--compare.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+
+
+class Command(BaseCommand):
+    help = 'Benchmark rule-based and AI clause analysis on a deterministic synthetic corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes',
+            default='rules,ai',
+            help='Comma-separated analyzer modes: rules, ai, cascade (default: rules,ai)',
+        )
+        parser.add_argument(
+            '--documents',
+            type=int,
+            default=50,
+            help='Number of synthetic documents (default: 50)',
+        )
+        parser.add_argument(
+            '--clauses',
+            default='15-40',
+            help='Clauses per document as min-max (default: 15-40)',
+        )
+        parser.add_argument(
+            '--clause-words',
+            default='30-120',
+            help='Words per generated clause as min-max (default: 30-120)',
+        )
+        parser.add_argument(
+            '--boilerplate-ratio',
+            type=float,
+            default=0.3,
+            help='Fraction of clauses that are verbatim boilerplate (default: 0.3)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Corpus random seed (default: 42)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Save the results to this JSON file',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier results JSON file to compare against',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the results as JSON',
+        )
+
+    def handle(self, *args, **options):
+        from mous import ai_benchmark
+        from mous.ai_services import ClauseAnalyzer
+
+        modes = [m.strip().lower() for m in options['modes'].split(',') if m.strip()]
+        unknown = [m for m in modes if m not in ('rules', 'ai', 'cascade')]
+        if unknown:
+            raise CommandError(f'Unknown modes: {", ".join(unknown)}')
+
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Could not read {options["compare"]}: {str(e)}')
+
+        config = {
+            'documents': options['documents'],
+            'clauses_per_document': self.parse_range(options['clauses'], '--clauses'),
+            'clause_words': self.parse_range(options['clause_words'], '--clause-words'),
+            'boilerplate_ratio': options['boilerplate_ratio'],
+            'seed': options['seed'],
+        }
+        corpus = ai_benchmark.generate_corpus(**config)
+        report = {
+            'environment': ai_benchmark.run_environment(),
+            'corpus': dict(config, **ai_benchmark.corpus_stats(corpus)),
+            'modes': {},
+        }
+        if not options['json']:
+            stats = report['corpus']
+            self.stdout.write(
+                f'Corpus: {stats["documents"]} documents, {stats["clauses"]} clauses '
+                f'({stats["boilerplate_clauses"]} boilerplate, avg {stats["avg_clause_words"]} words)'
+            )
+
+        for mode in modes:
+            # Cache off: measure the analyzer itself, not earlier runs' results
+            analyzer = ClauseAnalyzer(
+                use_cache=False, use_models=(mode != 'rules'), use_library=False, cascade=(mode == 'cascade'),
+                tier='standard'
+            )
+            # Model loading is not part of the measured analysis
+            analyzer.load_tier_models()
+            if mode != 'rules' and not analyzer.is_ready:
+                report['modes'][mode] = {'skipped': 'AI models not available'}
+                continue
+            report['modes'][mode] = ai_benchmark.benchmark_analyzer(analyzer, corpus)
+
+        if baseline is not None:
+            report['comparison'] = {
+                'baseline_commit': baseline.get('environment', {}).get('git_commit', ''),
+                'modes': ai_benchmark.compare_results(baseline, report),
+            }
+            if baseline.get('corpus', {}).get('clauses') != report['corpus']['clauses']:
+                report['comparison']['warning'] = 'Corpus differs from the baseline run'
+
+        if options['output']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['output'])), exist_ok=True)
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.print_report(report)
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f'\nResults saved to {options["output"]}'))
+
+    def parse_range(self, value, option):
+        """Parse 'min-max' (or a single number) into a tuple"""
+        try:
+            parts = [int(p) for p in value.split('-')]
+        except ValueError:
+            raise CommandError(f'{option} must be a number or min-max, got {value!r}')
+        low, high = (parts[0], parts[-1])
+        if len(parts) > 2 or low < 1 or high < low:
+            raise CommandError(f'{option} must be a number or min-max, got {value!r}')
+        return low, high
+
+    def print_report(self, report):
+        """Print a human-readable summary"""
+        for mode, result in report['modes'].items():
+            self.stdout.write(self.style.SUCCESS(f'\n{mode}'))
+            if 'skipped' in result:
+                self.stdout.write(self.style.WARNING(f'  skipped: {result["skipped"]}'))
+                continue
+            latency = result['latency_ms']
+            self.stdout.write(f'  Docs/sec:     {result["docs_per_second"]}')
+            self.stdout.write(f'  Clauses/sec:  {result["clauses_per_second"]}')
+            self.stdout.write(
+                f'  Latency (ms): p50 {latency["p50"]}, p95 {latency["p95"]}, p99 {latency["p99"]}'
+            )
+            self.stdout.write(f'  Peak RSS:     {result["peak_rss_mb"]} MB')
+
+        comparison = report.get('comparison')
+        if comparison:
+            self.stdout.write(self.style.SUCCESS(f'\nCompared with {comparison["baseline_commit"] or "baseline"}'))
+            if comparison.get('warning'):
+                self.stdout.write(self.style.WARNING(f'  {comparison["warning"]}'))
+            for mode, metrics in comparison['modes'].items():
+                for name, values in metrics.items():
+                    change = f'{values["change"]:+.1%}' if values['change'] is not None else 'n/a'
+                    self.stdout.write(f'  {mode:<6} {name:<20} {values["before"]} -> {values["after"]} ({change})')
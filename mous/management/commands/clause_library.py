@@ -0,0 +1,173 @@
+"""
+Management command to build and inspect the boilerplate clause library
+Usage: python manage.py clause_library [--seed [--min-occurrences <n>] [--min-agreement <f>] [--include-rules]]
+                                       [--import <file.json>] [--export <file.json>] [--clear] [--json]
+
+--seed creates library entries from analyzed clauses that recur across MOUs;
+--import/--export read and write entries as a JSON list of
+{text, type, risk_score, confidence, sentiment, risk_factors, suggestions}.
+Without an action the command reports the library size and how many clauses
+were labelled from it instead of running model inference.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from mous.ai_library import HAS_NUMPY, get_clause_library, library_hash, seed_library
+from mous.ai_models import ClauseAnalysis, ClauseLibraryEntry
+import json
+
+
+class Command(BaseCommand):
+    help = 'Seed, import, export or report the boilerplate clause library'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Create entries from clauses that recur across analyzed MOUs',
+        )
+        parser.add_argument(
+            '--min-occurrences',
+            type=int,
+            default=3,
+            help='MOUs a clause must appear in to be seeded (default: 3)',
+        )
+        parser.add_argument(
+            '--min-agreement',
+            type=float,
+            default=0.8,
+            help='Share of occurrences that must agree on the clause type (default: 0.8)',
+        )
+        parser.add_argument(
+            '--include-rules',
+            action='store_true',
+            help='Also seed from rule-based analyses (by default only AI-labelled clauses are used)',
+        )
+        parser.add_argument(
+            '--import',
+            dest='import_file',
+            help='Add or update entries from a JSON file',
+        )
+        parser.add_argument(
+            '--export',
+            dest='export_file',
+            help='Write the active entries to a JSON file',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete all library entries',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('The clause library needs numpy.')
+
+        report = {}
+        if options['clear']:
+            report['deleted'] = ClauseLibraryEntry.objects.all().delete()[0]
+        if options['import_file']:
+            report['imported'] = self.import_entries(options['import_file'])
+        if options['seed']:
+            report['seed'] = seed_library(
+                min_occurrences=options['min_occurrences'],
+                min_agreement=options['min_agreement'],
+                include_rules=options['include_rules'],
+            )
+        if options['export_file']:
+            report['exported'] = self.export_entries(options['export_file'])
+        report['library'] = self.library_stats()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if 'deleted' in report:
+            self.stdout.write(f'Deleted {report["deleted"]} entries')
+        if 'imported' in report:
+            self.stdout.write(f'Imported {report["imported"]} entries')
+        if 'seed' in report:
+            seed = report['seed']
+            self.stdout.write(self.style.SUCCESS(
+                f'Seeded from {seed["rows_scanned"]} clauses in {seed["clusters"]} near-duplicate clusters: '
+                f'{seed["created"]} created, {seed["merged"]} merged into existing entries, '
+                f'{seed["ambiguous"]} skipped (labels disagree)'
+            ))
+        if 'exported' in report:
+            self.stdout.write(f'Exported {report["exported"]} entries to {options["export_file"]}')
+
+        library = report['library']
+        self.stdout.write(self.style.SUCCESS('\nClause library'))
+        self.stdout.write(f'  Entries:            {library["entries"]} ({library["active"]} active)')
+        self.stdout.write(f'  Clauses labelled:   {library["hits"]} (model inference avoided)')
+        if library['analyzed_clauses']:
+            self.stdout.write(f'  Share of all analyzed clauses: {library["hit_share"]:.1%}')
+        for entry in library['top_entries']:
+            self.stdout.write(f'    {entry["hits"]:>7}  {entry["type"]:<22} {entry["text"]}')
+
+    def library_stats(self):
+        """Entry counts and library hits, overall and per entry"""
+        totals = ClauseLibraryEntry.objects.aggregate(entries=Count('id'), hits=Sum('hit_count'))
+        hits = totals['hits'] or 0
+        analyzed = ClauseAnalysis.objects.count()
+        top = ClauseLibraryEntry.objects.filter(hit_count__gt=0).order_by('-hit_count')[:10]
+        library = get_clause_library()
+        return {
+            'entries': totals['entries'],
+            'active': ClauseLibraryEntry.objects.filter(is_active=True).count(),
+            'hits': hits,
+            'analyzed_clauses': analyzed,
+            'hit_share': round(hits / analyzed, 4) if analyzed else 0.0,
+            'this_process': library.stats() if library else {},
+            'top_entries': [
+                {'id': entry.id, 'type': entry.clause_type, 'hits': entry.hit_count,
+                 'text': entry.canonical_text[:60]}
+                for entry in top
+            ],
+        }
+
+    def import_entries(self, path):
+        """Add or update entries from a JSON list; returns the number imported"""
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        valid_types = {choice for choice, _ in ClauseAnalysis.CLAUSE_TYPE_CHOICES}
+        with transaction.atomic():
+            for number, entry in enumerate(entries, start=1):
+                if not entry.get('text') or entry.get('type') not in valid_types:
+                    raise CommandError(f'Entry {number} needs "text" and a valid "type"')
+                ClauseLibraryEntry.objects.update_or_create(
+                    text_hash=library_hash(entry['text']),
+                    defaults={
+                        'canonical_text': entry['text'],
+                        'clause_type': entry['type'],
+                        'risk_score': entry.get('risk_score', 0),
+                        'confidence_score': entry.get('confidence', 1),
+                        'sentiment': entry.get('sentiment', 'neutral'),
+                        'risk_factors': entry.get('risk_factors', []),
+                        'suggestions': entry.get('suggestions', []),
+                        'is_active': entry.get('is_active', True),
+                    },
+                )
+        return len(entries)
+
+    def export_entries(self, path):
+        """Write the active entries as a JSON list; returns the number exported"""
+        entries = []
+        for entry in ClauseLibraryEntry.objects.filter(is_active=True):
+            data = entry.as_label_dict()
+            for field in ('id', 'text_hash'):
+                data.pop(field)
+            entries.append(data)
+        with open(path, 'w') as f:
+            json.dump(entries, f, indent=2)
+        return len(entries)
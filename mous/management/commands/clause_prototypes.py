@@ -0,0 +1,134 @@
+"""
+Management command to build and evaluate label prototypes for clause typing
+Usage: python manage.py clause_prototypes [--build] [--compare [--holdout <f>]] [--min-confidence <f>]
+                                          [--per-type <n>] [--no-seed] [--json]
+
+--build embeds labelled clauses (stored analyses, clause library entries and
+built-in seed clauses) with the sentence encoder and saves one prototype per
+clause type under AI_INDEX_DIR; set AI_CLAUSE_TYPING=prototype to type clauses
+by their nearest prototype. --compare holds out part of the labelled clauses
+and measures accuracy (agreement with the stored labels) and throughput of
+classifier typing against prototype typing. Without an action the command
+reports the saved prototypes.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from mous.ai_prototypes import (
+    HAS_NUMPY, build_prototypes, compare_typing, get_label_prototypes, labelled_examples, save_label_prototypes,
+)
+from mous.ai_services import ClauseAnalyzer
+import json
+
+
+class Command(BaseCommand):
+    help = 'Build, compare or report the label prototypes used for prototype clause typing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--build',
+            action='store_true',
+            help='Build and save prototypes from labelled clauses',
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Compare classifier and prototype typing on held-out labelled clauses',
+        )
+        parser.add_argument(
+            '--holdout',
+            type=float,
+            default=0.3,
+            help='Share of labelled clauses held out by --compare (default: 0.3)',
+        )
+        parser.add_argument(
+            '--min-confidence',
+            type=float,
+            default=0.7,
+            help='Confidence a stored clause needs to be used as an example (default: 0.7)',
+        )
+        parser.add_argument(
+            '--per-type',
+            type=int,
+            default=200,
+            help='Most recent stored clauses used per clause type (default: 200)',
+        )
+        parser.add_argument(
+            '--no-seed',
+            action='store_true',
+            help='Do not add the built-in seed clauses',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('Label prototypes need numpy.')
+        if not 0 < options['holdout'] < 1:
+            raise CommandError('--holdout must be between 0 and 1')
+
+        analyzer = ClauseAnalyzer(use_cache=False, use_library=False, tier='deep', clause_typing='model')
+        report = {}
+        if options['build'] or options['compare']:
+            if analyzer.similarity_model is None:
+                raise CommandError('The sentence encoder is not available; install the AI requirements.')
+            examples = labelled_examples(options['min_confidence'], options['per_type'])
+
+            if options['build']:
+                try:
+                    prototypes, build = build_prototypes(analyzer, examples, include_seed=not options['no_seed'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+                build['path'] = save_label_prototypes(prototypes)
+                report['build'] = build
+
+            if options['compare']:
+                if len(examples) < 10:
+                    raise CommandError(f'Only {len(examples)} labelled clauses; analyze more MOUs first.')
+                report['compare'] = compare_typing(
+                    examples, holdout=options['holdout'], include_seed=not options['no_seed']
+                )
+
+        prototypes = get_label_prototypes(analyzer.SIMILARITY_MODEL_NAME)
+        report['prototypes'] = prototypes.stats() if prototypes else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if 'build' in report:
+            build = report['build']
+            self.stdout.write(self.style.SUCCESS(
+                f'Built prototypes from {build["examples"]} clauses ({build["seed_examples"]} seed, '
+                f'{build["embeddings_reused"]} stored embeddings reused) in {build["seconds"]}s'
+            ))
+            self.stdout.write(f'  Saved to {build["path"]}')
+        if 'compare' in report:
+            self.print_comparison(report['compare'])
+
+        prototypes = report['prototypes']
+        if prototypes is None:
+            self.stdout.write(self.style.WARNING('\nNo prototypes built yet; run with --build.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'\nPrototypes {prototypes["version"]} ({prototypes["model_name"]})'))
+        self.stdout.write(f'  Created: {prototypes["created"]}')
+        for clause_type, count in prototypes['examples'].items():
+            self.stdout.write(f'    {clause_type:<24}{count:>6} examples')
+
+    def print_comparison(self, comparison):
+        self.stdout.write(self.style.SUCCESS(
+            f'\nTyping comparison: {comparison["test_clauses"]} held-out clauses, '
+            f'prototypes from {comparison["train_examples"]} examples'
+        ))
+        modes = comparison['modes']
+        self.stdout.write(f'  {"":<22}{"classifier":>12}{"prototype":>12}')
+        for label, key in (('Accuracy', 'accuracy'), ('Clauses/sec', 'clauses_per_second'), ('Seconds', 'seconds')):
+            self.stdout.write(f'  {label:<22}{modes["classifier"][key]:>12}{modes["prototype"][key]:>12}')
+        if comparison['speedup']:
+            self.stdout.write(f'  Prototype typing is {comparison["speedup"]}x the classifier throughput')
+        self.stdout.write('  Per-type accuracy:')
+        for clause_type, accuracy in modes['prototype']['per_type_accuracy'].items():
+            classifier = modes['classifier']['per_type_accuracy'][clause_type]
+            self.stdout.write(f'    {clause_type:<24}{classifier:>10}{accuracy:>12}')
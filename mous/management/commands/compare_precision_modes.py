@@ -0,0 +1,203 @@
+"""
+Management command to compare CPU inference precision modes
+Usage: python manage.py compare_precision_modes [--modes fp32,int8,bf16] [--corpus <dir>] [--limit <count>] [--json]
+
+Runs the same clauses through each precision mode and reports load cost,
+throughput, memory and agreement with fp32 (clause types, risk scores,
+confidences and extracted entities).
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from mous.models import MOU
+import gc
+import json
+import os
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput, memory and agreement of AI inference precision modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes',
+            default='fp32,int8,bf16',
+            help='Comma-separated precision modes to compare (default: fp32,int8,bf16)',
+        )
+        parser.add_argument(
+            '--corpus',
+            help='Directory of .txt/.pdf fixture documents (default: PDFs of existing MOUs)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Maximum number of documents to use (default: 20)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Clauses per forward pass (default: AI_INFERENCE_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        from mous import ai_services
+
+        if not ai_services.load_ai_libs():
+            raise CommandError('AI libraries not installed. Install with: pip install transformers torch sentence-transformers spacy')
+
+        modes = [m.strip().lower() for m in options['modes'].split(',') if m.strip()]
+        unknown = [m for m in modes if m not in ai_services.PRECISION_MODES]
+        if unknown:
+            raise CommandError(f'Unknown precision modes: {", ".join(unknown)}')
+        if 'fp32' in modes:
+            modes.remove('fp32')
+        modes.insert(0, 'fp32')  # Reference for agreement
+
+        documents = self.load_corpus(options['corpus'], options['limit'])
+        if not documents:
+            raise CommandError('No documents found for the comparison corpus.')
+
+        if not options['json']:
+            self.stdout.write(f'Corpus: {len(documents)} documents')
+
+        report = {'documents': len(documents), 'clauses': 0, 'modes': {}}
+        reference = None
+        for mode in modes:
+            result = self.run_mode(ai_services, mode, documents, options['batch_size'])
+            if result.get('skipped'):
+                report['modes'][mode] = result
+                continue
+            outputs = result.pop('outputs')
+            report['clauses'] = len(outputs['clauses'])
+            if reference is None:
+                reference = outputs
+            result['agreement'] = self.agreement(reference, outputs)
+            report['modes'][mode] = result
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+    def load_corpus(self, corpus_dir, limit):
+        """Return document texts from a fixture directory or from existing MOU PDFs"""
+        from mous.utils import extract_pdf_data
+
+        texts = []
+        if corpus_dir:
+            if not os.path.isdir(corpus_dir):
+                raise CommandError(f'Corpus directory {corpus_dir} does not exist')
+            for filename in sorted(os.listdir(corpus_dir)):
+                path = os.path.join(corpus_dir, filename)
+                if filename.lower().endswith('.txt'):
+                    with open(path, encoding='utf-8') as f:
+                        texts.append(f.read())
+                elif filename.lower().endswith('.pdf'):
+                    texts.append(extract_pdf_data(path, run_ai_analysis=False)['full_text'])
+                if len(texts) >= limit:
+                    break
+        else:
+            for mou in MOU.objects.exclude(pdf_file='')[:limit]:
+                try:
+                    texts.append(extract_pdf_data(mou.pdf_file.path, run_ai_analysis=False)['full_text'])
+                except Exception as e:
+                    self.stderr.write(f'  Skipping MOU {mou.id}: {str(e)}')
+        return [t for t in texts if t.strip()]
+
+    def run_mode(self, ai_services, mode, documents, batch_size):
+        """Load the models in ``mode`` and analyze the corpus"""
+        ai_services.clear_model_registry()
+        gc.collect()
+        rss_before = ai_services._current_rss_mb()
+
+        started = time.perf_counter()
+        analyzer = ai_services.ClauseAnalyzer(use_cache=False, precision=mode, tier='deep')
+        analyzer.load_tier_models()
+        load_seconds = time.perf_counter() - started
+        if not analyzer.is_ready:
+            return {'skipped': 'models failed to load'}
+        if analyzer.precision != mode:
+            return {'skipped': f'not supported on this machine (would run as {analyzer.precision})'}
+        rss_loaded = ai_services._current_rss_mb()
+
+        # Rule-based segmentation keeps the clause set identical across modes
+        clauses_per_doc = [analyzer._extract_clauses_fallback(text) for text in documents]
+
+        # Warm-up so one-off kernel initialisation is not timed
+        analyzer.analyze_clauses(clauses_per_doc[0][:2] or ['Warm-up clause.'], batch_size=batch_size)
+
+        outputs = {'clauses': [], 'entities': []}
+        clause_seconds = 0.0
+        entity_seconds = 0.0
+        doc_latencies = []
+        for text, clauses in zip(documents, clauses_per_doc):
+            started = time.perf_counter()
+            outputs['clauses'].extend(analyzer.analyze_clauses(clauses, batch_size=batch_size))
+            clause_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            outputs['entities'].append({(e['text'], e['label']) for e in analyzer._extract_entities(text)})
+            entity_elapsed = time.perf_counter() - started
+
+            clause_seconds += clause_elapsed
+            entity_seconds += entity_elapsed
+            doc_latencies.append(clause_elapsed + entity_elapsed)
+
+        total_clauses = sum(len(c) for c in clauses_per_doc)
+        return {
+            'load_seconds': round(load_seconds, 2),
+            'model_memory_mb': round(rss_loaded - rss_before, 1),
+            'peak_rss_mb': round(ai_services._current_rss_mb(), 1),
+            'clauses_per_second': round(total_clauses / clause_seconds, 2) if clause_seconds else None,
+            'entity_docs_per_second': round(len(documents) / entity_seconds, 2) if entity_seconds else None,
+            'docs_per_second': round(len(documents) / sum(doc_latencies), 3),
+            'p50_doc_seconds': round(statistics.median(doc_latencies), 3),
+            'outputs': outputs,
+        }
+
+    def agreement(self, reference, outputs):
+        """Agreement of a mode's outputs with the fp32 reference"""
+        ref_clauses, clauses = reference['clauses'], outputs['clauses']
+        count = len(ref_clauses) or 1
+        same_type = sum(1 for a, b in zip(ref_clauses, clauses) if a['type'] == b['type'])
+        same_risk = sum(1 for a, b in zip(ref_clauses, clauses) if a['risk_score'] == b['risk_score'])
+        confidence_diffs = [abs(a['confidence'] - b['confidence']) for a, b in zip(ref_clauses, clauses)]
+
+        entity_overlaps = []
+        for a, b in zip(reference['entities'], outputs['entities']):
+            union = a | b
+            entity_overlaps.append(len(a & b) / len(union) if union else 1.0)
+
+        return {
+            'clause_type': round(same_type / count, 4),
+            'risk_score': round(same_risk / count, 4),
+            'mean_confidence_diff': round(sum(confidence_diffs) / count, 4),
+            'max_confidence_diff': round(max(confidence_diffs, default=0.0), 4),
+            'entity_jaccard': round(sum(entity_overlaps) / (len(entity_overlaps) or 1), 4),
+        }
+
+    def print_report(self, report):
+        """Print a human-readable comparison"""
+        for mode, result in report['modes'].items():
+            self.stdout.write(self.style.SUCCESS(f'\n{mode}'))
+            if result.get('skipped'):
+                self.stdout.write(self.style.WARNING(f'  skipped: {result["skipped"]}'))
+                continue
+            self.stdout.write(f'  Load time:          {result["load_seconds"]}s')
+            self.stdout.write(f'  Model memory:       {result["model_memory_mb"]} MB (peak RSS {result["peak_rss_mb"]} MB)')
+            self.stdout.write(f'  Clauses/sec:        {result["clauses_per_second"]}')
+            self.stdout.write(f'  NER docs/sec:       {result["entity_docs_per_second"]}')
+            self.stdout.write(f'  Docs/sec:           {result["docs_per_second"]} (p50 {result["p50_doc_seconds"]}s)')
+            agreement = result['agreement']
+            self.stdout.write(
+                f'  Agreement vs fp32:  type {agreement["clause_type"]:.2%}, risk {agreement["risk_score"]:.2%}, '
+                f'entities {agreement["entity_jaccard"]:.2%}, '
+                f'confidence diff mean {agreement["mean_confidence_diff"]} / max {agreement["max_confidence_diff"]}'
+            )
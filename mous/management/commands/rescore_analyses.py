@@ -0,0 +1,78 @@
+"""
+Management command to re-apply the current rules and risk weights to stored analyses
+Usage: python manage.py rescore_analyses [--mou-id <id>] [--chunk-size <clauses>] [--force] [--dry-run] [--json]
+
+Clause texts are read from ClauseAnalysis in batches and re-labelled with the
+compiled rule engine; no PDF is extracted and no model runs. Analyses already
+scored with the current rule fingerprint are skipped unless --force is given.
+"""
+
+from django.core.management.base import BaseCommand
+from mous.ai_rescore import rescore_analyses
+import json
+
+
+class Command(BaseCommand):
+    help = 'Re-score stored clause analyses with the current rules and risk weights'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mou-id',
+            type=int,
+            action='append',
+            help='Only re-score this MOU (repeatable)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Clauses per batch (default: AI_RESCORE_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Also re-score analyses already scored with the current rules',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the totals as JSON',
+        )
+
+    def handle(self, *args, **options):
+        progress = None
+        if not options['json']:
+            progress = lambda totals: self.stdout.write(
+                f'  {totals["analyses"]} analyses, {totals["clauses"]} clauses ({totals["seconds"]}s)'
+            )
+
+        totals = rescore_analyses(
+            chunk_size=options['chunk_size'],
+            force=options['force'],
+            dry_run=options['dry_run'],
+            mou_ids=options['mou_id'],
+            progress=progress,
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(totals, indent=2))
+            return
+
+        prefix = 'Dry run: would re-score' if options['dry_run'] else 'Re-scored'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {totals["clauses"]} clauses in {totals["analyses"]} analyses '
+            f'in {totals["seconds"]}s ({totals["clauses_per_second"] or 0} clauses/sec)'
+        ))
+        self.stdout.write(f'  Clauses changed:          {totals["clauses_changed"]}')
+        self.stdout.write(f'  Document scores changed:  {totals["documents_changed"]}')
+        self.stdout.write(f'  Risk flags written:       {totals["risk_flags"]}')
+        self.stdout.write(f'  Rule fingerprint:         {totals["rule_fingerprint"]}')
+        if totals['skipped_unversioned']:
+            self.stdout.write(self.style.WARNING(
+                f'  Skipped {totals["skipped_unversioned"]} analyses without an analyzer version; '
+                're-analyze them with analyze_existing_mous --force'
+            ))
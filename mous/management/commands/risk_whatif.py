@@ -0,0 +1,133 @@
+"""
+Management command to preview and apply risk-weight and compliance-threshold changes
+Usage: python manage.py risk_whatif [--weight "<risk factor>=<weight>" ...] [--threshold <name>=<value> ...]
+                                    [--rebuild] [--confirm] [--json]
+
+The preview re-scores every stored analysis from a cached clause x risk-factor
+matrix (no clause text is read) and shows how overall risk scores and
+compliance statuses would shift. --confirm writes the new scores with the bulk
+re-scoring engine. Threshold names: high_risk_clause, non_compliant_clauses,
+non_compliant_score, review_score.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from mous.ai_rules import COMPLIANCE_THRESHOLDS
+from mous.ai_whatif import HAS_NUMPY, apply_simulation, get_risk_matrix, simulate
+import json
+import time
+
+
+class Command(BaseCommand):
+    help = 'Preview how new risk weights and compliance thresholds would change the portfolio'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weight',
+            action='append',
+            default=[],
+            help='Risk factor weight, e.g. "Unlimited liability=4" (repeatable)',
+        )
+        parser.add_argument(
+            '--threshold',
+            action='append',
+            default=[],
+            help='Compliance threshold, e.g. review_score=5.5 (repeatable)',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the risk factor matrix even if the stored analyses are unchanged',
+        )
+        parser.add_argument(
+            '--confirm',
+            action='store_true',
+            help='Persist the new scores for all analyses',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the preview as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('The what-if simulation needs numpy.')
+
+        weights = self.parse_pairs(options['weight'], '--weight')
+        thresholds = self.parse_pairs(options['threshold'], '--threshold')
+        unknown = [name for name in thresholds if name not in COMPLIANCE_THRESHOLDS]
+        if unknown:
+            raise CommandError(f'Unknown thresholds: {", ".join(unknown)}')
+
+        started = time.perf_counter()
+        matrix = get_risk_matrix(rebuild=options['rebuild'])
+        load_seconds = round(time.perf_counter() - started, 3)
+        unseen = [name for name in weights if name not in matrix.factors]
+        if unseen and not options['json']:
+            self.stdout.write(self.style.WARNING(f'No stored clause has these risk factors: {", ".join(unseen)}'))
+
+        result = simulate(weights, thresholds, matrix=matrix)
+        result['matrix_seconds'] = load_seconds
+        if options['confirm']:
+            result['applied'] = apply_simulation(weights, thresholds)
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+        self.print_report(result)
+        if options['confirm']:
+            applied = result['applied']
+            self.stdout.write(self.style.SUCCESS(
+                f'\nApplied: re-scored {applied["clauses"]} clauses in {applied["analyses"]} analyses '
+                f'in {applied["seconds"]}s'
+            ))
+            self.stdout.write('Set these so new analyses use the same values:')
+            self.stdout.write(f"  AI_RISK_WEIGHTS='{json.dumps(result['risk_weights'])}'")
+            self.stdout.write(f"  AI_COMPLIANCE_THRESHOLDS='{json.dumps(result['thresholds'])}'")
+        else:
+            self.stdout.write('\nRun again with --confirm to persist these scores.')
+
+    def parse_pairs(self, values, option):
+        """Parse NAME=NUMBER arguments"""
+        pairs = {}
+        for value in values:
+            name, sep, number = value.rpartition('=')
+            try:
+                pairs[name.strip()] = float(number)
+            except ValueError:
+                sep = ''
+            if not sep or not name.strip():
+                raise CommandError(f'{option} expects NAME=NUMBER, got "{value}"')
+        return pairs
+
+    def print_report(self, result):
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["documents"]} documents, {result["clauses"]} clauses '
+            f'(matrix {result["matrix_seconds"]}s, simulation {result["seconds"]}s)'
+        ))
+        if result['fallback_clauses']:
+            self.stdout.write(
+                f'  {result["fallback_clauses"]} clauses scored by the rule-based fallback weigh every risk '
+                f'factor equally; only thresholds affect them'
+            )
+
+        before, after = result['before'], result['after']
+        self.stdout.write(f'\n  {"":<22}{"current":>10}{"simulated":>12}')
+        self.stdout.write(f'  {"Mean risk score":<22}{before["mean_risk_score"]:>10}{after["mean_risk_score"]:>12}')
+        for level in before['risk_levels']:
+            self.stdout.write(f'  {level + " risk":<22}{before["risk_levels"][level]:>10}{after["risk_levels"][level]:>12}')
+        for status in before['compliance']:
+            self.stdout.write(f'  {status:<22}{before["compliance"][status]:>10}{after["compliance"][status]:>12}')
+
+        self.stdout.write('\n  Risk score histogram (0-1 ... 9-10):')
+        self.stdout.write(f'    current:   {before["risk_histogram"]}')
+        self.stdout.write(f'    simulated: {after["risk_histogram"]}')
+
+        moves = [
+            f'{source} -> {target}: {count}'
+            for source, targets in result['transitions'].items()
+            for target, count in targets.items() if source != target
+        ]
+        self.stdout.write(f'\n  Documents changed: {result["documents_changed"]}')
+        for move in moves:
+            self.stdout.write(f'    {move}')
@@ -0,0 +1,81 @@
+"""
+Management command to run the local AI inference server
+Usage: python manage.py run_inference_server [--socket <path>] [--max-batch-size <n>] [--max-wait-ms <ms>]
+                                             [--tier rules|standard|deep]
+       python manage.py run_inference_server --stats
+
+Celery workers with AI_INFERENCE_SERVER_SOCKET set send clause batches to
+this process instead of loading the models themselves.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from mous.ai_services import ANALYSIS_TIERS, resolve_analysis_tier
+import json
+
+
+class Command(BaseCommand):
+    help = 'Run the micro-batching AI inference server on a Unix socket'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            help='Unix socket path (default: AI_INFERENCE_SERVER_SOCKET)',
+        )
+        parser.add_argument(
+            '--max-batch-size',
+            type=int,
+            help='Clauses per micro-batch (default: AI_INFERENCE_SERVER_MAX_BATCH)',
+        )
+        parser.add_argument(
+            '--max-wait-ms',
+            type=float,
+            help='Longest a request waits for its batch to fill (default: AI_INFERENCE_SERVER_MAX_WAIT_MS)',
+        )
+        parser.add_argument(
+            '--tier',
+            choices=list(ANALYSIS_TIERS),
+            help='Analysis tier whose models are loaded at start-up (default: AI_ANALYSIS_TIER); '
+                 'models of other tiers load on the first request that needs them',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print queue depth, batch sizes and latency of the running server and exit',
+        )
+
+    def handle(self, *args, **options):
+        from mous.ai_server import InferenceClient, InferenceServer, InferenceServerError
+
+        socket_path = options['socket'] or getattr(settings, 'AI_INFERENCE_SERVER_SOCKET', '')
+        if not socket_path:
+            raise CommandError('No socket path: pass --socket or set AI_INFERENCE_SERVER_SOCKET.')
+
+        if options['stats']:
+            try:
+                self.stdout.write(json.dumps(InferenceClient(socket_path, timeout=10).stats(), indent=2))
+            except InferenceServerError as e:
+                raise CommandError(str(e))
+            return
+
+        server = InferenceServer(
+            socket_path,
+            max_batch_size=options['max_batch_size'] or getattr(settings, 'AI_INFERENCE_SERVER_MAX_BATCH', 64),
+            max_wait_ms=(
+                options['max_wait_ms'] if options['max_wait_ms'] is not None
+                else getattr(settings, 'AI_INFERENCE_SERVER_MAX_WAIT_MS', 10)
+            ),
+        )
+        loaded = server.analyzer.load_tier_models(resolve_analysis_tier(options['tier']))
+        if not server.analyzer.is_ready:
+            self.stdout.write(self.style.WARNING('AI models not available: serving rule-based analysis only.'))
+        else:
+            self.stdout.write(f'Loaded models: {", ".join(loaded) or "none"}')
+
+        self.stdout.write(self.style.SUCCESS(f'Inference server listening on {socket_path} (Ctrl+C to stop)'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Shutting down inference server...')
+        except RuntimeError as e:
+            raise CommandError(str(e))
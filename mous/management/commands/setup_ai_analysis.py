@@ -1,10 +1,12 @@
 """
 Management command to set up and test AI features
-Usage: python manage.py setup_ai_analysis
+Usage: python manage.py setup_ai_analysis [--install-deps] [--download-models] [--test-analysis [--mou-id <id>]]
+                                          [--tier rules|standard|deep]
 """
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from mous.ai_services import ANALYSIS_TIERS
 from mous.models import MOU
 from mous.utils import create_ai_analysis_from_data
 import sys
@@ -37,8 +39,16 @@ class Command(BaseCommand):
             action='store_true',
             help='Download required AI models'
         )
+        
+        parser.add_argument(
+            '--tier',
+            choices=list(ANALYSIS_TIERS),
+            help='Analysis tier to load and test (default: AI_ANALYSIS_TIER)'
+        )
     
     def handle(self, *args, **options):
+        self.tier = options['tier']
+        
         if options['install_deps']:
             self.install_dependencies()
         
@@ -62,6 +72,7 @@ class Command(BaseCommand):
         self.stdout.write("  --download-models  Download required AI models")
         self.stdout.write("  --test-analysis    Test AI analysis on existing MOUs")
         self.stdout.write("  --mou-id <id>      Test specific MOU by ID")
+        self.stdout.write("  --tier <name>      Analysis tier: rules, standard or deep")
         self.stdout.write("\nExamples:")
         self.stdout.write("  python manage.py setup_ai_analysis --install-deps")
         self.stdout.write("  python manage.py setup_ai_analysis --test-analysis")
@@ -123,9 +134,12 @@ class Command(BaseCommand):
             self.stdout.write("Testing AI model loading...")
             try:
                 from mous.ai_services import ClauseAnalyzer
-                analyzer = ClauseAnalyzer()
+                analyzer = ClauseAnalyzer(tier=self.tier)
+                loaded = analyzer.load_tier_models()
                 if analyzer.is_ready:
-                    self.stdout.write(self.style.SUCCESS("✓ AI models loaded successfully"))
+                    self.stdout.write(self.style.SUCCESS(
+                        f"✓ AI models loaded successfully ({analyzer.tier} tier: {', '.join(loaded)})"
+                    ))
                 else:
                     self.stdout.write(self.style.WARNING("⚠ AI models loaded with fallback mode"))
             except Exception as e:
@@ -162,14 +176,14 @@ class Command(BaseCommand):
                     self.stdout.write(f"\nAnalyzing MOU: {mou.title}")
                     
                     # Extract PDF data
-                    pdf_data = extract_pdf_data(mou.pdf_file.path)
+                    pdf_data = extract_pdf_data(mou.pdf_file.path, run_ai_analysis=False)
                     
                     if not pdf_data.get('full_text'):
                         self.stdout.write(self.style.WARNING(f"  ⚠ No text extracted from PDF"))
                         continue
                     
                     # Perform AI analysis
-                    ai_result = analyze_mou_document(pdf_data['full_text'], mou.title)
+                    ai_result = analyze_mou_document(pdf_data['full_text'], mou.title, tier=self.tier)
                     
                     # Create AI analysis record
                     ai_analysis = create_ai_analysis_from_data(mou, ai_result)
@@ -204,7 +218,7 @@ class Command(BaseCommand):
                 return
             
             # Extract PDF data
-            pdf_data = extract_pdf_data(mou.pdf_file.path)
+            pdf_data = extract_pdf_data(mou.pdf_file.path, run_ai_analysis=False)
             
             if not pdf_data.get('full_text'):
                 self.stdout.write(self.style.ERROR("Could not extract text from PDF"))
@@ -213,7 +227,7 @@ class Command(BaseCommand):
             self.stdout.write(f"Extracted {len(pdf_data['full_text'])} characters from PDF")
             
             # Perform AI analysis
-            ai_result = analyze_mou_document(pdf_data['full_text'], mou.title)
+            ai_result = analyze_mou_document(pdf_data['full_text'], mou.title, tier=self.tier)
             
             # Display results
             self.stdout.write("\n=== AI Analysis Results ===")
@@ -0,0 +1,183 @@
+"""
+Management command to measure startup cost of the web, worker and beat processes
+Usage: python manage.py startup_benchmark [--entry web,worker,beat] [--repeat <n>] [--top <n>] [--with-models] [--json]
+
+Each entry point is started in a fresh interpreter, so the numbers include
+every import it triggers. Reports wall-clock startup time, resident memory,
+which heavy libraries (torch, transformers, spaCy, pdfplumber, ...) got
+imported and the slowest top-level imports (python -X importtime).
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('torch', 'transformers', 'sentence_transformers', 'spacy', 'pdfplumber', 'numpy')
+
+# Code run in the child interpreter for each entry point; ``started`` is set
+# before it runs and the child reports after it finishes.
+ENTRY_POINTS = {
+    # gunicorn: WSGI application plus URLconf (imports every view module)
+    'web': (
+        "from django.core.wsgi import get_wsgi_application\n"
+        "application = get_wsgi_application()\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+    # celery worker: app, Django and task modules
+    'worker': (
+        "from mou_management.celery import app\n"
+        "import django\n"
+        "django.setup()\n"
+        "app.loader.import_default_modules()\n"
+        "{preload}"
+    ),
+    # celery beat: app, Django and task modules (beat only needs the schedule)
+    'beat': (
+        "from mou_management.celery import app\n"
+        "import django\n"
+        "django.setup()\n"
+        "app.loader.import_default_modules()\n"
+        "app.conf.beat_schedule\n"
+    ),
+}
+
+WORKER_PRELOAD = (
+    "from mous.ai_services import preload_models_for_fork\n"
+    "preload_models_for_fork()\n"
+)
+
+CHILD_TEMPLATE = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', {settings_module!r})
+{code}
+elapsed = time.perf_counter() - started
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print('STARTUP_RESULT ' + json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': rss_kb / 1024,
+    'modules': len(sys.modules),
+    'heavy_modules': [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and memory of the web, worker and beat entry points'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entry',
+            default='web,worker,beat',
+            help='Comma-separated entry points to measure (default: web,worker,beat)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per entry point; the median is reported (default: 3)',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of slowest top-level imports to list (default: 10, 0 to skip)',
+        )
+        parser.add_argument(
+            '--with-models',
+            action='store_true',
+            help='Include loading the AI models before fork in the worker measurement',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists('/proc/self/status'):
+            raise CommandError('This benchmark needs /proc (Linux) to read process memory.')
+
+        entries = [e.strip() for e in options['entry'].split(',') if e.strip()]
+        unknown = [e for e in entries if e not in ENTRY_POINTS]
+        if unknown:
+            raise CommandError(f'Unknown entry points: {", ".join(unknown)}')
+
+        report = {}
+        for entry in entries:
+            code = ENTRY_POINTS[entry].format(preload=WORKER_PRELOAD if options['with_models'] else '')
+            runs = [self.run_child(code, importtime=(i == 0 and options['top'] > 0))
+                    for i in range(max(options['repeat'], 1))]
+            report[entry] = {
+                'seconds': round(statistics.median(r['seconds'] for r in runs), 3),
+                'seconds_min': round(min(r['seconds'] for r in runs), 3),
+                'rss_mb': round(statistics.median(r['rss_mb'] for r in runs), 1),
+                'modules': runs[0]['modules'],
+                'heavy_modules': runs[0]['heavy_modules'],
+                'slowest_imports': runs[0].get('imports', [])[:options['top']],
+            }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for entry, result in report.items():
+            self.stdout.write(self.style.SUCCESS(f'\n{entry}'))
+            self.stdout.write(f'  Startup:        {result["seconds"]}s (min {result["seconds_min"]}s)')
+            self.stdout.write(f'  RSS:            {result["rss_mb"]} MB')
+            self.stdout.write(f'  Modules loaded: {result["modules"]}')
+            heavy = ', '.join(result['heavy_modules']) or 'none'
+            style = self.style.WARNING if result['heavy_modules'] else str
+            self.stdout.write(style(f'  Heavy imports:  {heavy}'))
+            if result['slowest_imports']:
+                self.stdout.write('  Slowest imports (cumulative):')
+                for item in result['slowest_imports']:
+                    self.stdout.write(f'    {item["seconds"]:>7.3f}s  {item["module"]}')
+
+    def run_child(self, code, importtime=False):
+        """Run ``code`` in a fresh interpreter and return its measurements"""
+        script = CHILD_TEMPLATE.format(
+            settings_module=os.environ.get('DJANGO_SETTINGS_MODULE', 'mou_management.settings'),
+            code=code,
+            heavy=HEAVY_MODULES,
+        )
+        command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', script]
+        completed = subprocess.run(
+            command, cwd=str(settings.BASE_DIR), capture_output=True, text=True, timeout=600
+        )
+        for line in completed.stdout.splitlines():
+            if line.startswith('STARTUP_RESULT '):
+                result = json.loads(line[len('STARTUP_RESULT '):])
+                break
+        else:
+            raise CommandError(f'Entry point failed to start:\n{completed.stderr[-2000:]}')
+
+        if importtime:
+            result['imports'] = self.parse_importtime(completed.stderr)
+        return result
+
+    def parse_importtime(self, stderr):
+        """Top-level imports from -X importtime output, slowest first"""
+        imports = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            try:
+                _, cumulative, name = line[len('import time:'):].split('|')
+                cumulative_us = int(cumulative)
+            except ValueError:
+                continue
+            # Nested imports are indented under the module that triggered them
+            if name.startswith(' ') and not name.startswith('  '):
+                imports.append({'module': name.strip(), 'seconds': round(cumulative_us / 1e6, 3)})
+        imports.sort(key=lambda item: item['seconds'], reverse=True)
+        return imports
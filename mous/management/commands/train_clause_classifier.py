@@ -0,0 +1,133 @@
+"""
+Management command to train the TF-IDF linear clause classifier of the cascade
+Usage: python manage.py train_clause_classifier [--min-confidence <f>] [--per-type <n>] [--test-share <f>]
+                                                [--regularization <C>] [--list] [--activate <version>] [--json]
+
+Trains a TF-IDF + logistic regression model on the clause types of stored
+analyses (and clause library entries), reports its held-out accuracy and
+per-clause latency, and saves it as a new version under AI_INDEX_DIR/linear
+that cascading analyzers (AI_CASCADE_ENABLED) use between the keyword rules
+and the transformer. --activate switches back to an earlier version;
+--list shows the saved versions without training.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from mous.ai_linear import (
+    HAS_SKLEARN, activate_version, classifier_directory, get_linear_classifier, saved_versions,
+    train_linear_classifier,
+)
+from mous.ai_prototypes import labelled_examples
+import json
+
+
+class Command(BaseCommand):
+    help = 'Train, list or activate versions of the TF-IDF linear clause classifier'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-confidence',
+            type=float,
+            default=0.7,
+            help='Confidence a stored clause needs to be used for training (default: 0.7)',
+        )
+        parser.add_argument(
+            '--per-type',
+            type=int,
+            default=5000,
+            help='Most recent stored clauses used per clause type (default: 5000)',
+        )
+        parser.add_argument(
+            '--test-share',
+            type=float,
+            default=0.2,
+            help='Share of clauses held out to evaluate the model (default: 0.2)',
+        )
+        parser.add_argument(
+            '--regularization',
+            type=float,
+            default=4.0,
+            help='Inverse regularization strength C of the logistic regression (default: 4.0)',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the saved versions instead of training',
+        )
+        parser.add_argument(
+            '--activate',
+            metavar='VERSION',
+            help='Make a saved version current instead of training',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if not HAS_SKLEARN:
+            raise CommandError('The clause classifier needs scikit-learn (see requirements_ai.txt).')
+        if not 0 <= options['test_share'] < 1:
+            raise CommandError('--test-share must be at least 0 and below 1')
+
+        report = {}
+        if options['activate']:
+            try:
+                activate_version(options['activate'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            report['activated'] = options['activate']
+        elif not options['list']:
+            examples = labelled_examples(options['min_confidence'], options['per_type'])
+            try:
+                classifier, training = train_linear_classifier(
+                    examples, test_share=options['test_share'], regularization=options['regularization']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            training['version'] = classifier.version
+            training['path'] = classifier.save(classifier_directory())
+            report['training'] = training
+
+        current = get_linear_classifier()
+        report['current'] = current.version if current else None
+        report['versions'] = saved_versions()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        if 'training' in report:
+            self.print_training(report['training'])
+        if 'activated' in report:
+            self.stdout.write(self.style.SUCCESS(f'Activated clause classifier {report["activated"]}'))
+
+        self.stdout.write(self.style.SUCCESS('\nSaved versions'))
+        if not report['versions']:
+            self.stdout.write('  None; run without --list to train one.')
+        for meta in report['versions']:
+            marker = '*' if meta['version'] == report['current'] else ' '
+            accuracy = meta.get('holdout_accuracy')
+            self.stdout.write(
+                f'  {marker} {meta["version"]}  {meta["trained_at"]}  {sum(meta["examples"].values()):>7} clauses  '
+                f'{len(meta["examples"]):>2} types  accuracy {accuracy if accuracy is not None else "n/a"}'
+            )
+
+    def print_training(self, training):
+        self.stdout.write(self.style.SUCCESS(
+            f'Trained clause classifier {training["version"]} on {training["examples"]} clauses '
+            f'in {training["train_seconds"]}s'
+        ))
+        if training['skipped_types']:
+            self.stdout.write(self.style.WARNING(
+                f'  Too few examples, not learned: {", ".join(training["skipped_types"])}'
+            ))
+        holdout = training.get('holdout')
+        if holdout:
+            self.stdout.write(
+                f'  Held-out accuracy: {holdout["accuracy"]:.1%} on {holdout["clauses"]} clauses, '
+                f'{holdout["ms_per_clause"]} ms per clause'
+            )
+            for clause_type, accuracy in holdout['per_type_accuracy'].items():
+                self.stdout.write(f'    {clause_type:<24}{accuracy:>8.1%}')
+        self.stdout.write(f'  Saved to {training["path"]}')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0002_aianalysis_clauseanalysis_riskflag_aimodelmetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClauseResultCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of the analyzer version and normalized clause text', max_length=64, unique=True)),
+                ('model_version', models.CharField(db_index=True, max_length=100)),
+                ('result', models.JSONField(default=dict)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Clause Result Cache Entry',
+                'verbose_name_plural': 'Clause Result Cache',
+            },
+        ),
+    ]
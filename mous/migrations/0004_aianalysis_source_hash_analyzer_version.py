@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0003_clauseresultcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='source_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the analyzed PDF file', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='analyzer_version',
+            field=models.CharField(blank=True, help_text='Analyzer, model and rule-set version that produced the results', max_length=100),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0004_aianalysis_source_hash_analyzer_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='clauseanalysis',
+            options={'ordering': ['sequence', 'clause_number', 'start_position'], 'verbose_name': 'Clause Analysis', 'verbose_name_plural': 'Clause Analyses'},
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='clauses_done',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='clauses_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='aianalysis',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Percent of clauses analyzed'),
+        ),
+        migrations.AlterField(
+            model_name='aianalysis',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending Analysis'), ('in_progress', 'Analysis In Progress'), ('completed', 'Analysis Completed'), ('failed', 'Analysis Failed'), ('outdated', 'Outdated - Needs Reanalysis')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='clauseanalysis',
+            name='sequence',
+            field=models.PositiveIntegerField(default=0, help_text='Index of the clause in the analyzed document'),
+        ),
+        migrations.AddIndex(
+            model_name='clauseanalysis',
+            index=models.Index(fields=['ai_analysis', 'sequence'], name='mous_clause_ai_anal_f3edc3_idx'),
+        ),
+    ]
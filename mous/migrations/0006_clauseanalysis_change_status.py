@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0005_streaming_analysis_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clauseanalysis',
+            name='change_status',
+            field=models.CharField(blank=True, choices=[('unchanged', 'Unchanged'), ('modified', 'Modified'), ('added', 'Added')], help_text='Change since the previously analyzed PDF version (blank after a full analysis)', max_length=20),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0006_clauseanalysis_change_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClauseLibraryEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('canonical_text', models.TextField()),
+                ('text_hash', models.CharField(help_text='SHA-256 of the library-normalized clause text', max_length=64, unique=True)),
+                ('clause_type', models.CharField(choices=[('termination', 'Termination'), ('payment', 'Payment & Financial'), ('liability', 'Liability & Indemnification'), ('confidentiality', 'Confidentiality & NDA'), ('intellectual_property', 'Intellectual Property'), ('dispute_resolution', 'Dispute Resolution'), ('governing_law', 'Governing Law'), ('force_majeure', 'Force Majeure'), ('performance', 'Performance Requirements'), ('warranties', 'Warranties & Representations'), ('general', 'General Provisions'), ('unknown', 'Unknown/Other')], default='unknown', max_length=50)),
+                ('risk_score', models.DecimalField(decimal_places=2, default=0, max_digits=4)),
+                ('confidence_score', models.DecimalField(decimal_places=4, default=0, max_digits=5)),
+                ('sentiment', models.CharField(choices=[('positive', 'Positive'), ('neutral', 'Neutral'), ('negative', 'Negative'), ('unknown', 'Unknown')], default='neutral', max_length=20)),
+                ('risk_factors', models.JSONField(default=list)),
+                ('suggestions', models.JSONField(default=list)),
+                ('occurrences', models.IntegerField(default=0, help_text='Number of MOUs the clause was seen in when seeded')),
+                ('hit_count', models.IntegerField(default=0, help_text='Clauses labelled from this entry instead of model inference')),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Clause Library Entry',
+                'verbose_name_plural': 'Clause Library',
+                'ordering': ['-occurrences'],
+            },
+        ),
+    ]
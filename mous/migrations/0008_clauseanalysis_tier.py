@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0007_clause_library'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clauseanalysis',
+            name='tier',
+            field=models.CharField(blank=True, choices=[('rules', 'Rules'), ('model', 'Model'), ('library', 'Clause Library')], help_text='Analysis tier that decided the clause labels', max_length=20),
+        ),
+    ]
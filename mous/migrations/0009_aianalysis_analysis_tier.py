@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0008_clauseanalysis_tier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='analysis_tier',
+            field=models.CharField(blank=True, choices=[('rules', 'Rules only'), ('standard', 'Standard'), ('deep', 'Deep')], help_text='Analysis tier that produced the results (blank for analyses made before tiers)', max_length=10),
+        ),
+    ]
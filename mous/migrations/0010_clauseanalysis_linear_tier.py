@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0009_aianalysis_analysis_tier'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clauseanalysis',
+            name='tier',
+            field=models.CharField(blank=True, choices=[('rules', 'Rules'), ('linear', 'Linear Classifier'), ('model', 'Model'), ('library', 'Clause Library')], help_text='Analysis tier that decided the clause labels', max_length=20),
+        ),
+    ]
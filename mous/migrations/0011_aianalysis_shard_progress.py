@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0010_clauseanalysis_linear_tier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='shard_progress',
+            field=models.JSONField(blank=True, default=dict, help_text='Clauses and progress of each finished shard of a sharded analysis, by shard index'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0012_clauseanalysis_fallback_tier'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partnersubmission',
+            name='ai_analysis_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
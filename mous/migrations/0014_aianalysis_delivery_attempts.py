@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mous', '0013_partnersubmission_ai_analysis_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aianalysis',
+            name='delivery_attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Deliveries of the running analysis task that have not finished (reset when a run ends)'),
+        ),
+    ]
@@ -128,6 +128,7 @@ class PartnerSubmission(models.Model):
     notes = models.TextField(blank=True, null=True)
     submitted_at = models.DateTimeField(auto_now_add=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
+    ai_analysis_data = models.JSONField(blank=True, null=True)  # AI review of updated_pdf, kept apart from the MOU's analysis
     
     class Meta:
         ordering = ['-submitted_at']
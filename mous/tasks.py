@@ -5,12 +5,16 @@ from django.utils import timezone
 from django.conf import settings
 from datetime import timedelta, datetime
 from .models import MOU, ActivityLog
-from .utils import generate_mou_summary, create_ai_analysis_from_data
+from .utils import (
+    generate_mou_summary, create_ai_analysis_from_data, stream_ai_analysis, incremental_ai_analysis,
+    compute_file_hash
+)
 import logging
 
 # Import AI services if available
 try:
-    from .ai_services import analyze_mou_document
+    from .ai_services import analyze_mou_document, get_analyzer
+    from .ai_shard import merge_shard_results, should_shard
     HAS_AI_SERVICES = True
 except ImportError:
     HAS_AI_SERVICES = False
@@ -228,13 +232,33 @@ def cleanup_expired_share_links():
         return error_msg
 
 
-@shared_task
-def analyze_mou_with_ai(mou_id):
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def analyze_mou_with_ai(mou_id, force=False, tier=None):
     """
     Celery task to perform AI analysis on an MOU document
     
+    Skips the analysis when the stored results were produced from the same
+    PDF content and analyzer version, unless ``force`` is set. When a new PDF
+    version arrives and AI_INCREMENTAL_REANALYSIS is on, only clauses added or
+    changed since the analyzed version go through inference. With
+    AI_STREAMING_ANALYSIS, clause results are saved in chunks as they are
+    analyzed; the message is acknowledged only after the task finishes, so a
+    run killed with its worker is redelivered and resumes from the last saved
+    clause. Deliveries are counted on the AIAnalysis, and a document whose
+    run has been lost AI_ANALYSIS_MAX_DELIVERIES times is marked failed
+    instead of crashing workers forever. Documents of at least AI_SHARD_MIN_CHARS characters are split
+    into clause-aligned shards analyzed in parallel (see
+    dispatch_sharded_analysis); the AIAnalysis is completed by the merge task.
+    
+    ``tier`` selects the analysis tier (rules, standard or deep; defaults to
+    AI_ANALYSIS_TIER): only its models are loaded, and similar clauses are
+    only linked by tiers with the sentence encoder. An analysis by a deeper
+    tier counts as current for a shallower one.
+    
     Args:
         mou_id: ID of the MOU to analyze
+        force: Re-run in full even if the PDF and analyzer version are unchanged
+        tier: Analysis tier name
         
     Returns:
         String indicating success or failure
@@ -250,43 +274,60 @@ def analyze_mou_with_ai(mou_id):
         mou = MOU.objects.get(id=mou_id)
         
         # Check if PDF file exists and is readable
-        if not mou.pdf_file:
+        pdf_file = mou.pdf_file
+        if not pdf_file:
             return f"No PDF file found for MOU {mou_id}"
         
+        # Stop redelivering a document that keeps taking down its worker
+        if not _record_delivery_attempt(mou):
+            return f"AI analysis of MOU {mou_id} failed after repeated worker losses"
+        
+        # Skip if the PDF and analyzer are unchanged since the last analysis
+        source_hash = compute_file_hash(pdf_file.path)
+        analyzer = get_analyzer(tier)
+        analyzer_version = analyzer.version_key
+        if not force:
+            from .ai_models import AIAnalysis
+            existing = AIAnalysis.objects.filter(mou_id=mou_id).first()
+            if existing and existing.is_current(source_hash, analyzer_version, analyzer.effective_tier):
+                logger.info(f"AI analysis for MOU {mou_id} is up to date, skipping")
+                return f"AI analysis for MOU {mou_id} is up to date"
+        
         # Extract text from PDF
         from .utils import extract_pdf_data
-        pdf_data = extract_pdf_data(mou.pdf_file.path)
+        pdf_data = extract_pdf_data(pdf_file.path, run_ai_analysis=False)
         
         if not pdf_data.get('full_text'):
             return f"Could not extract text from PDF for MOU {mou_id}"
         
-        # Perform AI analysis
-        ai_result = analyze_mou_document(pdf_data['full_text'], mou.title)
-        
-        # Calculate processing time
-        processing_time = time() - start_time
-        ai_result['processing_time'] = processing_time
-        
-        # Create AI analysis record
-        ai_analysis = create_ai_analysis_from_data(mou, ai_result)
-        
-        if ai_analysis:
-            ai_analysis.processing_time_seconds = processing_time
-            ai_analysis.save()
-            
-            # Log activity
-            ActivityLog.objects.create(
-                mou=mou,
-                action='ai_analyzed',
-                description=f"AI analysis completed with risk score: {ai_result.get('overall_risk_score', 'N/A')}"
-            )
+        incremental = None
+        if not force and getattr(settings, 'AI_INCREMENTAL_REANALYSIS', True):
+            # New version of an analyzed PDF: only changed clauses are analyzed
+            incremental = incremental_ai_analysis(mou, pdf_data['full_text'], source_hash, tier=analyzer.tier)
+        
+        if incremental is not None:
+            ai_analysis, ai_result = incremental
+        elif should_shard(pdf_data['full_text']):
+            # Very long document: analyze clause-aligned shards in parallel tasks
+            shards = dispatch_sharded_analysis(mou, pdf_data['full_text'], source_hash, analyzer.tier, start_time)
+            return f"AI analysis of MOU {mou_id} dispatched in {shards} shards"
+        elif getattr(settings, 'AI_STREAMING_ANALYSIS', True):
+            # Persist clause results chunk by chunk (resumes an interrupted run)
+            ai_analysis, ai_result = stream_ai_analysis(mou, pdf_data['full_text'], source_hash, tier=analyzer.tier)
+        else:
+            # Perform AI analysis
+            ai_result = analyze_mou_document(pdf_data['full_text'], mou.title, tier=analyzer.tier)
+            ai_result['source_hash'] = source_hash
             
-            # Send notification if high risk detected
-            if ai_result.get('overall_risk_score', 0) > 8:
-                send_high_risk_notification.delay(mou_id)
+            # Calculate processing time
+            processing_time = time() - start_time
+            ai_result['processing_time'] = processing_time
             
-            logger.info(f"AI analysis completed for MOU {mou_id} in {processing_time:.2f} seconds")
-            return f"AI analysis completed successfully for MOU {mou_id}"
+            # Create AI analysis record
+            ai_analysis = create_ai_analysis_from_data(mou, ai_result)
+        
+        if ai_analysis:
+            return _finish_ai_analysis(mou, ai_analysis, ai_result, analyzer, start_time)
         else:
             return f"Failed to save AI analysis for MOU {mou_id}"
         
@@ -298,24 +339,253 @@ def analyze_mou_with_ai(mou_id):
     except Exception as e:
         error_msg = f"Error analyzing MOU {mou_id}: {str(e)}"
         logger.error(error_msg)
+        _mark_ai_analysis_failed(mou_id, str(e))
+        return error_msg
+    
+    finally:
+        # The run ended without losing its worker, so it is not counted again
+        from .ai_models import AIAnalysis
+        AIAnalysis.objects.filter(mou_id=mou_id).update(delivery_attempts=0)
+
+
+def _record_delivery_attempt(mou):
+    """
+    Count a delivery of analyze_mou_with_ai for an MOU
+    
+    The counter is reset whenever a run returns, so it only grows while
+    deliveries are lost with their worker (acks_late redelivers them). Past
+    AI_ANALYSIS_MAX_DELIVERIES the analysis is marked failed.
+    
+    Returns:
+        False if the analysis should be abandoned
+    """
+    from django.db.models import F
+    from .ai_models import AIAnalysis
+    
+    ai_analysis, _ = AIAnalysis.objects.get_or_create(mou=mou)
+    AIAnalysis.objects.filter(pk=ai_analysis.pk).update(delivery_attempts=F('delivery_attempts') + 1)
+    ai_analysis.refresh_from_db(fields=['delivery_attempts'])
+    
+    max_deliveries = getattr(settings, 'AI_ANALYSIS_MAX_DELIVERIES', 3)
+    if ai_analysis.delivery_attempts > max_deliveries:
+        error = f"Analysis was interrupted by a lost worker {max_deliveries} times"
+        logger.error(f"AI analysis of MOU {mou.id} abandoned: {error}")
+        _mark_ai_analysis_failed(mou.id, error)
+        return False
+    return True
+
+
+@shared_task
+def analyze_partner_submission(submission_id, tier=None):
+    """
+    Celery task to analyze the revised PDF uploaded with a PartnerSubmission
+    
+    The partner's version is not approved, so the results are stored on
+    ``PartnerSubmission.ai_analysis_data`` and the MOU's own AIAnalysis is
+    left as it is. Clauses unchanged from the MOU's completed analysis reuse
+    their stored results (see utils.review_submission_pdf).
+    
+    Args:
+        submission_id: ID of the PartnerSubmission
+        tier: Analysis tier name
+        
+    Returns:
+        String indicating success or failure
+    """
+    if not HAS_AI_SERVICES:
+        return "AI services not available"
+    
+    from .models import PartnerSubmission
+    from .utils import extract_pdf_data, review_submission_pdf
+    
+    try:
+        submission = PartnerSubmission.objects.select_related('share_link__mou').get(id=submission_id)
+        if not submission.updated_pdf:
+            return f"No PDF file found for submission {submission_id}"
+        
+        pdf_data = extract_pdf_data(submission.updated_pdf.path, run_ai_analysis=False)
+        if not pdf_data.get('full_text'):
+            return f"Could not extract text from PDF for submission {submission_id}"
+        
+        source_hash = compute_file_hash(submission.updated_pdf.path)
+        submission.ai_analysis_data = review_submission_pdf(submission, pdf_data['full_text'], source_hash, tier=tier)
+        submission.save(update_fields=['ai_analysis_data'])
+        
+        logger.info(f"AI analysis completed for submission {submission_id}")
+        return f"AI analysis completed successfully for submission {submission_id}"
+        
+    except PartnerSubmission.DoesNotExist:
+        error_msg = f"Partner submission with ID {submission_id} not found"
+        logger.error(error_msg)
+        return error_msg
         
-        # Update AI analysis status to failed if it exists
+    except Exception as e:
+        error_msg = f"Error analyzing partner submission {submission_id}: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
+def _finish_ai_analysis(mou, ai_analysis, ai_result, analyzer, start_time):
+    """Link similar clauses, record timing and activity, and notify on high risk"""
+    from time import time
+    
+    # Link clauses to similar clauses in other MOUs
+    if getattr(settings, 'AI_SIMILAR_CLAUSES_ENABLED', True) and analyzer.supports('similarity'):
         try:
-            from .ai_models import AIAnalysis
-            ai_analysis, created = AIAnalysis.objects.get_or_create(
-                mou_id=mou_id,
-                defaults={'status': 'failed', 'error_message': str(e)}
-            )
-            if not created:
-                ai_analysis.status = 'failed'
-                ai_analysis.error_message = str(e)
-                ai_analysis.save()
-        except Exception:
-            pass  # Don't fail if we can't update the status
+            from .ai_index import update_similar_clauses
+            update_similar_clauses(ai_analysis, analyzer)
+        except Exception as e:
+            logger.warning(f"Similar clause lookup failed for MOU {mou.id}: {str(e)}")
+    
+    processing_time = time() - start_time
+    ai_analysis.processing_time_seconds = processing_time
+    ai_analysis.save()
+    
+    # Log activity
+    description = f"AI analysis completed with risk score: {ai_result.get('overall_risk_score', 'N/A')}"
+    version_diff = ai_result.get('version_diff')
+    if version_diff:
+        description += (
+            f" (re-analyzed {len(version_diff['added'])} added and {len(version_diff['modified'])} "
+            f"modified clauses, {len(version_diff['removed'])} removed, {version_diff['unchanged']} unchanged)"
+        )
+    if ai_result.get('shards'):
+        description += f" ({ai_result['shards']} shards analyzed in parallel)"
+    ActivityLog.objects.create(
+        mou=mou,
+        action='ai_analyzed',
+        description=description
+    )
+    
+    # Send notification if high risk detected
+    if ai_result.get('overall_risk_score', 0) > 8:
+        send_high_risk_notification.delay(mou.id)
+    
+    logger.info(f"AI analysis completed for MOU {mou.id} in {processing_time:.2f} seconds")
+    return f"AI analysis completed successfully for MOU {mou.id}"
+
+
+def _mark_ai_analysis_failed(mou_id, error):
+    """Update AI analysis status to failed (creating the record if needed)"""
+    try:
+        from .ai_models import AIAnalysis
+        ai_analysis, created = AIAnalysis.objects.get_or_create(
+            mou_id=mou_id,
+            defaults={'status': 'failed', 'error_message': error}
+        )
+        if not created:
+            ai_analysis.status = 'failed'
+            ai_analysis.error_message = error
+            ai_analysis.save()
+    except Exception:
+        pass  # Don't fail if we can't update the status
+
+
+def dispatch_sharded_analysis(mou, full_text, source_hash, tier, start_time):
+    """
+    Analyze a long MOU as a Celery chord: one task per clause-aligned shard,
+    then merge_mou_shards builds the AIAnalysis from the ordered shard results
+    
+    Returns:
+        Number of shards dispatched
+    """
+    from celery import chord
+    from .ai_models import AIAnalysis
+    from .ai_shard import split_document
+    
+    analyzer = get_analyzer(tier)
+    shards = split_document(full_text, getattr(settings, 'AI_SHARD_CHARS', 50000))
+    
+    ai_analysis, _ = AIAnalysis.objects.get_or_create(mou=mou)
+    ai_analysis.clauses.all().delete()
+    ai_analysis.status = 'in_progress'
+    ai_analysis.source_hash = source_hash
+    ai_analysis.analyzer_version = analyzer.version_key
+    ai_analysis.clauses_total = ai_analysis.clauses_done = 0
+    ai_analysis.progress = 0
+    ai_analysis.shard_progress = {}
+    ai_analysis.error_message = ''
+    ai_analysis.save()
+    
+    chord(
+        analyze_mou_shard.s(mou.id, index, shard, analyzer.tier, 100 * len(shard) // len(full_text))
+        for index, shard in enumerate(shards)
+    )(merge_mou_shards.s(mou.id, source_hash, analyzer.tier, start_time).on_error(
+        mou_shards_failed.s(mou.id)
+    ))
+    logger.info(f"Dispatched AI analysis of MOU {mou.id} ({len(full_text)} characters) in {len(shards)} shards")
+    return len(shards)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def analyze_mou_shard(mou_id, index, text, tier=None, progress=0):
+    """
+    Segment and analyze one shard of a long MOU (map step of sharded analysis)
+    
+    Returns:
+        Dictionary with the shard ``index``, its clause analyses and entities
+    """
+    from django.db import transaction
+    from .ai_models import AIAnalysis
+    
+    analyzer = get_analyzer(tier)
+    document = analyzer.prepare_document(text)
+    clauses = analyzer.analyze_clauses(document['clauses'], key_terms=document['key_terms'])
+    
+    # Clauses are only known shard by shard: totals grow as shards finish. They
+    # are summed over the finished shards, so a redelivered shard counts once.
+    with transaction.atomic():
+        ai_analysis = AIAnalysis.objects.select_for_update().filter(mou_id=mou_id, status='in_progress').first()
+        if ai_analysis is not None:
+            ai_analysis.shard_progress[str(index)] = [len(clauses), progress]
+            finished = ai_analysis.shard_progress.values()
+            ai_analysis.clauses_total = ai_analysis.clauses_done = sum(count for count, _ in finished)
+            ai_analysis.progress = min(sum(share for _, share in finished), 100)
+            ai_analysis.save(update_fields=[
+                'shard_progress', 'clauses_total', 'clauses_done', 'progress', 'last_updated'
+            ])
+    return {'index': index, 'clauses': clauses, 'entities': document['entities']}
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def merge_mou_shards(shard_results, mou_id, source_hash='', tier=None, start_time=None):
+    """
+    Merge the shard analyses of a long MOU into one AIAnalysis (reduce step)
+    
+    Clause order follows the document, so the rollups, recommendations and
+    summary statistics equal those of a single-pass analysis of the same clauses.
+    """
+    from time import time
+    
+    try:
+        mou = MOU.objects.get(id=mou_id)
+        analyzer = get_analyzer(tier)
+        merged = merge_shard_results(shard_results)
+        ai_result = analyzer.finalize_document_analysis(merged['clauses'], merged['entities'], mou.title)
+        ai_result['source_hash'] = source_hash
+        ai_result['shards'] = len(shard_results)
+        start_time = start_time or time()
+        ai_result['processing_time'] = time() - start_time
         
+        ai_analysis = create_ai_analysis_from_data(mou, ai_result)
+        if not ai_analysis:
+            return f"Failed to save AI analysis for MOU {mou_id}"
+        return _finish_ai_analysis(mou, ai_analysis, ai_result, analyzer, start_time)
+    
+    except Exception as e:
+        error_msg = f"Error merging AI analysis shards of MOU {mou_id}: {str(e)}"
+        logger.error(error_msg)
+        _mark_ai_analysis_failed(mou_id, str(e))
         return error_msg
 
 
+@shared_task
+def mou_shards_failed(request, exc, traceback, mou_id):
+    """Mark a sharded analysis failed when one of its shard tasks failed"""
+    logger.error(f"Sharded AI analysis of MOU {mou_id} failed: {exc}")
+    _mark_ai_analysis_failed(mou_id, str(exc))
+
+
 @shared_task
 def send_high_risk_notification(mou_id):
     """
@@ -399,7 +669,7 @@ def send_high_risk_notification(mou_id):
 
 
 @shared_task
-def batch_analyze_mous():
+def batch_analyze_mous(tier=None):
     """
     Batch analyze all MOUs that don't have AI analysis yet
     """
@@ -412,7 +682,7 @@ def batch_analyze_mous():
         
         count = 0
         for mou in mous_without_analysis[:10]:  # Limit to 10 at a time to avoid overload
-            analyze_mou_with_ai.delay(mou.id)
+            analyze_mou_with_ai.delay(mou.id, tier=tier)
             count += 1
         
         logger.info(f"Scheduled AI analysis for {count} MOUs")
@@ -424,6 +694,33 @@ def batch_analyze_mous():
         return error_msg
 
 
+@shared_task
+def rescore_ai_analyses(force=False):
+    """
+    Re-apply the current rules and risk weights to all stored clause analyses
+    (no PDF extraction or model inference)
+    """
+    if not HAS_AI_SERVICES:
+        return "AI services not available"
+    
+    try:
+        from .ai_rescore import rescore_analyses
+        
+        totals = rescore_analyses(force=force)
+        message = (
+            f"Re-scored {totals['clauses']} clauses in {totals['analyses']} analyses "
+            f"({totals['clauses_changed']} clauses and {totals['documents_changed']} document scores changed) "
+            f"in {totals['seconds']}s"
+        )
+        logger.info(message)
+        return message
+        
+    except Exception as e:
+        error_msg = f"Error re-scoring AI analyses: {str(e)}"
+        logger.error(error_msg)
+        return error_msg
+
+
 @shared_task
 def update_ai_model_metrics():
     """
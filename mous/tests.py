@@ -1,3 +1,1261 @@
-from django.test import TestCase
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from .ai_cache import ClauseResultCache, clause_cache_key
+from .ai_diff import diff_clause_versions
+from .ai_linear import HAS_SKLEARN
+from .ai_rules import (
+    CLAUSE_TYPE_KEYWORDS, COMPLIANCE_THRESHOLDS, RISK_RULES, RISK_WEIGHTS, RuleEngine, get_rule_engine,
+    set_rule_engine,
+)
+from .ai_services import ClauseAnalyzer
+from .ai_shard import MAX_ENTITIES, merge_shard_results, split_document
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+class StubModelAnalyzer(ClauseAnalyzer):
+    """ClauseAnalyzer whose classifier is a stub, so the model path runs without transformer libraries"""
+
+    def __init__(self, confidence=0.9, **kwargs):
+        kwargs.setdefault('use_cache', False)
+        kwargs.setdefault('use_library', False)
+        super().__init__(**kwargs)
+        self.is_ready = bool(self.capabilities)
+        self.confidence = confidence
+        self.classified = []
+
+    def _load_capability(self, capability):
+        return object() if capability == 'classifier' and self.supports(capability) else None
+
+    def _classify_batch(self, clauses, batch_size):
+        self.classified.append(list(clauses))
+        return [self.confidence] * len(clauses)
+
+    def embed_clauses(self, clauses):
+        return np.ones((len(clauses), 4), dtype=np.float32)
+
+
+def use_temp_media(test_case):
+    """Store uploaded files of ``test_case`` in a temporary MEDIA_ROOT"""
+    directory = tempfile.mkdtemp()
+    test_case.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    override = test_case.settings(MEDIA_ROOT=directory)
+    override.enable()
+    test_case.addCleanup(override.disable)
+
+
+def create_mou(pdf_content=None, title='Research Collaboration MOU'):
+    """Create an MOU, with a stored PDF file when ``pdf_content`` is given"""
+    from datetime import date
+    from .models import MOU
+
+    mou = MOU.objects.create(title=title, partner_name='Partner University', expiry_date=date(2030, 1, 1))
+    if pdf_content is not None:
+        mou.pdf_file.save('mou.pdf', ContentFile(pdf_content))
+    return mou
+
+
+def mou_text(clauses=12, changed=()):
+    """A numbered MOU text; clauses listed in ``changed`` get different wording"""
+    return '\n'.join(
+        f'{i + 1}. The Partner shall {"submit" if i in changed else "provide"} report number {i} '
+        f'to the University within thirty days.'
+        for i in range(clauses)
+    )
+
+
+def legacy_clause_type(clause_text):
+    """The keyword clause classifier the rule engine replaced"""
+    clause_lower = clause_text.lower()
+    for clause_type, keywords in CLAUSE_TYPE_KEYWORDS.items():
+        if any(keyword in clause_lower for keyword in keywords):
+            return clause_type
+    return 'general'
+
+
+def legacy_risk_factors(clause_text):
+    """The keyword risk detector the rule engine replaced"""
+    risks = []
+    clause_lower = clause_text.lower()
+    high_risk_patterns = {
+        'Unlimited liability': ['unlimited liability', 'unlimited damages'],
+        'Vague termination': ['may terminate', 'at any time', 'without cause'],
+        'No dispute resolution': len(re.findall(r'dispute|arbitration|mediation', clause_lower)) == 0,
+        'Excessive penalties': ['penalty', 'fine', 'liquidated damages'],
+        'Broad indemnification': ['indemnify.*all', 'hold harmless.*any'],
+    }
+    for risk_name, patterns in high_risk_patterns.items():
+        if isinstance(patterns, bool):
+            if patterns and 'termination' in clause_lower:
+                risks.append(risk_name)
+        elif any(re.search(pattern, clause_lower) for pattern in patterns):
+            risks.append(risk_name)
+    return risks
+
+
+class RuleEngineTests(SimpleTestCase):
+    """The compiled rule engine must label clauses exactly as the old keyword rules did"""
+
+    FILLER = ['the', 'parties', 'agree', 'that', 'each', 'party', 'shall', 'within', 'thirty', 'days', 'of',
+              'notice', 'hereunder', 'all', 'any', 'claims', 'University', 'Partner', 'agreement', '.', ',']
+
+    def random_clauses(self, count, seed=7):
+        vocabulary = list(self.FILLER)
+        for keywords in CLAUSE_TYPE_KEYWORDS.values():
+            vocabulary.extend(keywords)
+        for rule in RISK_RULES.values():
+            for key in ('any', 'all', 'none', 'requires'):
+                vocabulary.extend(rule.get(key, []))
+        vocabulary.extend(['indemnify', 'hold harmless', 'Termination', 'Governing Law', 'FORCE MAJEURE'])
+        rng = random.Random(seed)
+        return [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 30))) for _ in range(count)]
+
+    def test_matches_legacy_rules(self):
+        engine = RuleEngine()
+        for clause in self.random_clauses(3000):
+            self.assertEqual(engine.classify(clause), (legacy_clause_type(clause), legacy_risk_factors(clause)), clause)
+
+    def test_single_field_accessors_agree_with_classify(self):
+        engine = RuleEngine()
+        for clause in self.random_clauses(200, seed=11):
+            clause_type, risk_factors = engine.classify(clause)
+            self.assertEqual(engine.clause_type(clause), clause_type)
+            self.assertEqual(engine.risk_factors(clause), risk_factors)
+            self.assertEqual(engine.classify_with_confidence(clause)[:2], (clause_type, risk_factors))
+
+    def test_examples(self):
+        engine = RuleEngine()
+        self.assertEqual(
+            engine.classify('Either party may terminate this agreement at any time without cause.'),
+            ('termination', ['Vague termination']),
+        )
+        self.assertEqual(
+            engine.classify('Termination disputes shall be settled by arbitration.'),
+            ('termination', []),
+        )
+        self.assertEqual(
+            engine.classify('The Partner shall indemnify the University against all losses.'),
+            ('liability', ['Broad indemnification']),
+        )
+        self.assertEqual(engine.classify('The parties shall meet quarterly.'), ('general', []))
+
+    def test_risk_score(self):
+        engine = RuleEngine()
+        self.assertEqual(engine.risk_score([]), 3.0)
+        self.assertEqual(engine.risk_score(['Unlimited liability', 'Vague termination']), 5.0)
+        self.assertEqual(engine.risk_score(['Unknown factor']), 1.5)
+        self.assertEqual(engine.risk_score(list(RISK_WEIGHTS) * 2), 10.0)
+
+    def test_compliance_status(self):
+        engine = RuleEngine()
+        self.assertEqual(engine.compliance_status(3.0, 0), 'compliant')
+        self.assertEqual(engine.compliance_status(6.5, 0), 'review_required')
+        self.assertEqual(engine.compliance_status(3.0, 1), 'review_required')
+        self.assertEqual(engine.compliance_status(3.0, 3), 'non_compliant')
+        self.assertEqual(engine.compliance_status(8.5, 0), 'non_compliant')
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+class EmbeddingStoreTests(SimpleTestCase):
+    DIM = 8
+
+    def setUp(self):
+        from .ai_embeddings import EmbeddingStore
+
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = EmbeddingStore(self.directory, self.DIM, dtype='float32')
+
+    def vectors(self, *hot):
+        """One unit vector per entry of ``hot``, with a 1 at that position"""
+        vectors = np.zeros((len(hot), self.DIM), dtype=np.float32)
+        vectors[np.arange(len(hot)), hot] = 1.0
+        return vectors
+
+    def reopen(self):
+        from .ai_embeddings import EmbeddingStore
+        return EmbeddingStore(self.directory, self.DIM, dtype='float32')
+
+    def test_append_and_get(self):
+        self.assertEqual(self.store.append(self.vectors(0, 1, 2), [1, 2, 3], [10, 10, 20]), 0)
+        self.assertEqual(self.store.append(self.vectors(3), [4], [20]), 3)
+        self.assertEqual(len(self.store), 4)
+        stored = self.store.get([2, 4, 99])
+        self.assertEqual(sorted(stored), [2, 4])
+        np.testing.assert_array_equal(stored[4], self.vectors(3)[0])
+        self.assertEqual(len(self.reopen()), 4)
+
+    def test_delete_and_delete_group(self):
+        self.store.append(self.vectors(0, 1, 2, 3), [1, 2, 3, 4], [10, 10, 20, 20])
+        self.assertEqual(self.store.delete([2, 99]), 1)
+        self.assertEqual(self.store.delete([2]), 0)
+        self.assertEqual(self.store.delete_group(20), 2)
+        self.assertEqual(sorted(self.store.get([1, 2, 3, 4])), [1])
+        self.assertEqual(sorted(self.reopen().get([1, 2, 3, 4])), [1])
+
+    def test_readded_id_stays_live(self):
+        self.store.append(self.vectors(0, 1), [1, 2], [10, 10])
+        self.store.delete_group(10)
+        self.store.append(self.vectors(5), [1], [10])
+        self.assertEqual(len(self.store), 1)
+        np.testing.assert_array_equal(self.store.get([1])[1], self.vectors(5)[0])
+        self.assertEqual(len(self.reopen()), 1)
+
+        self.store.delete([1])
+        self.store.append(self.vectors(6), [1], [10])
+        np.testing.assert_array_equal(self.store.get([1])[1], self.vectors(6)[0])
+
+    def test_readded_id_is_searchable(self):
+        from .ai_index import ClauseVectorIndex
+
+        index = ClauseVectorIndex(self.store)
+        index.add(self.vectors(0, 1), [1, 2], [10, 10])
+        index.add(self.vectors(2), [3], [20])
+        index.remove_mou(10)
+        index.add(self.vectors(4), [1], [10])
+        self.assertEqual(index.search(self.vectors(4), k=1)[0], [(1, 10, 1.0)])
+        self.assertEqual([hit[0] for hit in index.search(self.vectors(0), k=5, min_score=0.5)[0]], [])
+        self.assertEqual(index.search(self.vectors(4), k=1, exclude_mou_id=10)[0][0][:2], (3, 20))
+
+    def test_remove_mou_keeps_listed_clauses(self):
+        from .ai_index import ClauseVectorIndex
+
+        index = ClauseVectorIndex(self.store)
+        index.add(self.vectors(0, 1, 2), [1, 2, 3], [10, 10, 10])
+        self.assertEqual(index.remove_mou(10, keep=[2]), 2)
+        self.assertEqual(sorted(self.store.get([1, 2, 3])), [2])
+
+    def test_compact(self):
+        self.store.append(self.vectors(0, 1, 2, 3), [1, 2, 3, 4], [10, 10, 20, 20])
+        self.store.delete_group(10)
+        self.store.append(self.vectors(7), [1], [10])
+        generation = self.store.generation
+        self.assertEqual(self.store.compact(), 2)
+        self.assertEqual(self.store.generation, generation + 1)
+        self.assertEqual(self.store.stats()['rows'], 3)
+        self.assertEqual(self.store.stats()['tombstones'], 0)
+        stored = self.reopen().get([1, 2, 3, 4])
+        self.assertEqual(sorted(stored), [1, 3, 4])
+        np.testing.assert_array_equal(stored[1], self.vectors(7)[0])
+
+
+class ClauseDiffTests(SimpleTestCase):
+    OLD = [
+        '1. This Memorandum is entered into by the University and the Partner.',
+        '2. The Partner shall pay all fees within thirty days of the invoice date.',
+        '3. Each party shall keep confidential all information received from the other party.',
+        '4. Either party may terminate this Memorandum with ninety days written notice.',
+        '5. This Memorandum is governed by the laws of India.',
+    ]
+
+    def diff(self, new_clauses):
+        return diff_clause_versions(self.OLD, new_clauses)
+
+    def test_identical_versions(self):
+        result = self.diff(list(self.OLD))
+        self.assertEqual(result['matches'], [{'status': 'unchanged', 'previous': i} for i in range(len(self.OLD))])
+        self.assertEqual(result['removed'], [])
+
+    def test_whitespace_changes_are_unchanged(self):
+        result = self.diff(['  ' + '\n  '.join(clause.split(' ')) for clause in self.OLD])
+        self.assertEqual([match['status'] for match in result['matches']], ['unchanged'] * len(self.OLD))
+
+    def test_modified_added_and_removed(self):
+        new = [
+            self.OLD[0],
+            '2. The Partner shall pay all fees within sixty days of the invoice date.',
+            self.OLD[2],
+            '4. The University shall provide laboratory access to visiting researchers.',
+            self.OLD[4],
+        ]
+        result = self.diff(new)
+        self.assertEqual(result['matches'], [
+            {'status': 'unchanged', 'previous': 0},
+            {'status': 'modified', 'previous': 1},
+            {'status': 'unchanged', 'previous': 2},
+            {'status': 'added', 'previous': None},
+            {'status': 'unchanged', 'previous': 4},
+        ])
+        self.assertEqual(result['removed'], [3])
+
+    def test_moved_clause_is_unchanged(self):
+        new = [self.OLD[4]] + self.OLD[:4]
+        result = self.diff(new)
+        self.assertEqual([match['previous'] for match in result['matches']], [4, 0, 1, 2, 3])
+        self.assertEqual({match['status'] for match in result['matches']}, {'unchanged'})
+        self.assertEqual(result['removed'], [])
+
+    def test_empty_versions(self):
+        self.assertEqual(diff_clause_versions([], self.OLD[:2])['matches'],
+                         [{'status': 'added', 'previous': None}] * 2)
+        self.assertEqual(diff_clause_versions(self.OLD, []), {'matches': [], 'removed': list(range(len(self.OLD)))})
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+class RiskFactorMatrixTests(SimpleTestCase):
+    """Vectorized what-if rescoring must agree with the analyzer's own rollups"""
+
+    def documents(self, count=60, seed=3):
+        rng = random.Random(seed)
+        factors = list(RISK_WEIGHTS) + ['Unlisted factor']
+        return [
+            [rng.sample(factors, rng.choice([0, 0, 1, 1, 2, 3, 5])) for _ in range(rng.randint(1, 12))]
+            for _ in range(count)
+        ]
+
+    def matrix(self, documents):
+        from .ai_whatif import RiskFactorMatrix
+
+        factor_index = {}
+        rows, columns, clause_analysis = [], [], []
+        for position, clauses in enumerate(documents):
+            for clause_factors in clauses:
+                for factor in clause_factors:
+                    rows.append(len(clause_analysis))
+                    columns.append(factor_index.setdefault(factor, len(factor_index)))
+                clause_analysis.append(position)
+        counts = np.zeros((len(clause_analysis), max(len(factor_index), 1)), dtype=np.uint8)
+        np.add.at(counts, (np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64)), 1)
+        return RiskFactorMatrix(
+            factors=list(factor_index),
+            counts=counts,
+            clause_analysis=np.array(clause_analysis, dtype=np.int32),
+            analysis_ids=np.arange(1, len(documents) + 1, dtype=np.int64),
+            mou_ids=np.arange(1, len(documents) + 1, dtype=np.int64),
+            weighted=np.ones(len(clause_analysis), dtype=bool),
+        )
+
+    def assert_matches_analyzer(self, documents, risk_weights, thresholds):
+        from .ai_services import ClauseAnalyzer
+        from .ai_whatif import COMPLIANCE_STATUSES
+
+        engine = RuleEngine(risk_weights=risk_weights, compliance_thresholds=thresholds)
+        analyzer = ClauseAnalyzer(use_cache=False, use_models=False)
+        overall, status = self.matrix(documents).document_results(risk_weights, engine.compliance_thresholds)
+        with mock.patch('mous.ai_services.get_rule_engine', return_value=engine):
+            for position, clauses in enumerate(documents):
+                analysis = analyzer.finalize_document_analysis([
+                    {'type': 'general', 'confidence': 0.5, 'risk_factors': factors,
+                     'risk_score': engine.risk_score(factors)}
+                    for factors in clauses
+                ], [])
+                self.assertAlmostEqual(float(overall[position]), analysis['overall_risk_score'], places=4)
+                self.assertEqual(COMPLIANCE_STATUSES[status[position]], analysis['compliance_status'])
+
+    def test_current_weights(self):
+        self.assert_matches_analyzer(self.documents(), RISK_WEIGHTS, COMPLIANCE_THRESHOLDS)
+
+    def test_changed_weights_and_thresholds(self):
+        weights = dict(RISK_WEIGHTS, **{'Unlimited liability': 6.0, 'Vague termination': 0.5})
+        thresholds = {'high_risk_clause': 5.0, 'non_compliant_clauses': 1, 'review_score': 4.0}
+        self.assert_matches_analyzer(self.documents(seed=5), weights, thresholds)
+
+
+class ShardTests(SimpleTestCase):
+    def document(self, clauses=400):
+        return 'MEMORANDUM OF UNDERSTANDING\n' + '\n'.join(
+            f'{i + 1}. The parties shall cooperate on project {i} and report progress every quarter.'
+            for i in range(clauses)
+        )
+
+    def test_shards_join_back_to_the_document(self):
+        text = self.document()
+        for shard_chars in (1, 500, 3000, 10 ** 6):
+            self.assertEqual(''.join(split_document(text, shard_chars)), text)
+
+    def test_cuts_at_clause_boundaries(self):
+        text = self.document()
+        shards = split_document(text, 3000)
+        self.assertGreater(len(shards), 5)
+        for shard in shards[1:]:
+            self.assertRegex(shard, r'^\n\d+\. ')
+        for shard in shards[:-1]:
+            self.assertLessEqual(len(shard), 3000 * 3 // 2)
+            self.assertGreaterEqual(len(shard), 3000 // 2)
+
+    def test_short_document_is_one_shard(self):
+        self.assertEqual(split_document('1. Short clause.', 3000), ['1. Short clause.'])
+
+    def test_text_without_boundaries_is_cut_at_the_target(self):
+        shards = split_document('x' * 1000, 100)
+        self.assertEqual(''.join(shards), 'x' * 1000)
+        self.assertEqual(len(shards[0]), 100)
+
+    def test_merge_restores_document_order(self):
+        shard_results = [
+            {'index': 2, 'clauses': [{'text': 'e'}], 'entities': [{'text': 'Delhi', 'label': 'GPE'}]},
+            {'index': 0, 'clauses': [{'text': 'a'}, {'text': 'b'}], 'entities': [{'text': 'Partner', 'label': 'ORG'}]},
+            {'index': 1, 'clauses': [{'text': 'c'}, {'text': 'd'}],
+             'entities': [{'text': 'Partner', 'label': 'PERSON'}]},
+        ]
+        merged = merge_shard_results(shard_results)
+        self.assertEqual([clause['text'] for clause in merged['clauses']], ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(merged['entities'], [{'text': 'Partner', 'label': 'ORG'}, {'text': 'Delhi', 'label': 'GPE'}])
+
+    def test_merge_caps_entities(self):
+        shard_results = [
+            {'index': i, 'clauses': [], 'entities': [{'text': f'E{i}-{j}'} for j in range(20)]} for i in range(5)
+        ]
+        self.assertEqual(len(merge_shard_results(shard_results)['entities']), MAX_ENTITIES)
+
+
+class ClauseResultCacheTests(TestCase):
+    CLAUSE = 'The Partner shall keep all information confidential.'
+
+    def result(self, clause_text, clause_type='confidentiality'):
+        return {'text': clause_text, 'type': clause_type, 'confidence': 0.9, 'risk_factors': [], 'risk_score': 3.0}
+
+    def test_key_ignores_whitespace_and_includes_version(self):
+        spaced = '  The Partner shall keep\n all information\tconfidential. '
+        self.assertEqual(clause_cache_key(spaced, 'v1'), clause_cache_key(self.CLAUSE, 'v1'))
+        self.assertNotEqual(clause_cache_key(self.CLAUSE, 'v1'), clause_cache_key(self.CLAUSE, 'v2'))
+
+    def test_memory_hit_returns_a_copy_with_the_lookup_text(self):
+        cache = ClauseResultCache(use_shared=False)
+        cache.set(self.result(self.CLAUSE), 'v1')
+        spaced = self.CLAUSE.replace(' ', '  ')
+        hit = cache.get(spaced, 'v1')
+        self.assertEqual(hit['text'], spaced)
+        self.assertEqual(hit['type'], 'confidentiality')
+        hit['risk_factors'].append('Mutated')
+        self.assertEqual(cache.get(self.CLAUSE, 'v1')['risk_factors'], [])
+        self.assertIsNone(cache.get(self.CLAUSE, 'v2'))
+        self.assertEqual(cache.stats()['memory_hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_memory_tier_is_lru_bounded(self):
+        cache = ClauseResultCache(max_memory_entries=2, use_shared=False)
+        for clause in ('a', 'b'):
+            cache.set(self.result(clause), 'v1')
+        cache.get('a', 'v1')
+        cache.set(self.result('c'), 'v1')
+        self.assertEqual(sorted(cache.get_many(['a', 'b', 'c'], 'v1')), [0, 2])
+        self.assertEqual(cache.stats()['memory_evictions'], 1)
+
+    def test_shared_tier_serves_other_processes(self):
+        from .ai_models import ClauseResultCache as CacheEntry
+
+        ClauseResultCache().set(self.result(self.CLAUSE), 'v1')
+        entry = CacheEntry.objects.get()
+        self.assertNotIn('text', entry.result)
+
+        cache = ClauseResultCache()
+        self.assertEqual(cache.get(self.CLAUSE, 'v1')['type'], 'confidentiality')
+        self.assertEqual(cache.stats()['shared_hits'], 1)
+        self.assertEqual(CacheEntry.objects.get().hit_count, 1)
+        cache.get(self.CLAUSE, 'v1')
+        self.assertEqual(cache.stats()['memory_hits'], 1)
+
+    def test_evict_shared_drops_least_recently_used(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .ai_models import ClauseResultCache as CacheEntry
+
+        cache = ClauseResultCache(max_shared_entries=2)
+        for age, clause in enumerate(('newest', 'middle', 'oldest')):
+            cache.set(self.result(clause), 'v1')
+            CacheEntry.objects.filter(cache_key=clause_cache_key(clause, 'v1')).update(
+                last_used=timezone.now() - timedelta(days=age)
+            )
+        self.assertEqual(cache.evict_shared(), 1)
+        self.assertFalse(CacheEntry.objects.filter(cache_key=clause_cache_key('oldest', 'v1')).exists())
+
+    def test_analyzer_serves_repeated_clauses_from_the_cache(self):
+        from .ai_services import ClauseAnalyzer
+
+        analyzer = ClauseAnalyzer(use_cache=True, use_models=False, use_library=False)
+        cache = ClauseResultCache(use_shared=False)
+        with mock.patch('mous.ai_services.get_clause_cache', return_value=cache), \
+                mock.patch.object(analyzer, '_analyze_uncached', wraps=analyzer._analyze_uncached) as uncached:
+            first = analyzer.analyze_clauses([self.CLAUSE, 'Either party may terminate at any time.'])
+            second = analyzer.analyze_clauses([self.CLAUSE + '  ', 'The parties shall meet quarterly.'])
+        self.assertEqual([len(call.args[0]) for call in uncached.call_args_list], [2, 1])
+        self.assertEqual(second[0]['type'], first[0]['type'])
+        self.assertEqual(second[0]['text'], self.CLAUSE + '  ')
+
+
+class SkipUnchangedAnalysisTests(TestCase):
+    """analyze_mou_with_ai skips PDFs already analyzed by the same analyzer version"""
+
+    def setUp(self):
+        use_temp_media(self)
+        self.mou = create_mou(b'%PDF-1.4 first version')
+        patcher = mock.patch('mous.utils.extract_pdf_data', return_value={'full_text': mou_text()})
+        self.extract = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_is_current(self):
+        from .ai_models import AIAnalysis
+
+        analysis = AIAnalysis(mou=self.mou, status='completed', source_hash='abc', analyzer_version='v1')
+        self.assertTrue(analysis.is_current('abc', 'v1'))
+        self.assertFalse(analysis.is_current('abd', 'v1'))
+        self.assertFalse(analysis.is_current('abc', 'v2'))
+        analysis.status = 'failed'
+        self.assertFalse(analysis.is_current('abc', 'v1'))
+        self.assertFalse(AIAnalysis(mou=self.mou, status='completed', analyzer_version='v1').is_current('', 'v1'))
+
+    def test_unchanged_pdf_is_skipped(self):
+        from .tasks import analyze_mou_with_ai
+        from .utils import compute_file_hash
+
+        self.assertIn('completed successfully', analyze_mou_with_ai(self.mou.id))
+        self.assertEqual(self.mou.ai_analysis.source_hash, compute_file_hash(self.mou.pdf_file.path))
+        self.assertIn('up to date', analyze_mou_with_ai(self.mou.id))
+        self.assertEqual(self.extract.call_count, 1)
+
+        self.assertIn('completed successfully', analyze_mou_with_ai(self.mou.id, force=True))
+        self.assertEqual(self.extract.call_count, 2)
+
+    def test_changed_pdf_is_analyzed(self):
+        from .tasks import analyze_mou_with_ai
+
+        analyze_mou_with_ai(self.mou.id)
+        self.mou.pdf_file.save('mou.pdf', ContentFile(b'%PDF-1.4 second version'))
+        self.assertIn('completed successfully', analyze_mou_with_ai(self.mou.id))
+        self.assertEqual(self.extract.call_count, 2)
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+@override_settings(AI_CLAUSE_LIBRARY_ENABLED=False)
+class InferenceServerTests(SimpleTestCase):
+    CLAUSES = [
+        'The Partner shall keep all information received from the University confidential.',
+        'Either party may terminate this agreement at any time without cause.',
+        'The parties shall meet quarterly to review the progress of joint projects.',
+    ]
+
+    def setUp(self):
+        from . import ai_services
+        from .ai_server import InferenceServer
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(setattr, ai_services, '_IN_INFERENCE_SERVER', False)
+        self.socket_path = os.path.join(directory, 'inference.sock')
+        self.analyzer = StubModelAnalyzer(tier='standard')
+        self.server = InferenceServer(self.socket_path, analyzer=self.analyzer, max_wait_ms=20)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+        deadline = time.monotonic() + 5
+        while not os.path.exists(self.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def remote(self, tier='standard'):
+        from .ai_server import RemoteClauseAnalyzer
+        return RemoteClauseAnalyzer(self.socket_path, use_cache=False, tier=tier)
+
+    def test_remote_results_match_the_server_analyzer(self):
+        remote = self.remote()
+        self.assertTrue(remote.is_ready)
+        self.assertEqual(remote.version_key, self.analyzer.version_key)
+        results = remote.analyze_clauses(self.CLAUSES)
+        expected = [result for result, _ in self.analyzer._analyze_uncached(self.CLAUSES)]
+        self.assertEqual(results, expected)
+        self.assertEqual({result['tier'] for result in results}, {'model'})
+        self.assertIsNone(remote.embed_clauses(self.CLAUSES))
+        self.assertEqual(self.remote(tier='deep').embed_clauses(self.CLAUSES).shape, (3, 4))
+
+    def test_documents_are_segmented_by_the_client(self):
+        document = '\n'.join(f'{i + 1}. {clause}' for i, clause in enumerate(self.CLAUSES))
+        analysis = self.remote().analyze_document(document, 'MOU')
+        self.assertEqual(len(analysis['clauses']), 3)
+        sent = [clause for batch in self.analyzer.classified for clause in batch]
+        self.assertEqual(len(sent), 3)
+        self.assertNotIn(document, sent)
+
+    def test_concurrent_requests_share_a_batch(self):
+        running, release = threading.Event(), threading.Event()
+        classify = self.analyzer._classify_batch
+
+        def held_classify(clauses, batch_size):
+            running.set()
+            release.wait(5)
+            return classify(clauses, batch_size)
+
+        self.analyzer._classify_batch = held_classify
+        threads = [
+            threading.Thread(target=self.remote().analyze_clauses, args=([f'{i}. {clause}' for clause in self.CLAUSES],))
+            for i in range(6)
+        ]
+        threads[0].start()
+        running.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while self.server.stats()['queue_depth_requests'] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual([len(batch) for batch in self.analyzer.classified], [3, 15])
+        self.assertEqual(self.server.stats()['requests'], 6)
+
+    def test_unreachable_server_falls_back_to_rules(self):
+        from .ai_server import RemoteClauseAnalyzer
+
+        remote = RemoteClauseAnalyzer(self.socket_path + '.missing', use_cache=False, tier='standard')
+        self.assertFalse(remote.is_ready)
+        self.assertIn('|rules|', remote.version_key)
+        self.assertEqual({result['tier'] for result in remote.analyze_clauses(self.CLAUSES)}, {'fallback'})
+
+
+class StreamingAnalysisTests(TestCase):
+    """stream_ai_analysis persists clauses in chunks and resumes interrupted runs"""
+
+    def setUp(self):
+        self.mou = create_mou()
+        self.analyzer = ClauseAnalyzer(use_cache=False, use_models=False, use_library=False)
+        patcher = mock.patch('mous.ai_services.get_analyzer', return_value=self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.analyzed = []
+        self.fail_after = None
+        analyze_clauses = self.analyzer.analyze_clauses
+
+        def analyze_or_die(clauses, **kwargs):
+            if self.fail_after is not None and len(self.analyzed) >= self.fail_after:
+                raise RuntimeError('worker lost')
+            self.analyzed.append(len(clauses))
+            return analyze_clauses(clauses, **kwargs)
+
+        self.analyzer.analyze_clauses = analyze_or_die
+
+    def stream(self, mou=None, source_hash='h1'):
+        from .utils import stream_ai_analysis
+        return stream_ai_analysis(mou or self.mou, mou_text(10), source_hash, chunk_size=4)
+
+    def interrupt(self, chunks=2):
+        from .ai_models import AIAnalysis
+
+        self.fail_after = chunks
+        with self.assertRaises(RuntimeError):
+            self.stream()
+        self.fail_after = None
+        self.analyzed.clear()
+        return AIAnalysis.objects.get(mou=self.mou)
+
+    def test_clauses_are_saved_in_order(self):
+        analysis, data = self.stream()
+        self.assertEqual(self.analyzed, [4, 4, 2])
+        self.assertEqual((analysis.status, analysis.clauses_done, analysis.progress), ('completed', 10, 100))
+        self.assertEqual(list(analysis.clauses.order_by('sequence').values_list('sequence', flat=True)), list(range(10)))
+        self.assertEqual(data['summary_stats']['total_clauses'], 10)
+
+    def test_interrupted_run_resumes_after_the_last_saved_chunk(self):
+        analysis = self.interrupt()
+        self.assertEqual((analysis.status, analysis.clauses_done, analysis.progress), ('in_progress', 8, 80))
+        self.assertTrue(analysis.can_resume('h1', self.analyzer.version_key))
+
+        analysis, data = self.stream()
+        self.assertEqual(self.analyzed, [2])
+        self.assertEqual(analysis.status, 'completed')
+        self.assertEqual(list(analysis.clauses.order_by('sequence').values_list('sequence', flat=True)), list(range(10)))
+
+        _, uninterrupted = self.stream(mou=create_mou(title='Uninterrupted'))
+        self.assertEqual(data['overall_risk_score'], uninterrupted['overall_risk_score'])
+        self.assertEqual(data['compliance_status'], uninterrupted['compliance_status'])
+
+    def test_new_pdf_restarts_from_the_first_clause(self):
+        analysis = self.interrupt()
+        self.assertFalse(analysis.can_resume('h2', self.analyzer.version_key))
+        self.assertFalse(analysis.can_resume('h1', 'other analyzer'))
+
+        analysis, _ = self.stream(source_hash='h2')
+        self.assertEqual(self.analyzed, [4, 4, 2])
+        self.assertEqual(analysis.clauses.count(), 10)
+
+    def test_redeliveries_are_capped(self):
+        from .ai_models import AIAnalysis
+        from .tasks import analyze_mou_with_ai
+
+        use_temp_media(self)
+        mou = create_mou(b'%PDF-1.4 crashes its worker')
+        AIAnalysis.objects.create(mou=mou, status='in_progress', delivery_attempts=settings.AI_ANALYSIS_MAX_DELIVERIES)
+        with mock.patch('mous.utils.extract_pdf_data') as extract:
+            self.assertIn('repeated worker losses', analyze_mou_with_ai(mou.id))
+        extract.assert_not_called()
+        analysis = AIAnalysis.objects.get(mou=mou)
+        self.assertEqual((analysis.status, analysis.delivery_attempts), ('failed', 0))
+
+        AIAnalysis.objects.filter(mou=mou).update(delivery_attempts=1)
+        with mock.patch('mous.utils.extract_pdf_data', return_value={'full_text': mou_text()}):
+            self.assertIn('completed successfully', analyze_mou_with_ai(mou.id))
+        self.assertEqual(AIAnalysis.objects.get(mou=mou).delivery_attempts, 0)
+
+
+class IncrementalAnalysisTests(TestCase):
+    """A new PDF version only sends added and modified clauses through inference"""
+
+    def setUp(self):
+        from .utils import stream_ai_analysis
+
+        use_temp_media(self)
+        self.mou = create_mou(b'%PDF-1.4 first version')
+        self.analyzer = ClauseAnalyzer(use_cache=False, use_models=False, use_library=False)
+        patcher = mock.patch('mous.ai_services.get_analyzer', return_value=self.analyzer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.analysis, _ = stream_ai_analysis(self.mou, mou_text(10), 'h1')
+
+        self.analyzed = []
+        analyze_clauses = self.analyzer.analyze_clauses
+        self.analyzer.analyze_clauses = lambda clauses, **kwargs: (
+            self.analyzed.extend(clauses), analyze_clauses(clauses, **kwargs)
+        )[1]
+
+    def test_only_changed_clauses_are_analyzed(self):
+        from .utils import incremental_ai_analysis
+
+        old_ids = dict(self.analysis.clauses.values_list('sequence', 'id'))
+        analysis, data = incremental_ai_analysis(self.mou, mou_text(11, changed=(3,)), 'h2')
+        self.assertEqual(len(self.analyzed), 2)
+        self.assertIn('submit report number 3', self.analyzed[0])
+
+        version_diff = data['version_diff']
+        self.assertEqual(version_diff['previous_source_hash'], 'h1')
+        self.assertEqual(version_diff['unchanged'], 9)
+        self.assertEqual(version_diff['added'], [10])
+        self.assertEqual(version_diff['modified'], [{'sequence': 3, 'previous_sequence': 3}])
+        self.assertEqual(version_diff['removed'], [])
+
+        rows = list(analysis.clauses.order_by('sequence'))
+        self.assertEqual([row.sequence for row in rows], list(range(11)))
+        self.assertEqual([row.change_status for row in rows], ['unchanged'] * 3 + ['modified'] + ['unchanged'] * 6 + ['added'])
+        self.assertEqual(rows[0].id, old_ids[0])
+        self.assertNotEqual(rows[3].id, old_ids[3])
+        self.assertEqual((analysis.status, analysis.source_hash, analysis.clauses_total), ('completed', 'h2', 11))
+
+    def test_removed_clauses_are_deleted(self):
+        from .utils import incremental_ai_analysis
+
+        analysis, data = incremental_ai_analysis(self.mou, mou_text(8), 'h2')
+        self.assertEqual(self.analyzed, [])
+        self.assertEqual([removed['previous_sequence'] for removed in data['version_diff']['removed']], [8, 9])
+        self.assertEqual(analysis.clauses.count(), 8)
+        self.assertEqual(data['summary_stats']['total_clauses'], 8)
+
+    def test_needs_a_completed_analysis_by_the_same_analyzer(self):
+        from .ai_models import AIAnalysis
+        from .utils import incremental_ai_analysis
+
+        AIAnalysis.objects.filter(pk=self.analysis.pk).update(analyzer_version='older analyzer')
+        self.assertIsNone(incremental_ai_analysis(self.mou, mou_text(11), 'h2'))
+        AIAnalysis.objects.filter(pk=self.analysis.pk).update(
+            analyzer_version=self.analyzer.version_key, status='in_progress'
+        )
+        self.assertIsNone(incremental_ai_analysis(self.mou, mou_text(11), 'h2'))
+
+    def test_partner_submission_is_stored_on_the_submission(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import PartnerSubmission, ShareLink
+        from .tasks import analyze_partner_submission
+
+        link = ShareLink.objects.create(mou=self.mou, expires_at=timezone.now() + timedelta(days=7))
+        submission = PartnerSubmission.objects.create(
+            share_link=link, partner_name='Partner', partner_organization='Partner University',
+            partner_email='partner@example.com', updated_pdf=ContentFile(b'%PDF-1.4 partner version', name='revised.pdf')
+        )
+        rows = list(self.analysis.clauses.values_list('id', 'clause_text'))
+        with mock.patch('mous.utils.extract_pdf_data', return_value={'full_text': mou_text(10, changed=(5,))}):
+            self.assertIn('completed successfully', analyze_partner_submission(submission.id))
+
+        self.assertEqual(len(self.analyzed), 1)
+        submission.refresh_from_db()
+        self.assertEqual(submission.ai_analysis_data['version_diff']['modified'], [{'sequence': 5, 'previous_sequence': 5}])
+        self.assertEqual(submission.ai_analysis_data['summary_stats']['total_clauses'], 10)
+        self.analysis.refresh_from_db()
+        self.assertEqual(self.analysis.source_hash, 'h1')
+        self.assertEqual(list(self.analysis.clauses.values_list('id', 'clause_text')), rows)
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+class ClauseLibraryTests(TestCase):
+    CONFIDENTIALITY = (
+        '7. The University and Acme Research Labs shall keep confidential all information exchanged under '
+        'this Memorandum for a period of 5 years after its expiry.'
+    )
+    VARIANT = (
+        'Clause 12: The University and Globex Institute of Science shall keep confidential all information '
+        'exchanged under this Memorandum for a period of 3 years after its expiry.'
+    )
+
+    def create_entry(self, clause_text, **labels):
+        from .ai_library import library_hash
+        from .ai_models import ClauseLibraryEntry
+
+        labels.setdefault('clause_type', 'confidentiality')
+        labels.setdefault('confidence_score', 0.95)
+        return ClauseLibraryEntry.objects.create(
+            canonical_text=clause_text, text_hash=library_hash(clause_text), occurrences=4, **labels
+        )
+
+    def library(self):
+        from .ai_library import ClauseLibrary
+
+        library = ClauseLibrary()
+        library.refresh(force=True)
+        return library
+
+    def test_normalization_drops_numbering_names_and_numbers(self):
+        from .ai_library import library_hash, library_normalize
+
+        self.assertEqual(library_hash(self.CONFIDENTIALITY), library_hash(self.VARIANT))
+        self.assertEqual(
+            library_normalize(self.VARIANT),
+            'the name shall keep confidential all information exchanged under this name for a period of 0 years '
+            'after its expiry'
+        )
+
+    def test_near_duplicates_copy_the_entry_labels(self):
+        entry = self.create_entry(self.CONFIDENTIALITY, risk_factors=['Vague termination'], risk_score=9.0)
+        reworded = self.VARIANT.replace('after its expiry.', 'after its expiry or termination.')
+        matches = self.library().match_many([
+            reworded,
+            'Either party may terminate this agreement at any time without cause by giving notice.',
+            'Short clause.',
+        ])
+        self.assertEqual(sorted(matches), [0])
+        match = matches[0]
+        self.assertEqual((match['type'], match['confidence'], match['text']), ('confidentiality', 0.95, reworded))
+        self.assertEqual(match['library_entry'], entry.id)
+        self.assertGreaterEqual(match['library_similarity'], 0.8)
+        # Risk is rescored with the current weights, not copied
+        self.assertEqual(match['risk_score'], RuleEngine().risk_score(['Vague termination']))
+        entry.refresh_from_db()
+        self.assertEqual(entry.hit_count, 1)
+
+    def test_inactive_entries_are_dropped_on_refresh(self):
+        entry = self.create_entry(self.CONFIDENTIALITY)
+        library = self.library()
+        self.assertEqual(len(library), 1)
+        entry.is_active = False
+        entry.save()
+        self.assertTrue(library.refresh(force=True))
+        self.assertEqual(library.match_many([self.VARIANT]), {})
+
+    def test_analyzer_skips_inference_for_library_clauses(self):
+        self.create_entry(self.CONFIDENTIALITY)
+        other = 'The parties shall meet quarterly to review the progress of joint research projects.'
+        analyzer = StubModelAnalyzer(tier='standard', use_library=True)
+        with mock.patch('mous.ai_library.get_clause_library', return_value=self.library()):
+            results = analyzer.analyze_clauses([self.VARIANT, other])
+            self.assertEqual([result['tier'] for result in results], ['library', 'model'])
+            self.assertEqual(analyzer.classified, [[other]])
+
+            rules_only = ClauseAnalyzer(use_cache=False, use_models=False, use_library=True)
+            self.assertEqual(rules_only.analyze_clauses([self.VARIANT])[0]['tier'], 'fallback')
+
+
+class RescoreTests(TestCase):
+    """rescore_analyses re-applies the current rules to stored clauses without the PDFs or models"""
+
+    CLAUSE = 'Either party may terminate at any time without cause and pay a penalty.'
+
+    def create_analysis(self, analyzer_version, tiers):
+        from .ai_models import AIAnalysis, ClauseAnalysis
+
+        analysis = AIAnalysis.objects.create(mou=create_mou(), status='completed', analyzer_version=analyzer_version)
+        for sequence, tier in enumerate(tiers):
+            ClauseAnalysis.objects.create(
+                ai_analysis=analysis, sequence=sequence, clause_text=self.CLAUSE, tier=tier,
+                risk_score=0, confidence_score=0.5
+            )
+        return analysis
+
+    def scores(self, analysis):
+        return [float(score) for score in analysis.clauses.order_by('sequence').values_list('risk_score', flat=True)]
+
+    def test_uses_fallback_scoring(self):
+        from .ai_rescore import uses_fallback_scoring
+
+        self.assertTrue(uses_fallback_scoring('fallback', '1.0.0|ai:bert|abc'))
+        self.assertFalse(uses_fallback_scoring('model', '1.0.0|ai:bert|abc'))
+        self.assertFalse(uses_fallback_scoring('rules', '1.0.0|ai:bert:cascade0.8|abc'))
+        self.assertTrue(uses_fallback_scoring('rules', '1.0.0|ai:bert|abc'))
+        self.assertTrue(uses_fallback_scoring('', '1.0.0|rules|abc'))
+        self.assertFalse(uses_fallback_scoring('', '1.0.0|ai:bert|abc'))
+
+    def test_each_clause_keeps_its_scoring(self):
+        from .ai_models import AIAnalysis
+        from .ai_rescore import rescore_analyses
+
+        analyzer = ClauseAnalyzer(use_cache=False, use_models=False, use_library=False)
+        analysis = self.create_analysis('1.0.0|ai:bert|old', ['model', 'fallback'])
+        totals = rescore_analyses()
+        self.assertEqual((totals['analyses'], totals['clauses'], totals['clauses_changed']), (1, 2, 2))
+        self.assertEqual(self.scores(analysis), [
+            analyzer.rescore_clause(self.CLAUSE, rule_based=False)['risk_score'],
+            analyzer.rescore_clause(self.CLAUSE, rule_based=True)['risk_score'],
+        ])
+        self.assertNotEqual(*self.scores(analysis))
+        analysis = AIAnalysis.objects.get(pk=analysis.pk)
+        self.assertEqual(analysis.analyzer_version, f'1.0.0|ai:bert|{get_rule_engine().fingerprint}')
+        self.assertIsNotNone(analysis.overall_risk_score)
+
+        self.assertEqual(rescore_analyses()['analyses'], 0)
+        self.assertEqual(rescore_analyses(force=True)['analyses'], 1)
+
+    def test_new_weights_are_applied(self):
+        from .ai_rescore import rescore_analyses
+
+        analysis = self.create_analysis('1.0.0|ai:bert|old', ['model'])
+        rescore_analyses()
+        before = self.scores(analysis)
+
+        weights = dict(RISK_WEIGHTS, **{'Vague termination': 9.0})
+        self.addCleanup(set_rule_engine, set_rule_engine(RuleEngine(risk_weights=weights)))
+        self.assertEqual(rescore_analyses()['analyses'], 1)
+        self.assertGreater(self.scores(analysis)[0], before[0])
+
+    def test_dry_run_and_unversioned_analyses(self):
+        from .ai_rescore import rescore_analyses
+
+        analysis = self.create_analysis('1.0.0|ai:bert|old', ['model'])
+        unversioned = self.create_analysis('', [''])
+        totals = rescore_analyses(dry_run=True)
+        self.assertEqual((totals['analyses'], totals['skipped_unversioned']), (1, 1))
+        self.assertEqual(self.scores(analysis), [0.0])
+
+        rescore_analyses()
+        self.assertEqual(self.scores(unversioned), [0.0])
+
+
+@override_settings(AI_CASCADE_LINEAR=False, AI_CASCADE_MIN_CONFIDENCE=0.8, AI_CASCADE_ESCALATE_RISK=True)
+class CascadeTests(SimpleTestCase):
+    """The cascade decides clear-cut clauses with rules and escalates the rest to the model"""
+
+    CLEAR = 'This agreement shall be governed by the laws of India and its governing law applies.'
+    UNCLEAR = 'The parties shall meet quarterly to review the progress of joint projects.'
+    AMBIGUOUS = 'Confidential information shall be returned upon termination of this agreement.'
+    RISKY = 'The Partner shall be liable for unlimited liability and all damages arising from this agreement.'
+
+    def analyze(self, clauses):
+        analyzer = StubModelAnalyzer(tier='standard', cascade=True)
+        return analyzer, analyzer.analyze_clauses(clauses)
+
+    def test_only_unclear_clauses_reach_the_model(self):
+        analyzer, results = self.analyze([self.CLEAR, self.UNCLEAR, self.AMBIGUOUS, self.RISKY])
+        self.assertEqual([result['tier'] for result in results], ['rules', 'model', 'model', 'model'])
+        self.assertEqual(analyzer.classified, [[self.UNCLEAR, self.AMBIGUOUS, self.RISKY]])
+        self.assertEqual(results[0]['type'], 'governing_law')
+        self.assertEqual(results[0]['confidence'], 0.95)
+
+    def test_rule_results_are_scored_like_model_results(self):
+        _, (cascaded,) = self.analyze([self.CLEAR])
+        (modelled,) = StubModelAnalyzer(tier='standard').analyze_clauses([self.CLEAR])
+        for field in ('type', 'risk_score', 'risk_factors', 'suggestions'):
+            self.assertEqual(cascaded[field], modelled[field])
+
+    @override_settings(AI_CASCADE_ESCALATE_RISK=False)
+    def test_risky_clauses_can_stay_with_the_rules(self):
+        analyzer, results = self.analyze([self.RISKY])
+        self.assertEqual(results[0]['tier'], 'rules')
+        self.assertEqual(results[0]['risk_factors'], ['Unlimited liability'])
+        self.assertEqual(analyzer.classified, [])
+
+    def test_cascade_settings_are_part_of_the_version(self):
+        cascade_version = StubModelAnalyzer(tier='standard', cascade=True).version_key
+        self.assertIn(':cascade0.8:risk|', cascade_version)
+        self.assertNotEqual(cascade_version, StubModelAnalyzer(tier='standard').version_key)
+        with self.settings(AI_CASCADE_MIN_CONFIDENCE=0.9):
+            self.assertNotEqual(StubModelAnalyzer(tier='standard', cascade=True).version_key, cascade_version)
+
+
+class AnalysisTierTests(TestCase):
+    """Tiers load only their own models and record the tier their results cover"""
+
+    def test_tier_capabilities(self):
+        from .ai_services import DEFAULT_ANALYSIS_TIER, resolve_analysis_tier, tier_capabilities
+
+        self.assertEqual(tier_capabilities('rules'), ())
+        self.assertEqual(tier_capabilities('standard'), ('classifier', 'spacy'))
+        self.assertEqual(tier_capabilities('standard', 'prototype'), ('similarity', 'spacy'))
+        self.assertEqual(resolve_analysis_tier('STANDARD'), 'standard')
+        self.assertEqual(resolve_analysis_tier('unknown'), DEFAULT_ANALYSIS_TIER)
+        with self.settings(AI_ANALYSIS_TIER='standard'):
+            self.assertEqual(resolve_analysis_tier(), 'standard')
+
+    def test_capabilities_outside_the_tier_are_not_loaded(self):
+        analyzer = StubModelAnalyzer(tier='standard')
+        self.assertTrue(analyzer.supports('classifier'))
+        self.assertFalse(analyzer.supports('similarity'))
+        self.assertIsNone(ClauseAnalyzer._load_capability(analyzer, 'similarity'))
+        self.assertIsNone(ClauseAnalyzer.embed_clauses(analyzer, ['The parties shall meet quarterly.']))
+
+        rules = StubModelAnalyzer(tier='rules')
+        self.assertFalse(rules.is_ready)
+        self.assertEqual(rules.analyze_clauses(['The parties shall meet quarterly.'])[0]['tier'], 'fallback')
+        self.assertEqual(rules.classified, [])
+
+    def test_effective_tier_is_the_deepest_tier_that_can_run(self):
+        analyzer = StubModelAnalyzer(tier='deep')
+        self.assertEqual(analyzer.effective_tier, 'deep')
+        analyzer._unavailable.add('ner')
+        self.assertEqual(analyzer.effective_tier, 'standard')
+        analyzer._unavailable.add('classifier')
+        self.assertEqual(analyzer.effective_tier, 'rules')
+        self.assertEqual(StubModelAnalyzer(tier='standard').effective_tier, 'standard')
+        self.assertEqual(ClauseAnalyzer(tier='deep', use_cache=False, use_library=False).effective_tier, 'rules')
+
+    def test_deeper_analyses_cover_shallower_tiers(self):
+        from .ai_models import AIAnalysis
+
+        analysis = AIAnalysis(status='completed', source_hash='h1', analyzer_version='v1', analysis_tier='standard')
+        self.assertTrue(analysis.is_current('h1', 'v1', 'rules'))
+        self.assertTrue(analysis.is_current('h1', 'v1', 'standard'))
+        self.assertFalse(analysis.is_current('h1', 'v1', 'deep'))
+        analysis.analysis_tier = ''
+        self.assertTrue(analysis.is_current('h1', 'v1', 'deep'))
+
+    def test_rules_only_run_records_the_rules_tier(self):
+        from .utils import stream_ai_analysis
+
+        analyzer = ClauseAnalyzer(tier='deep', use_cache=False, use_library=False)
+        with mock.patch('mous.ai_services.get_analyzer', return_value=analyzer):
+            analysis, data = stream_ai_analysis(create_mou(), mou_text(), 'h1', tier='deep')
+        self.assertEqual((analysis.analysis_tier, data['analysis_tier']), ('rules', 'rules'))
+        self.assertFalse(analysis.is_current('h1', analyzer.version_key, 'deep'))
+        self.assertTrue(analysis.is_current('h1', analyzer.version_key, analyzer.effective_tier))
+
+
+@unittest.skipUnless(HAS_SKLEARN, 'scikit-learn is not installed')
+class LinearClassifierTests(SimpleTestCase):
+    """The TF-IDF linear classifier trains from labelled clauses and types clauses in the cascade"""
+
+    TEMPLATES = {
+        'payment': 'The {party} will settle each invoice for {thing} within {days} days of receipt.',
+        'publication': 'The {party} may publish results about {thing} after a review period of {days} days.',
+        'staff_exchange': 'The {party} will host visiting researchers working on {thing} for up to {days} days.',
+    }
+    PARTIES = ['University', 'Partner', 'host institution', 'sponsor', 'department']
+    THINGS = ['laboratory equipment', 'joint workshops', 'field studies', 'data collection', 'student projects']
+
+    def examples(self, per_type=20, seed=3):
+        rng = random.Random(seed)
+        return [
+            (None, template.format(party=rng.choice(self.PARTIES), thing=rng.choice(self.THINGS),
+                                   days=rng.randint(10, 90)), clause_type)
+            for clause_type, template in self.TEMPLATES.items()
+            for _ in range(per_type)
+        ]
+
+    def train(self, examples=None):
+        from .ai_linear import train_linear_classifier
+        return train_linear_classifier(examples or self.examples())
+
+    def test_trains_and_types_unseen_clauses(self):
+        classifier, report = self.train()
+        self.assertEqual(sorted(classifier.classes), sorted(self.TEMPLATES))
+        self.assertEqual(report['holdout']['accuracy'], 1.0)
+        clause_types, confidences = classifier.predict([
+            'The sponsor will settle each invoice for conference travel within 45 days of receipt.',
+            'The Partner may publish results about the survey after a review period of 60 days.',
+        ])
+        self.assertEqual(clause_types, ['payment', 'publication'])
+        self.assertTrue(all(0.5 < confidence <= 1.0 for confidence in confidences))
+        self.assertEqual(classifier.predict([]), ([], []))
+
+    def test_rare_types_are_skipped_and_versions_are_reproducible(self):
+        from .ai_linear import train_linear_classifier
+
+        examples = self.examples() + [(None, 'The parties shall plant a tree every spring.', 'rare')]
+        classifier, report = self.train(examples)
+        self.assertEqual(report['skipped_types'], ['rare'])
+        self.assertEqual(self.train(examples)[0].version, classifier.version)
+        self.assertNotEqual(self.train(self.examples(seed=4))[0].version, classifier.version)
+        with self.assertRaises(ValueError):
+            train_linear_classifier([e for e in self.examples() if e[2] == 'payment'])
+
+    def test_saved_versions_are_activated_and_reloaded(self):
+        from .ai_linear import activate_version, get_linear_classifier, saved_versions
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        pointer = os.path.join(directory, 'linear', 'current.json')
+
+        def activated():
+            # Workers reload when the pointer's mtime changes; make sure it does on coarse clocks
+            os.utime(pointer, ns=(time.time_ns(), os.stat(pointer).st_mtime_ns + 10 ** 9))
+            return get_linear_classifier()
+
+        with self.settings(AI_INDEX_DIR=directory):
+            self.assertIsNone(get_linear_classifier())
+            first, _ = self.train()
+            first.save(os.path.join(directory, 'linear'))
+            self.assertEqual(activated().version, first.version)
+
+            second, _ = self.train(self.examples(seed=4))
+            second.save(os.path.join(directory, 'linear'))
+            self.assertEqual({meta['version'] for meta in saved_versions()}, {first.version, second.version})
+            self.assertEqual(activated().version, second.version)
+            activate_version(first.version)
+            self.assertEqual(activated().version, first.version)
+            with self.assertRaises(ValueError):
+                activate_version('missing')
+
+    @override_settings(AI_CASCADE_LINEAR=True, AI_CASCADE_MIN_CONFIDENCE=0.8, AI_CASCADE_ESCALATE_RISK=True)
+    def test_cascade_types_unclear_clauses_with_the_classifier(self):
+        classifier, _ = self.train()
+        clauses = [
+            'The department will settle each invoice for field studies within 30 days of receipt.',
+            'Either party may terminate this agreement at any time without cause.',
+        ]
+        analyzer = StubModelAnalyzer(tier='standard', cascade=True)
+        with mock.patch.object(analyzer, '_linear_classifier', return_value=classifier):
+            with self.settings(AI_LINEAR_MIN_CONFIDENCE=0.5):
+                self.assertIn(f':linear{classifier.version}@0.5|', analyzer.version_key)
+                results = analyzer.analyze_clauses(clauses)
+                self.assertEqual([result['tier'] for result in results], ['linear', 'model'])
+                self.assertEqual(results[0]['type'], 'payment')
+                # Clauses with risk factors always reach the model
+                self.assertEqual(analyzer.classified, [[clauses[1]]])
+
+            analyzer.classified.clear()
+            with self.settings(AI_LINEAR_MIN_CONFIDENCE=1.01):
+                self.assertEqual([result['tier'] for result in analyzer.analyze_clauses(clauses)], ['model', 'model'])
+
+
+class AnalysisPipelineTests(TransactionTestCase):
+    """The staged pipeline analyzes many MOUs; one failing MOU does not take down its write batch"""
+
+    def setUp(self):
+        use_temp_media(self)
+        self.mous = [create_mou(f'%PDF-1.4 version {i}'.encode(), title=f'MOU {i}') for i in range(3)]
+        patchers = [
+            mock.patch('mous.ai_pipeline._extract_text', return_value=mou_text()),
+            # Only the writer thread uses the database (the in-memory test database locks whole tables)
+            mock.patch('mous.ai_services.get_analyzer', return_value=ClauseAnalyzer(
+                use_cache=False, use_models=False, use_library=False
+            )),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_pipeline(self, **options):
+        from .ai_pipeline import run_pipeline
+        from .models import MOU
+
+        mous = list(MOU.objects.select_related('ai_analysis').order_by('id'))
+        return run_pipeline(mous, tier='rules', extract_workers=0, **options)
+
+    def test_analyzes_and_skips_current_analyses(self):
+        from .ai_models import AIAnalysis
+
+        create_mou(title='Without PDF')
+        report = self.run_pipeline()
+        self.assertEqual((report['analyzed'], report['skipped'], report['failed']), (3, 1, 0))
+        self.assertEqual(report['stages']['writer']['items'], 3)
+        for analysis in AIAnalysis.objects.all():
+            self.assertEqual((analysis.status, analysis.analysis_tier, analysis.clauses.count()), ('completed', 'rules', 12))
+
+        report = self.run_pipeline()
+        self.assertEqual((report['analyzed'], report['skipped']), (0, 4))
+        self.assertEqual(self.run_pipeline(force=True)['analyzed'], 3)
+
+    def test_failed_save_rolls_back_only_its_mou(self):
+        import queue
+        from django.db import connection
+        from .ai_models import AIAnalysis, ClauseAnalysis
+        from .ai_pipeline import _DONE, AnalysisPipeline, PipelineItem, StageStats
+        from . import utils
+
+        pipeline = AnalysisPipeline(tier='rules', write_batch=8)
+        pipeline.stages = {'writer': StageStats('writer')}
+        to_write = queue.Queue()
+        for mou in self.mous:
+            item = PipelineItem(mou, mou.pdf_file.path, f'hash-{mou.id}', time.time())
+            item.ai_result = pipeline.analyzer.analyze_document(mou_text(), mou.title)
+            to_write.put(item)
+        to_write.put(_DONE)
+
+        create_risk_flags = utils.create_risk_flags_from_analysis
+
+        def broken_for_second_mou(mou, ai_analysis, ai_data):
+            if mou.id == self.mous[1].id:
+                connection.cursor().execute('SELECT * FROM missing_table')
+            return create_risk_flags(mou, ai_analysis, ai_data)
+
+        # All three MOUs are written in one transaction
+        with mock.patch('mous.utils.create_risk_flags_from_analysis', side_effect=broken_for_second_mou):
+            pipeline._writer(to_write)
+
+        self.assertEqual((pipeline.results['analyzed'], pipeline.results['failed']), (2, 1))
+        self.assertEqual(pipeline.stages['writer'].errors, 1)
+        statuses = dict(AIAnalysis.objects.values_list('mou_id', 'status'))
+        self.assertEqual(statuses, {self.mous[0].id: 'completed', self.mous[1].id: 'failed', self.mous[2].id: 'completed'})
+        self.assertFalse(ClauseAnalysis.objects.filter(ai_analysis__mou=self.mous[1]).exists())
+        self.assertEqual(ClauseAnalysis.objects.filter(ai_analysis__mou=self.mous[2]).count(), 12)
+
+
+@unittest.skipUnless(HAS_NUMPY, 'numpy is not installed')
+class LabelPrototypeTests(SimpleTestCase):
+    """Clause typing by nearest label prototype"""
+
+    def prototypes(self):
+        from .ai_prototypes import LabelPrototypes
+
+        vectors = np.array([[1, 0, 0], [0.8, 0.2, 0], [0, 1, 0], [0, 0.9, 0.1]], dtype=np.float32)
+        return LabelPrototypes.from_embeddings(['payment', 'payment', 'termination', 'termination'], vectors, 'encoder')
+
+    def test_classifies_by_nearest_prototype(self):
+        prototypes = self.prototypes()
+        self.assertEqual(prototypes.types, ['payment', 'termination'])
+        self.assertEqual(prototypes.counts, [2, 2])
+        np.testing.assert_allclose(np.linalg.norm(prototypes.vectors, axis=1), 1, rtol=1e-6)
+
+        clause_types, confidences = prototypes.classify(np.array([[0.9, 0.1, 0], [0.1, 0.9, 0]]))
+        self.assertEqual(clause_types, ['payment', 'termination'])
+        self.assertTrue(all(0.5 < confidence <= 1 for confidence in confidences))
+
+    def test_saved_prototypes_reload_when_rebuilt(self):
+        from .ai_prototypes import LabelPrototypes, get_label_prototypes, prototypes_path
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with self.settings(AI_INDEX_DIR=directory):
+            self.assertIsNone(get_label_prototypes('encoder'))
+            prototypes = self.prototypes()
+            prototypes.save(prototypes_path('encoder'))
+            loaded = get_label_prototypes('encoder')
+            self.assertEqual((loaded.version, loaded.types), (prototypes.version, prototypes.types))
+            self.assertIs(get_label_prototypes('encoder'), loaded)
+
+            rebuilt = LabelPrototypes(['general'], np.array([[0, 0, 1]]), [1], 'encoder')
+            rebuilt.save(prototypes_path('encoder'))
+            later = os.path.getmtime(prototypes_path('encoder')) + 5
+            os.utime(prototypes_path('encoder'), (later, later))
+            self.assertEqual(get_label_prototypes('encoder').version, rebuilt.version)
+
+    def test_analyzer_types_clauses_without_the_classifier(self):
+        analyzer = StubModelAnalyzer(tier='standard', clause_typing='prototype', prototypes=self.prototypes())
+        self.assertEqual(analyzer.clause_typing, 'prototype')
+        with mock.patch.object(analyzer, 'embed_clauses', return_value=np.array([[0, 1, 0]] * 12, dtype=np.float32)):
+            result = analyzer.analyze_document(mou_text(), 'MOU')
+
+        self.assertEqual(analyzer.classified, [])
+        self.assertEqual({clause['type'] for clause in result['clauses']}, {'termination'})
+
+    def test_falls_back_to_the_classifier_without_prototypes(self):
+        with mock.patch('mous.ai_prototypes.get_label_prototypes', return_value=None):
+            analyzer = StubModelAnalyzer(tier='standard', clause_typing='prototype')
+        self.assertEqual(analyzer.clause_typing, 'model')
@@ -1,6 +1,7 @@
 import re
-import pdfplumber
+import hashlib
 from datetime import datetime
+from django.db import transaction
 from django.utils import timezone
 from .models import ActivityLog
 
@@ -22,8 +23,22 @@ def get_client_ip(request):
     return ip
 
 
-def extract_pdf_data(pdf_path):
-    """Extract text and key information from PDF with optional AI analysis"""
+def compute_file_hash(file_path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extract_pdf_data(pdf_path, run_ai_analysis=True):
+    """
+    Extract text and key information from PDF with optional AI analysis
+    
+    Callers that run their own analysis on ``full_text`` should pass
+    ``run_ai_analysis=False`` to avoid analyzing the document twice.
+    """
     extracted_data = {
         'full_text': '',
         'clauses': [],
@@ -33,6 +48,8 @@ def extract_pdf_data(pdf_path):
     }
     
     try:
+        import pdfplumber  # Imported on first use: only PDF processing needs it
+        
         with pdfplumber.open(pdf_path) as pdf:
             full_text = ''
             for page in pdf.pages:
@@ -81,7 +98,7 @@ def extract_pdf_data(pdf_path):
                     break
             
             # Perform AI analysis if available
-            if HAS_AI_SERVICES and full_text.strip():
+            if run_ai_analysis and HAS_AI_SERVICES and full_text.strip():
                 try:
                     ai_result = analyze_mou_document(full_text)
                     extracted_data['ai_analysis'] = ai_result
@@ -170,61 +187,360 @@ def create_ai_analysis_from_data(mou, ai_data):
     if not HAS_AI_SERVICES:
         return None
     
+    try:
+        # A savepoint, so a failure inside an outer transaction leaves it usable
+        with transaction.atomic():
+            return save_ai_analysis(mou, ai_data)
+    except Exception as e:
+        # Log error but don't fail
+        print(f"Error creating AI analysis: {str(e)}")
+        return None
+
+
+def save_ai_analysis(mou, ai_data):
+    """
+    Create or update the AIAnalysis of an MOU and replace its clause analyses
+    and risk flags; unlike create_ai_analysis_from_data, errors propagate
+    
+    Args:
+        mou: MOU instance
+        ai_data: Dictionary containing AI analysis results
+    
+    Returns:
+        AIAnalysis instance
+    """
     # Import here to avoid circular imports
-    from .ai_models import AIAnalysis, ClauseAnalysis, RiskFlag
+    from .ai_models import AIAnalysis, ClauseAnalysis
     
-    try:
-        # Create or update AI analysis
-        ai_analysis, created = AIAnalysis.objects.get_or_create(
-            mou=mou,
-            defaults={
-                'overall_risk_score': ai_data.get('overall_risk_score', 0),
-                'compliance_status': ai_data.get('compliance_status', 'pending'),
-                'analysis_data': ai_data,
-                'recommendations': ai_data.get('recommendations', []),
-                'compliance_flags': ai_data.get('compliance_flags', []),
-                'summary_stats': ai_data.get('summary_stats', {}),
-                'status': 'completed'
-            }
+    # Create or update AI analysis
+    ai_analysis, created = AIAnalysis.objects.get_or_create(
+        mou=mou,
+        defaults={
+            'overall_risk_score': ai_data.get('overall_risk_score', 0),
+            'compliance_status': ai_data.get('compliance_status', 'pending'),
+            'analysis_data': ai_data,
+            'recommendations': ai_data.get('recommendations', []),
+            'compliance_flags': ai_data.get('compliance_flags', []),
+            'summary_stats': ai_data.get('summary_stats', {}),
+            'source_hash': ai_data.get('source_hash', ''),
+            'analyzer_version': ai_data.get('analyzer_version', ''),
+            'analysis_tier': ai_data.get('analysis_tier', ''),
+            'clauses_total': len(ai_data.get('clauses', [])),
+            'clauses_done': len(ai_data.get('clauses', [])),
+            'progress': 100,
+            'status': 'completed'
+        }
+    )
+    
+    if not created:
+        # Update existing analysis
+        ai_analysis.overall_risk_score = ai_data.get('overall_risk_score', ai_analysis.overall_risk_score)
+        ai_analysis.compliance_status = ai_data.get('compliance_status', ai_analysis.compliance_status)
+        ai_analysis.analysis_data = ai_data
+        ai_analysis.recommendations = ai_data.get('recommendations', [])
+        ai_analysis.compliance_flags = ai_data.get('compliance_flags', [])
+        ai_analysis.summary_stats = ai_data.get('summary_stats', {})
+        ai_analysis.source_hash = ai_data.get('source_hash', '')
+        ai_analysis.analyzer_version = ai_data.get('analyzer_version', '')
+        ai_analysis.analysis_tier = ai_data.get('analysis_tier', '')
+        ai_analysis.clauses_total = ai_analysis.clauses_done = len(ai_data.get('clauses', []))
+        ai_analysis.progress = 100
+        ai_analysis.error_message = ''
+        ai_analysis.status = 'completed'
+        ai_analysis.save()
+    
+    # Replace existing clause analyses
+    ai_analysis.clauses.all().delete()
+    ClauseAnalysis.objects.bulk_create(
+        _build_clause_analyses(ai_analysis, ai_data.get('clauses', []))
+    )
+    
+    # Create risk flags for high-risk items
+    create_risk_flags_from_analysis(mou, ai_analysis, ai_data)
+    
+    return ai_analysis
+
+
+def _build_clause_analyses(ai_analysis, clauses, start=0):
+    """Build unsaved ClauseAnalysis rows for clause analysis dictionaries"""
+    from .ai_models import ClauseAnalysis
+    
+    return [
+        ClauseAnalysis(
+            ai_analysis=ai_analysis,
+            sequence=start + offset,
+            clause_text=clause_data.get('text', ''),
+            clause_type=clause_data.get('type', 'unknown'),
+            confidence_score=clause_data.get('confidence', 0),
+            risk_score=clause_data.get('risk_score', 0),
+            sentiment=clause_data.get('sentiment', 'neutral'),
+            risk_factors=clause_data.get('risk_factors', []),
+            suggestions=clause_data.get('suggestions', []),
+            key_terms=clause_data.get('key_terms', []),
+            tier=clause_data.get('tier', '')
         )
-        
-        if not created:
-            # Update existing analysis
-            ai_analysis.overall_risk_score = ai_data.get('overall_risk_score', ai_analysis.overall_risk_score)
-            ai_analysis.compliance_status = ai_data.get('compliance_status', ai_analysis.compliance_status)
-            ai_analysis.analysis_data = ai_data
-            ai_analysis.recommendations = ai_data.get('recommendations', [])
-            ai_analysis.compliance_flags = ai_data.get('compliance_flags', [])
-            ai_analysis.summary_stats = ai_data.get('summary_stats', {})
-            ai_analysis.status = 'completed'
-            ai_analysis.save()
-        
-        # Clear existing clause analyses
+        for offset, clause_data in enumerate(clauses)
+    ]
+
+
+def _clause_data_from_row(clause_analysis):
+    """Rebuild a clause analysis dictionary from a persisted ClauseAnalysis row"""
+    return {
+        'text': clause_analysis.clause_text,
+        'type': clause_analysis.clause_type,
+        'confidence': float(clause_analysis.confidence_score or 0),
+        'risk_score': float(clause_analysis.risk_score or 0),
+        'risk_factors': clause_analysis.risk_factors,
+        'suggestions': clause_analysis.suggestions,
+        'key_terms': clause_analysis.key_terms,
+        'sentiment': clause_analysis.sentiment,
+        'tier': clause_analysis.tier,
+    }
+
+
+def stream_ai_analysis(mou, full_text, source_hash='', chunk_size=None, tier=None):
+    """
+    Analyze an MOU progressively, persisting clause results chunk by chunk
+    
+    Each chunk of clauses is saved as soon as it is analyzed and the
+    AIAnalysis progress is updated, so the detail page shows partial results
+    while a long document is still running. If an earlier run of the same
+    PDF and analyzer version was interrupted, analysis resumes after the last
+    persisted clause instead of starting over.
+    
+    Args:
+        mou: MOU instance
+        full_text: Text extracted from the MOU PDF
+        source_hash: SHA-256 of the PDF file
+        chunk_size: Clauses per persisted chunk (defaults to AI_STREAM_CHUNK_SIZE)
+        tier: Analysis tier (defaults to AI_ANALYSIS_TIER)
+    
+    Returns:
+        Tuple of (AIAnalysis instance, analysis dictionary)
+    """
+    from django.db import transaction
+    from .ai_models import AIAnalysis, ClauseAnalysis
+    from .ai_services import get_analyzer
+    
+    analyzer = get_analyzer(tier)
+    document = analyzer.prepare_document(full_text)
+    clauses = document['clauses']
+    
+    ai_analysis, _ = AIAnalysis.objects.get_or_create(mou=mou)
+    start = 0
+    if ai_analysis.can_resume(source_hash, analyzer.version_key) and ai_analysis.clauses_total == len(clauses):
+        # Resume only if the persisted rows line up with this segmentation
+        done = ai_analysis.clauses_done
+        last = ai_analysis.clauses.filter(sequence=done - 1).first() if done else None
+        if done and last is not None and last.clause_text == clauses[done - 1]:
+            ai_analysis.clauses.filter(sequence__gte=done).delete()
+            start = done
+    
+    if start == 0:
         ai_analysis.clauses.all().delete()
+    ai_analysis.status = 'in_progress'
+    ai_analysis.source_hash = source_hash
+    ai_analysis.analyzer_version = analyzer.version_key
+    ai_analysis.clauses_total = len(clauses)
+    ai_analysis.clauses_done = start
+    ai_analysis.progress = int(100 * start / len(clauses)) if clauses else 0
+    ai_analysis.error_message = ''
+    ai_analysis.save()
+    
+    for chunk_start, results in analyzer.iter_clause_analyses(
+            clauses, document['key_terms'], start=start, chunk_size=chunk_size):
+        with transaction.atomic():
+            ClauseAnalysis.objects.bulk_create(_build_clause_analyses(ai_analysis, results, chunk_start))
+            ai_analysis.clauses_done = chunk_start + len(results)
+            ai_analysis.progress = int(100 * ai_analysis.clauses_done / len(clauses))
+            ai_analysis.save(update_fields=['clauses_done', 'progress', 'last_updated'])
+    
+    # Document-level rollups need every clause, including ones from an earlier run
+    ai_data = _finalize_from_rows(mou, ai_analysis, analyzer, document['entities'], source_hash)
+    return ai_analysis, ai_data
+
+
+def incremental_ai_analysis(mou, full_text, source_hash='', tier=None):
+    """
+    Re-analyze a new PDF version of an MOU, running inference only on changed clauses
+    
+    The new version is segmented and its clauses are matched against the
+    stored ClauseAnalysis rows (see ai_diff.diff_clause_versions). Rows of
+    unchanged clauses are kept, added and modified clauses are analyzed and
+    saved, rows of removed clauses are deleted, and the document-level scores
+    are recomputed from the result. Each row's ``change_status`` and
+    ``analysis_data['version_diff']`` record what changed.
+    
+    Args:
+        mou: MOU instance
+        full_text: Text extracted from the new PDF version
+        source_hash: SHA-256 of the new PDF file
+        tier: Analysis tier (defaults to AI_ANALYSIS_TIER)
+    
+    Returns:
+        Tuple of (AIAnalysis instance, analysis dictionary), or None when there
+        is no completed analysis by the current analyzer version to start from
+    """
+    from django.db import transaction
+    from .ai_models import ClauseAnalysis
+    from .ai_services import get_analyzer
+    
+    analyzer = get_analyzer(tier)
+    ai_analysis, old_rows = _completed_clause_rows(mou, analyzer)
+    if not old_rows:
+        return None
+    
+    document, diff, results = _analyze_changed_clauses(analyzer, old_rows, full_text)
+    clauses = document['clauses']
+    matches = diff['matches']
+    
+    with transaction.atomic():
+        ClauseAnalysis.objects.filter(id__in=[
+            old_rows[match['previous']].id for match in matches if match['status'] == 'modified'
+        ] + [old_rows[i].id for i in diff['removed']]).delete()
         
-        # Create clause analyses
-        for clause_data in ai_data.get('clauses', []):
-            ClauseAnalysis.objects.create(
-                ai_analysis=ai_analysis,
-                clause_text=clause_data.get('text', ''),
-                clause_type=clause_data.get('type', 'unknown'),
-                confidence_score=clause_data.get('confidence', 0),
-                risk_score=clause_data.get('risk_score', 0),
-                sentiment=clause_data.get('sentiment', 'neutral'),
-                risk_factors=clause_data.get('risk_factors', []),
-                suggestions=clause_data.get('suggestions', []),
-                key_terms=clause_data.get('key_terms', [])
-            )
-        
-        # Create risk flags for high-risk items
-        create_risk_flags_from_analysis(mou, ai_analysis, ai_data)
-        
-        return ai_analysis
+        kept, created = [], []
+        for index, match in enumerate(matches):
+            if match['status'] == 'unchanged':
+                row = old_rows[match['previous']]
+                row.sequence = index
+                row.clause_text = clauses[index]
+            else:
+                row = _build_clause_analyses(ai_analysis, [results[index]], index)[0]
+            row.change_status = match['status']
+            (kept if row.pk else created).append(row)
+        ClauseAnalysis.objects.bulk_update(kept, ['sequence', 'clause_text', 'change_status'], batch_size=500)
+        ClauseAnalysis.objects.bulk_create(created)
         
-    except Exception as e:
-        # Log error but don't fail
-        print(f"Error creating AI analysis: {str(e)}")
-        return None
+        previous_hash = ai_analysis.source_hash
+        ai_analysis.clauses_total = ai_analysis.clauses_done = len(clauses)
+        ai_analysis.source_hash = source_hash
+        ai_analysis.error_message = ''
+        ai_data = _finalize_from_rows(
+            mou, ai_analysis, analyzer, document['entities'], source_hash,
+            version_diff=_version_diff(diff, results, old_rows, previous_hash)
+        )
+    return ai_analysis, ai_data
+
+
+def review_submission_pdf(submission, full_text, source_hash='', tier=None):
+    """
+    Analyze the revised PDF of a PartnerSubmission without touching the MOU's analysis
+    
+    A partner's upload is unapproved, so its results are returned for storage
+    on the submission rather than written to the MOU's AIAnalysis. As with
+    incremental_ai_analysis, clauses unchanged from the MOU's completed
+    analysis reuse their stored results and only added or modified clauses go
+    through inference; ``version_diff`` records the changes. Without a
+    completed analysis to compare against, the document is analyzed in full.
+    
+    Args:
+        submission: PartnerSubmission instance
+        full_text: Text extracted from the submitted PDF
+        source_hash: SHA-256 of the submitted PDF file
+        tier: Analysis tier (defaults to AI_ANALYSIS_TIER)
+    
+    Returns:
+        Analysis dictionary
+    """
+    from .ai_services import analyze_mou_document, get_analyzer
+    
+    mou = submission.share_link.mou
+    analyzer = get_analyzer(tier)
+    ai_analysis, old_rows = _completed_clause_rows(mou, analyzer)
+    if not old_rows:
+        ai_data = analyze_mou_document(full_text, mou.title, tier=analyzer.tier)
+        ai_data['source_hash'] = source_hash
+        return ai_data
+    
+    document, diff, results = _analyze_changed_clauses(analyzer, old_rows, full_text)
+    clause_results = [
+        _clause_data_from_row(old_rows[match['previous']]) if match['status'] == 'unchanged' else results[index]
+        for index, match in enumerate(diff['matches'])
+    ]
+    ai_data = analyzer.finalize_document_analysis(clause_results, document['entities'], mou.title)
+    ai_data['source_hash'] = source_hash
+    ai_data['version_diff'] = _version_diff(diff, results, old_rows, ai_analysis.source_hash)
+    return ai_data
+
+
+def _completed_clause_rows(mou, analyzer):
+    """
+    Return the MOU's AIAnalysis and its ordered clause rows, or (analysis, [])
+    when there is no completed analysis by this analyzer version to diff against
+    """
+    from .ai_models import AIAnalysis
+    
+    ai_analysis = AIAnalysis.objects.filter(mou=mou).first()
+    if (ai_analysis is None or ai_analysis.status != 'completed' or
+            ai_analysis.analyzer_version != analyzer.version_key):
+        return ai_analysis, []
+    return ai_analysis, list(ai_analysis.clauses.order_by('sequence'))
+
+
+def _analyze_changed_clauses(analyzer, old_rows, full_text):
+    """
+    Segment a new document version, diff it against the stored clause rows and
+    analyze the added and modified clauses
+    
+    Returns:
+        Tuple of (prepared document, clause diff, {clause index: analysis})
+    """
+    from .ai_diff import diff_clause_versions
+    
+    document = analyzer.prepare_document(full_text)
+    clauses = document['clauses']
+    diff = diff_clause_versions([row.clause_text for row in old_rows], clauses)
+    
+    changed = [i for i, match in enumerate(diff['matches']) if match['status'] != 'unchanged']
+    key_terms = document['key_terms']
+    results = dict(zip(changed, analyzer.analyze_clauses(
+        [clauses[i] for i in changed],
+        key_terms=[key_terms[i] for i in changed] if key_terms is not None else None
+    ))) if changed else {}
+    return document, diff, results
+
+
+def _version_diff(diff, results, old_rows, previous_hash):
+    """Summarize which clauses were added, modified and removed between versions"""
+    matches = diff['matches']
+    changed = sorted(results)
+    return {
+        'previous_source_hash': previous_hash,
+        'unchanged': len(matches) - len(changed),
+        'added': [i for i in changed if matches[i]['status'] == 'added'],
+        'modified': [
+            {'sequence': i, 'previous_sequence': matches[i]['previous']}
+            for i in changed if matches[i]['status'] == 'modified'
+        ],
+        'removed': [
+            {'previous_sequence': i, 'text': old_rows[i].clause_text[:300]}
+            for i in diff['removed']
+        ],
+    }
+
+
+def _finalize_from_rows(mou, ai_analysis, analyzer, entities, source_hash, version_diff=None):
+    """Recompute document-level results from the persisted clause rows and mark the analysis completed"""
+    clause_results = [_clause_data_from_row(row) for row in ai_analysis.clauses.order_by('sequence')]
+    ai_data = analyzer.finalize_document_analysis(clause_results, entities, mou.title)
+    ai_data['source_hash'] = source_hash
+    if version_diff is not None:
+        ai_data['version_diff'] = version_diff
+    
+    ai_analysis.overall_risk_score = ai_data['overall_risk_score']
+    ai_analysis.compliance_status = ai_data['compliance_status']
+    ai_analysis.analysis_data = ai_data
+    ai_analysis.recommendations = ai_data['recommendations']
+    ai_analysis.compliance_flags = ai_data.get('compliance_flags', [])
+    ai_analysis.summary_stats = ai_data['summary_stats']
+    ai_analysis.analysis_tier = analyzer.effective_tier
+    ai_analysis.progress = 100
+    ai_analysis.status = 'completed'
+    ai_analysis.save()
+    
+    create_risk_flags_from_analysis(mou, ai_analysis, ai_data)
+    return ai_data
 
 
 def create_risk_flags_from_analysis(mou, ai_analysis, ai_data):
@@ -236,13 +552,29 @@ def create_risk_flags_from_analysis(mou, ai_analysis, ai_data):
     
     # Clear existing unresolved risk flags
     RiskFlag.objects.filter(mou=mou, is_resolved=False).delete()
+    RiskFlag.objects.bulk_create(build_risk_flags(mou, ai_analysis, ai_analysis.clauses.filter(risk_score__gt=7)))
+
+
+def build_risk_flags(mou, ai_analysis, clause_analyses):
+    """
+    Build unsaved RiskFlag objects for an analysis
+    
+    Args:
+        clause_analyses: ClauseAnalysis rows of the analysis; only those with
+            a risk score above 7 are flagged
+    """
+    from .ai_models import RiskFlag
+    
+    flags = []
     
     # Create flags for high-risk clauses
-    for clause_analysis in ai_analysis.clauses.filter(risk_score__gt=7):
+    for clause_analysis in clause_analyses:
+        if clause_analysis.risk_score is None or clause_analysis.risk_score <= 7:
+            continue
         for risk_factor in clause_analysis.risk_factors:
             severity = 'high' if clause_analysis.risk_score > 8 else 'medium'
             
-            RiskFlag.objects.create(
+            flags.append(RiskFlag(
                 mou=mou,
                 clause_analysis=clause_analysis,
                 flag_type='legal_risk',
@@ -250,29 +582,31 @@ def create_risk_flags_from_analysis(mou, ai_analysis, ai_data):
                 title=f"High-risk {clause_analysis.clause_type} clause",
                 description=f"Risk factor identified: {risk_factor}",
                 confidence_score=clause_analysis.confidence_score
-            )
+            ))
     
     # Create flags for overall document issues
     if ai_analysis.overall_risk_score and ai_analysis.overall_risk_score > 8:
-        RiskFlag.objects.create(
+        flags.append(RiskFlag(
             mou=mou,
             flag_type='legal_risk',
             severity='critical',
             title="Overall high-risk document",
             description=f"Document has overall risk score of {ai_analysis.overall_risk_score}/10",
             confidence_score=0.9
-        )
+        ))
     
     # Create compliance flags
     if ai_analysis.compliance_status == 'non_compliant':
-        RiskFlag.objects.create(
+        flags.append(RiskFlag(
             mou=mou,
             flag_type='compliance_risk',
             severity='high',
             title="Compliance issues detected",
             description="Document may not meet compliance requirements",
             confidence_score=0.8
-        )
+        ))
+    
+    return flags
 
 
 def get_ai_insights_for_dashboard():
@@ -305,17 +639,27 @@ def get_ai_insights_for_dashboard():
         return {}
 
 
-def schedule_ai_reanalysis(mou):
-    """Schedule AI reanalysis for an MOU (for use with Celery)"""
+def schedule_ai_reanalysis(mou, submission=None, tier=None):
+    """
+    Schedule AI reanalysis for an MOU (for use with Celery)
+    
+    Pass ``submission`` to analyze the revised PDF a partner uploaded with a
+    PartnerSubmission instead; its results are stored on the submission and
+    the MOU's own analysis is left alone. ``tier`` picks the analysis tier
+    (defaults to AI_ANALYSIS_TIER).
+    """
     if not HAS_AI_SERVICES:
         return False
     
     # Import here to avoid circular imports
-    from .tasks import analyze_mou_with_ai
+    from .tasks import analyze_mou_with_ai, analyze_partner_submission
     
     try:
         # Schedule background task for AI analysis
-        analyze_mou_with_ai.delay(mou.id)
+        if submission is not None:
+            analyze_partner_submission.delay(submission.id, tier=tier)
+        else:
+            analyze_mou_with_ai.delay(mou.id, tier=tier)
         return True
     except Exception as e:
         print(f"Error scheduling AI analysis: {str(e)}")
@@ -12,12 +12,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
 from django.views.decorators.clickjacking import xframe_options_sameorigin
+from django.conf import settings
 import json
 from datetime import datetime, timedelta
 
 from .models import MOU, ActivityLog, ShareLink, PartnerSubmission
 from .forms import MOUForm, PartnerSubmissionForm
-from .utils import get_client_ip, extract_pdf_data, log_activity
+from .utils import get_client_ip, extract_pdf_data, log_activity, schedule_ai_reanalysis
 
 
 class MOUListView(LoginRequiredMixin, ListView):
@@ -150,6 +151,10 @@ class MOUUpdateView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         
+        # A new PDF version is re-analyzed incrementally in the background
+        if 'pdf_file' in form.changed_data and form.instance.pdf_file:
+            schedule_ai_reanalysis(form.instance)
+        
         # Log activity
         log_activity(
             mou=form.instance,
@@ -240,6 +245,10 @@ def mou_sign_view(request, token):
                 description=f"MOU signed by {submission.partner_name}"
             )
             
+            # Analyze the partner's revised PDF against the current analysis
+            if submission.updated_pdf:
+                schedule_ai_reanalysis(share_link.mou, submission=submission)
+            
             return render(request, 'mous/submission_success.html', {
                 'submission': submission,
                 'mou': share_link.mou
@@ -365,7 +374,10 @@ def trigger_ai_analysis(request, pk):
         
         # Check if analysis is already running
         try:
-            if hasattr(mou, 'ai_analysis') and mou.ai_analysis.status == 'pending':
+            stale_after = getattr(settings, 'AI_STREAM_STALE_SECONDS', 600)
+            if hasattr(mou, 'ai_analysis') and (
+                mou.ai_analysis.status == 'pending' or mou.ai_analysis.is_running(stale_after)
+            ):
                 return JsonResponse({
                     'success': False,
                     'message': 'AI analysis is already in progress for this MOU'
@@ -373,8 +385,9 @@ def trigger_ai_analysis(request, pk):
         except:
             pass  # No existing analysis
         
-        # Trigger the analysis task
-        result = analyze_mou_with_ai.delay(mou.id)
+        # Trigger the analysis task (unchanged PDFs are skipped unless forced)
+        force = request.POST.get('force', '').lower() in ('1', 'true', 'on')
+        result = analyze_mou_with_ai.delay(mou.id, force=force)
         
         # Log activity
         log_activity(